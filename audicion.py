@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# audicion.py
+# Matriz A/B de voces: sintetiza un mismo guion con todas las voces elegidas
+# (filtro sobre el catálogo o lista explícita) y deja un manifiesto con el
+# costo de cada variante para compararlas.
+#
+# Cada voz recibe el SSML que le corresponde (las Chirp, sanitizado con
+# voces.sanitize_ssml_for_chirp) y todas se sintetizan a la vez, así que una
+# audición de 30 voces tarda lo que la llamada más lenta (dentro de la cuota
+# del limitador de cuota.py).
+#
+# Uso:
+#   python audicion.py guion.ssml --idioma es-US --familia chirp3 --genero FEMALE
+#   python audicion.py guion.ssml --voces es-US-Wavenet-A es-US-Neural2-A es-US-Chirp-HD-O -d pruebas/
+#   python audicion.py guion.ssml --idioma es-US -p web        # variantes en OGG/Opus
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from cache_audio import AudioCache, cache_key
+from perfiles import EXTENSIONES, audio_config, obtener_perfil
+from sintetizador import MAX_INPUT_BYTES, preparar_sintesis, sintetizar_audio
+from voces import es_chirp, resolve_voice, usar_catalogo
+
+log = logging.getLogger(__name__)
+
+# Tope de síntesis simultáneas (una por voz hasta este número)
+CONCURRENCIA = 32
+DIRECTORIO = "audicion"
+
+
+def seleccionar_voces(idioma: Optional[str] = None, familia: Optional[str] = None,
+                      genero: Optional[str] = None, voces: Optional[List[str]] = None,
+                      catalogo=None) -> List[Dict]:
+    """
+    Metadatos (formato VOICE_INFO, más 'gender' si se conoce) de las voces a
+    comparar: las del catálogo que cumplen los filtros más las de `voces`.
+    resolve_voice encuentra las voces del catálogo (cargar_catalogo lo
+    registra en voces.py; un `catalogo` explícito se registra aquí).
+    """
+    elegidas: Dict[str, Dict] = {}
+    if catalogo is not None:
+        usar_catalogo(catalogo)
+    if idioma or familia or genero:
+        if catalogo is None:
+            from catalogo import cargar_catalogo
+            catalogo = cargar_catalogo()
+        for v in catalogo.buscar(idioma, genero, familia):
+            _, _, meta = resolve_voice(v["name"])
+            elegidas[v["name"]] = dict(meta, gender=v["gender"])
+
+    for clave in voces or []:
+        nombre, _, meta = resolve_voice(clave)
+        if nombre not in elegidas:
+            v = catalogo.get(nombre) if catalogo is not None else None
+            elegidas[nombre] = dict(meta, gender=v["gender"]) if v else dict(meta)
+    return sorted(elegidas.values(), key=lambda m: m["name"])
+
+
+def renderizar_voz(ssml_input: str, meta: Dict, destino: str, client=None,
+                   cache: Optional[AudioCache] = None, perfil: Optional[str] = None) -> Dict:
+    """Sintetiza el guion con una voz y devuelve su registro para el manifiesto."""
+    registro = {
+        "voice": meta["name"],
+        "languageCode": meta.get("languageCode"),
+        "type": meta.get("type"),
+        "gender": meta.get("gender"),
+        "output": destino,
+        "sanitizado": es_chirp(meta),
+    }
+    precio = float(meta.get("price_per_million") or 0.0)
+    caracteres, en_cache = 0, False
+    inicio = time.monotonic()
+    try:
+        ssml_a_usar, nombre, idioma, _ = preparar_sintesis(ssml_input, meta["name"])
+        # Caracteres que factura la API para esta voz (tras sanitizar)
+        caracteres = len(ssml_a_usar)
+        if cache is not None and len(ssml_a_usar.encode("utf-8")) <= MAX_INPUT_BYTES:
+            en_cache = cache.contiene(cache_key(ssml_a_usar, nombre, idioma, audio_config(perfil)))
+        sintetizar_audio(ssml_input, meta["name"], destino, client=client, cache=cache, perfil=perfil)
+        registro["estado"] = "ok"
+        registro["bytes"] = os.path.getsize(destino)
+    except KeyError as e:
+        registro["estado"] = "error"
+        registro["error"] = str(e)
+    except Exception as e:
+        registro["estado"] = "error"
+        registro["error"] = repr(e)
+    registro["segundos"] = round(time.monotonic() - inicio, 3)
+    registro["caracteres"] = caracteres
+    registro["price_per_million"] = precio
+    registro["desde_cache"] = en_cache
+    # Costo a precio de lista, sin franquicia gratuita: lo que cuesta la variante
+    registro["usd"] = 0.0 if en_cache or registro["estado"] != "ok" else round(caracteres * precio / 1_000_000, 6)
+    return registro
+
+
+def ejecutar_audicion(ssml_input: str, voces: List[Dict], directorio: str = DIRECTORIO,
+                      manifest_path: Optional[str] = None, client=None,
+                      cache: Optional[AudioCache] = None, perfil: Optional[str] = None,
+                      concurrencia: int = CONCURRENCIA) -> List[Dict]:
+    """
+    Sintetiza el guion con todas las voces en paralelo, escribe cada variante
+    como <directorio>/<voz><ext> y el manifiesto JSONL (una línea por voz).
+    Devuelve los registros en el orden de `voces`.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    extension = EXTENSIONES.get(obtener_perfil(perfil).encoding, ".audio")
+    manifest_path = manifest_path or os.path.join(directorio, "manifest.jsonl")
+
+    def tarea(meta):
+        return renderizar_voz(ssml_input, meta, os.path.join(directorio, meta["name"] + extension),
+                              client=client, cache=cache, perfil=perfil)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrencia, len(voces)))) as pool:
+        registros = list(pool.map(tarea, voces))
+
+    with open(manifest_path, "w", encoding="utf-8") as manifest:
+        for r in registros:
+            manifest.write(json.dumps(r, ensure_ascii=False) + "\n")
+    return registros
+
+
+def tabla(registros: List[Dict]) -> str:
+    """Comparación de las variantes, de la más barata a la más cara."""
+    lineas = [f"{'voz':<32} {'tipo':<8} {'género':<8} {'caract.':>7} {'USD':>9} {'seg.':>6} {'KB':>7}  estado"]
+    for r in sorted(registros, key=lambda r: (r["usd"], r["voice"])):
+        estado = r["estado"] + (" (caché)" if r["desde_cache"] else "")
+        if r["estado"] != "ok":
+            estado += f": {r.get('error', '')}"
+        lineas.append(f"{r['voice']:<32} {r['type'] or '':<8} {r['gender'] or '':<8} {r['caracteres']:>7} "
+                      f"{r['usd']:>9.5f} {r['segundos']:>6.2f} {r.get('bytes', 0) / 1024:>7.1f}  {estado}")
+    return "\n".join(lineas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sintetiza un guion con varias voces a la vez para compararlas.")
+    parser.add_argument('ssml', nargs='?', help='Archivo SSML ("-" = stdin). Por defecto SSML de la configuración.')
+    parser.add_argument('--idioma', '-l', type=str, help='Filtro del catálogo: código de idioma, ej. es-US.')
+    parser.add_argument('--familia', '-f', type=str, help='Filtro del catálogo: wavenet | neural2 | chirp3 | standard ...')
+    parser.add_argument('--genero', '-g', type=str, help='Filtro del catálogo: MALE | FEMALE | NEUTRAL.')
+    parser.add_argument('--voces', nargs='+', metavar='VOZ', help='Voces a incluir (nombre o clave de VOICE_INFO).')
+    parser.add_argument('--directorio', '-d', type=str, default=DIRECTORIO, help='Carpeta de salida.')
+    parser.add_argument('--manifest', '-m', type=str, help='Manifiesto JSONL (por defecto <directorio>/manifest.jsonl).')
+    parser.add_argument('--perfil', '-p', type=str, help='Perfil de audio de las variantes (ver perfiles.py).')
+    parser.add_argument('--concurrencia', '-c', type=int, default=CONCURRENCIA, help='Síntesis simultáneas como máximo.')
+    parser.add_argument('--sin-cache', action='store_true', help='No usar la caché de audio.')
+    parser.add_argument('--verbose', '-v', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING, format="%(message)s")
+
+    if not (args.idioma or args.familia or args.genero or args.voces):
+        parser.error("indicar al menos un filtro (--idioma, --familia, --genero) o --voces")
+    if args.ssml == "-":
+        ssml = sys.stdin.read()
+    elif args.ssml:
+        with open(args.ssml, "r", encoding="utf-8") as fh:
+            ssml = fh.read()
+    else:
+        from sintetizador import SSML as ssml
+
+    try:
+        voces = seleccionar_voces(args.idioma, args.familia, args.genero, args.voces)
+    except KeyError as e:
+        sys.exit(str(e))
+    if not voces:
+        sys.exit("Ninguna voz cumple los filtros.")
+
+    cache = None if args.sin_cache else AudioCache()
+    inicio = time.monotonic()
+    registros = ejecutar_audicion(ssml, voces, args.directorio, args.manifest, cache=cache,
+                                  perfil=args.perfil, concurrencia=args.concurrencia)
+    total = time.monotonic() - inicio
+
+    print(tabla(registros))
+    ok = [r for r in registros if r["estado"] == "ok"]
+    print(f"\n{len(ok)} de {len(registros)} voces en {total:.2f} s "
+          f"(la más lenta: {max((r['segundos'] for r in registros), default=0):.2f} s); "
+          f"costo total: {sum(r['usd'] for r in registros):.5f} USD")
+    print(f"Manifiesto escrito en: {args.manifest or os.path.join(args.directorio, 'manifest.jsonl')}")
+    if len(ok) < len(registros):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# bench_ensamblado.py
+# Pico de memoria (RSS) al sintetizar guiones largos contra el backend falso,
+# según la duración del audio:
+#   memoria  une los fragmentos en un solo bytes (unir_mp3) y lo escribe
+#   disco    fragmentos.sintetizar_largo: cada fragmento se copia a su offset
+#            del archivo de salida (ensamblado.py)
+# Cada medición corre en un proceso aparte para que el pico no se arrastre.
+# Con "disco" el pico debe mantenerse plano al crecer la duración.
+#
+# Uso:
+#   python benchmarks/bench_ensamblado.py
+#   python benchmarks/bench_ensamblado.py --minutos 30,120,480 --metodo mmap
+
+import argparse
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# El backend falso no tiene cuota: que el limitador de cuota.py no frene las mediciones
+os.environ.setdefault("TTS_RATE", "1000000")
+
+MODOS = ["memoria", "disco"]
+# Caracteres por segundo de habla (misma cuenta que fake_tts.BYTES_POR_CARACTER)
+CARACTERES_POR_SEGUNDO = 15
+VOZ = "es-US-Wavenet-A"
+
+
+def guion(minutos: float) -> str:
+    oraciones = int(minutos * 60 * CARACTERES_POR_SEGUNDO / 40) + 1
+    return "<speak>" + " ".join(f"Oración número {i:07d} del audiolibro." for i in range(oraciones)) + "</speak>"
+
+
+def pico_rss_mb() -> float:
+    import resource
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa KB; macOS, bytes
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+def hijo(modo: str, minutos: float, metodo: str) -> dict:
+    from concurrent.futures import ThreadPoolExecutor
+    import ensamblado
+    from fake_tts import FakeConfig, FakeTTSClient
+    from fragmentos import CONCURRENCIA, dividir_ssml, sintetizar_largo, tags_permitidos, unir_mp3
+    from sintetizador import preparar_sintesis, sintetizar_bytes
+    from voces import resolve_voice
+
+    if metodo != "auto":
+        ensamblado.metodo_disponible = lambda: metodo
+    client = FakeTTSClient(FakeConfig(latencia=0.0))
+    ssml = guion(minutos)
+    base = pico_rss_mb()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        salida = os.path.join(tmp, "salida.mp3")
+        if modo == "disco":
+            fragmentos = sintetizar_largo(ssml, VOZ, salida, client=client)
+        else:
+            partes_ssml = dividir_ssml(ssml, tags_permitidos(resolve_voice(VOZ)[2]))
+            preparados = [preparar_sintesis(f, VOZ) for f in partes_ssml]
+            with ThreadPoolExecutor(max_workers=CONCURRENCIA) as pool:
+                partes = list(pool.map(lambda p: sintetizar_bytes(p[0], p[1], p[2], client=client), preparados))
+            with open(salida, "wb") as out:
+                out.write(unir_mp3(partes))
+            fragmentos = len(partes)
+            del partes
+        tamanio = os.path.getsize(salida)
+
+    return {"modo": modo, "minutos": minutos, "fragmentos": fragmentos,
+            "salida_mb": round(tamanio / (1024 * 1024), 1), "rss_base_mb": round(base, 1),
+            "rss_pico_mb": round(pico_rss_mb(), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pico de RSS al ensamblar audio largo (memoria vs. disco).")
+    parser.add_argument('--minutos', default="15,60,240", help='Duraciones a medir, separadas por comas.')
+    parser.add_argument('--modos', default=",".join(MODOS))
+    parser.add_argument('--metodo', default="auto", help='auto | copy_file_range | sendfile | mmap (modo disco).')
+    parser.add_argument('--hijo', nargs=2, metavar=("MODO", "MINUTOS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.hijo:
+        print(json.dumps(hijo(args.hijo[0], float(args.hijo[1]), args.metodo)))
+        return
+
+    if importlib.util.find_spec("resource") is None:
+        sys.exit("Este benchmark necesita el módulo resource (Linux/macOS).")
+
+    print(f"{'modo':<8} {'minutos':>8} {'fragm.':>7} {'salida MB':>10} {'RSS base MB':>12} {'RSS pico MB':>12} {'Δ MB':>7}")
+    for minutos in [float(m) for m in args.minutos.split(",") if m.strip()]:
+        for modo in [m.strip() for m in args.modos.split(",") if m.strip()]:
+            proc = subprocess.run([sys.executable, __file__, "--hijo", modo, str(minutos), "--metodo", args.metodo],
+                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            if proc.returncode != 0:
+                error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"código {proc.returncode}"
+                print(f"{modo:<8} {minutos:>8g} error: {error}")
+                continue
+            r = json.loads(proc.stdout.strip().splitlines()[-1])
+            print(f"{r['modo']:<8} {r['minutos']:>8g} {r['fragmentos']:>7} {r['salida_mb']:>10.1f} "
+                  f"{r['rss_base_mb']:>12.1f} {r['rss_pico_mb']:>12.1f} {r['rss_pico_mb'] - r['rss_base_mb']:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
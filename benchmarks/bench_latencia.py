@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# bench_latencia.py
+# Benchmark de extremo a extremo contra el backend falso (fake_tts.py): no usa
+# red ni credenciales, así que sirve en CI para detectar regresiones.
+#
+# Escenarios (cada uno con varios niveles de concurrencia):
+#   sintetizar  sintetizador.sintetizar_audio con FakeTTSClient (ruta gRPC)
+#   rest        check_synthesize_rest.post_synthesize contra el servidor REST falso
+#   sanitizer   voces.sanitize_ssml_for_chirp
+#   costos      costs_models.count_chars + estimate_cost
+# Reporta latencia p50/p95/p99 por llamada y clips por segundo.
+#
+# Uso:
+#   python benchmarks/bench_latencia.py
+#   python benchmarks/bench_latencia.py --latencia 0.08 --tasa-error 0.02 --guardar base.json
+#   python benchmarks/bench_latencia.py --comparar base.json --tolerancia 0.25   # sale con 1 si empeora
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# El backend falso no tiene cuota: que el limitador de cuota.py no frene las mediciones
+os.environ.setdefault("TTS_RATE", "1000000")
+
+from configuracion import cargar_config
+from fake_tts import MAX_INPUT_BYTES, FakeConfig, FakeTTSClient, iniciar_servidor
+
+ESCENARIOS = ["sintetizar", "rest", "sanitizer", "costos"]
+
+
+def documentos():
+    """SSML de prueba: los del repo más uno largo (fuerza la ruta por fragmentos)."""
+    docs = [(ROOT / "ssml_to_send.xml").read_text(encoding="utf-8")]
+    ssml = cargar_config().get("SSML")
+    if ssml:
+        docs.append(ssml)
+    docs.append("<speak>" + " ".join(f"Oración número {i} del guion largo." for i in range(250)) + "</speak>")
+    return docs
+
+
+def percentil(valores, p):
+    return statistics.quantiles(valores, n=100, method="inclusive")[p - 1] if len(valores) > 1 else valores[0]
+
+
+def correr(fn, n: int, concurrencia: int):
+    """
+    Ejecuta fn(i) n veces con `concurrencia` hilos.
+    Devuelve (latencias, errores, segundos, primer error o None).
+    """
+    latencias, errores, primero = [], 0, None
+    lock = threading.Lock()
+
+    def una(i):
+        nonlocal errores, primero
+        t0 = time.perf_counter()
+        error = None
+        try:
+            fn(i)
+        except Exception as e:
+            error = e
+        dt = time.perf_counter() - t0
+        with lock:
+            if error is None:
+                latencias.append(dt)
+            else:
+                errores += 1
+                primero = primero or error
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        list(pool.map(una, range(n)))
+    return latencias, errores, time.perf_counter() - t0, primero
+
+
+def escenario(nombre: str, config: FakeConfig, docs, voz: str, tmp: Path):
+    """Devuelve la función a medir para el escenario, o lanza ImportError si falta una dependencia."""
+    if nombre == "sintetizar":
+        from sintetizador import sintetizar_audio
+        client = FakeTTSClient(config)
+        return lambda i: sintetizar_audio(docs[i % len(docs)], voz, str(tmp / f"{i}.mp3"), client=client)
+
+    if nombre == "rest":
+        import requests
+        from check_synthesize_rest import post_synthesize
+        servidor, endpoint = iniciar_servidor(config)
+        sesiones = threading.local()
+        # La API rechaza entradas de más de 5000 bytes: por REST solo van los cortos
+        docs = [d for d in docs if len(d.encode("utf-8")) <= MAX_INPUT_BYTES] or docs
+
+        def llamar(i):
+            if not hasattr(sesiones, "s"):
+                sesiones.s = requests.Session()
+            resp = post_synthesize(docs[i % len(docs)], voz, "es-US", endpoint=endpoint, session=sesiones.s)
+            resp.raise_for_status()
+        llamar.servidor = servidor
+        return llamar
+
+    if nombre == "sanitizer":
+        from voces import sanitize_ssml_for_chirp
+        return lambda i: sanitize_ssml_for_chirp(docs[i % len(docs)])
+
+    if nombre == "costos":
+        from costs_models import count_chars, estimate_cost
+        return lambda i: estimate_cost(count_chars(docs[i % len(docs)])[0], "wavenet", 4.0, 0)
+
+    raise ValueError(nombre)
+
+
+def comparar(resultados, base_path: str, tolerancia: float) -> int:
+    """Cuenta los casos cuyo p95 empeoró más que `tolerancia` respecto de la base."""
+    base = {(r["escenario"], r["concurrencia"]): r for r in json.loads(Path(base_path).read_text(encoding="utf-8"))}
+    regresiones = 0
+    for r in resultados:
+        b = base.get((r["escenario"], r["concurrencia"]))
+        if not b or not b["p95_ms"]:
+            continue
+        cambio = r["p95_ms"] / b["p95_ms"] - 1
+        if cambio > tolerancia:
+            regresiones += 1
+            print(f"  REGRESIÓN {r['escenario']} c={r['concurrencia']}: p95 {b['p95_ms']:.2f} -> {r['p95_ms']:.2f} ms (+{cambio:.0%})")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia y throughput de la ruta de síntesis contra el backend falso.")
+    parser.add_argument('--escenarios', default=",".join(ESCENARIOS), help='Lista separada por comas.')
+    parser.add_argument('--concurrencia', default="1,8,32", help='Niveles de concurrencia separados por comas.')
+    parser.add_argument('--n', type=int, default=200, help='Llamadas por escenario y nivel.')
+    parser.add_argument('--voz', default="es-US-Chirp-HD-O")
+    parser.add_argument('--latencia', type=float, default=0.02, help='Latencia del backend falso (segundos).')
+    parser.add_argument('--jitter', type=float, default=0.005)
+    parser.add_argument('--tasa-error', type=float, default=0.0)
+    parser.add_argument('--bytes-audio', type=int, default=None)
+    parser.add_argument('--guardar', type=str, help='Escribe los resultados en JSON.')
+    parser.add_argument('--comparar', type=str, help='JSON de una corrida anterior: falla si el p95 empeora.')
+    parser.add_argument('--tolerancia', type=float, default=0.25, help='Empeoramiento de p95 admitido (0.25 = 25%%).')
+    args = parser.parse_args()
+
+    config = FakeConfig(latencia=args.latencia, jitter=args.jitter, tasa_error=args.tasa_error,
+                        bytes_audio=args.bytes_audio, semilla=1)
+    docs = documentos()
+    niveles = [int(c) for c in args.concurrencia.split(",") if c.strip()]
+    resultados = []
+
+    print(f"{'escenario':<11} {'conc':>5} {'ok':>6} {'err':>5} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'clips/s':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for nombre in [e.strip() for e in args.escenarios.split(",") if e.strip()]:
+            try:
+                fn = escenario(nombre, config, docs, args.voz, Path(tmp))
+            except ImportError as e:
+                print(f"{nombre:<11} omitido (falta {e.name})")
+                continue
+            for c in niveles:
+                # sintetizar_audio imprime por llamada: se descarta esa salida
+                with contextlib.redirect_stdout(io.StringIO()):
+                    latencias, errores, segundos, primero = correr(fn, args.n, c)
+                r = {
+                    "escenario": nombre, "concurrencia": c, "ok": len(latencias), "errores": errores,
+                    "p50_ms": percentil(latencias, 50) * 1e3 if latencias else 0.0,
+                    "p95_ms": percentil(latencias, 95) * 1e3 if latencias else 0.0,
+                    "p99_ms": percentil(latencias, 99) * 1e3 if latencias else 0.0,
+                    "clips_por_s": len(latencias) / segundos if segundos else 0.0,
+                }
+                resultados.append(r)
+                print(f"{nombre:<11} {c:>5} {r['ok']:>6} {errores:>5} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} "
+                      f"{r['p99_ms']:>9.2f} {r['clips_por_s']:>9.1f}")
+                if primero is not None:
+                    print(f"{'':<11} primer error: {primero!r}")
+            if hasattr(fn, "servidor"):
+                fn.servidor.shutdown()
+
+    if args.guardar:
+        Path(args.guardar).write_text(json.dumps(resultados, indent=2), encoding="utf-8")
+        print(f"\nResultados guardados en: {args.guardar}")
+    if args.comparar and comparar(resultados, args.comparar, args.tolerancia):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
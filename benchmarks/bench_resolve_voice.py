@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# bench_resolve_voice.py
+# Micro-benchmark de voces.resolve_voice: el costo por búsqueda debe mantenerse
+# constante aunque crezca la tabla de voces.
+#
+# Uso:
+#   python benchmarks/bench_resolve_voice.py
+
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import voces
+
+TAMANIOS = [3, 50, 500, 5_000, 50_000]
+FAMILIAS = ["Standard", "Wavenet", "Neural2", "Chirp-HD", "Chirp3-HD"]
+
+
+def tabla_sintetica(n):
+    tabla = {}
+    i = 0
+    while len(tabla) < n:
+        name = f"x{i:05d}-US-{FAMILIAS[i % len(FAMILIAS)]}-{i}"
+        tabla[name] = {"name": name, "languageCode": f"x{i:05d}-US", "type": "wavenet", "price_per_million": 4.0}
+        i += 1
+    return tabla
+
+
+def main():
+    original = voces.VOICE_INFO
+    print(f"{'voces':>8}  {'exacta (µs)':>12}  {'mayúsc. (µs)':>12}  {'alias (µs)':>11}  {'prefijo (µs)':>12}")
+    try:
+        for n in TAMANIOS:
+            voces.VOICE_INFO = voces.VoiceTable(tabla_sintetica(n))
+            ultimo = list(voces.VOICE_INFO)[-1]
+            alias = ultimo.split("-", 2)[2]
+            prefijo = ultimo.rsplit("-", 1)[0]  # único: el número identifica a la voz
+            voces.resolve_voice(ultimo)  # construye el índice
+
+            res = []
+            for clave in (ultimo, ultimo.upper(), alias, prefijo):
+                t = timeit.Timer(lambda clave=clave: voces.resolve_voice(clave))
+                loops, _ = t.autorange()
+                res.append(min(t.repeat(3, loops)) / loops * 1e6)
+            print(f"{n:>8}  {res[0]:>12.2f}  {res[1]:>12.2f}  {res[2]:>11.2f}  {res[3]:>12.2f}")
+    finally:
+        voces.VOICE_INFO = original
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# bench_sanitizer.py
+# Compara voces.sanitize_ssml_for_chirp (recorrido de una sola pasada) con la
+# implementación regex de referencia: primero verifica que la salida sea
+# idéntica byte a byte sobre un corpus de referencia y luego mide ambas sobre
+# entradas de 1 KB a 1 MB.
+#
+# Uso:
+#   python benchmarks/bench_sanitizer.py
+
+import random
+import sys
+import timeit
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from configuracion import cargar_config
+import voces
+
+TAMANIOS = [1_000, 10_000, 100_000, 1_000_000]
+
+
+def sanitize_regex(ssml: str) -> str:
+    """sanitize_ssml_for_chirp sobre la implementación regex de referencia."""
+    if not ssml:
+        return "<speak><p></p></speak>"
+    s_tags = "".join(f"<s>{c}</s>" for c in voces._split_ssml_sentences_regex(ssml))
+    return f"<speak><p>{s_tags}</p></speak>"
+
+
+def corpus_referencia():
+    """Casos reales del repo, casos borde escritos a mano y documentos generados."""
+    casos = [
+        (ROOT / "ssml_to_send.xml").read_text(encoding="utf-8"),
+        "",
+        "<speak></speak>",
+        "<speak>Hola mundo</speak>",
+        "texto plano sin tags? sí",
+        "<speak><p>Hola. Chau!</p><p><s>Uno</s><s>dos</s></p></speak>",
+        "<speak><prosody rate='slow'>lento <break time='1s'/> y<audio src='x'>a</audio> fin.</prosody></speak>",
+        "<speak><emphasis>A</emphasis>. <say-as interpret-as='date'>x</say-as></speak>",
+        "<speak><par><media><audio src='a.mp3'/></media><media>texto</media></par>Sigue.</speak>",
+        "<speak><sub alias=\"Sr. Pérez\">Sr. P.</sub> llegó… ¿Y vos?\r\nBien!\r\n\r\nOtro párrafo.</speak>",
+        "<SPEAK version='1.1'><P><S>Mayúsculas.</S></P>\t\t<mark name='m1'/>fin</SPEAK>\n",
+        "<speak><p>Uno</p >< /p x>dos<p_x>tres</p>\n\n\n<s/>cuatro</speak>",
+        "<speak><audio src='x'/> sin cierre <break/> y <par/> suelto</speak>",
+    ]
+    ssml = cargar_config().get("SSML")
+    if ssml:
+        casos.append(ssml)
+    rng = random.Random(4246)
+    casos.extend(documento(rng, rng.randint(200, 5_000)) for _ in range(200))
+    return casos
+
+
+def documento(rng: random.Random, tam: int) -> str:
+    """SSML publicitario sintético de aproximadamente `tam` caracteres."""
+    frases = [
+        "Ese momento <break time=\"350ms\"/> cuando todos miran.",
+        "Con los Air Max, <emphasis level=\"strong\">cada detalle</emphasis> cuenta!",
+        "Diseño moderno, <break time=\"250ms\"/>\n  comodidad total",
+        "<say-as interpret-as=\"cardinal\">10</say-as>% de descuento… ¿Qué esperás?",
+        "<prosody rate=\"slow\" pitch=\"-2st\">Envío gratis</prosody>.",
+        "<sub alias=\"World Wide Web\">WWW</sub> y <phoneme alphabet=\"ipa\" ph=\"ˈaɪ\">Air</phoneme>.",
+        "<audio src=\"https://ejemplo.com/jingle.mp3\">jingle</audio>",
+        "<par><media><audio src=\"a.mp3\"/></media></par>",
+        "</s><s>", "</p>\n\n<p>", "\r\n", "\t",
+    ]
+    partes, n = ["<speak>\n"], 0
+    while n < tam:
+        f = rng.choice(frases)
+        partes.append(f + rng.choice([" ", "\n  ", " ", "  "]))
+        n += len(f) + 1
+    partes.append("\n</speak>")
+    return "".join(partes)
+
+
+def verificar(casos) -> int:
+    errores = 0
+    for i, caso in enumerate(casos):
+        if voces.sanitize_ssml_for_chirp(caso) != sanitize_regex(caso):
+            errores += 1
+            print(f"  DIFERENCIA en el caso #{i}: {caso[:80]!r}")
+    return errores
+
+
+def medir(fn, arg) -> float:
+    t = timeit.Timer(lambda: fn(arg))
+    loops, _ = t.autorange()
+    return min(t.repeat(3, loops)) / loops
+
+
+def main():
+    casos = corpus_referencia()
+    errores = verificar(casos)
+    print(f"Corpus de referencia: {len(casos)} documentos, {errores} diferencias")
+
+    rng = random.Random(1)
+    docs = {tam: documento(rng, tam) for tam in TAMANIOS}
+    errores += verificar(docs.values())
+    if errores:
+        sys.exit(1)
+
+    print(f"\n{'tamaño':>10}  {'regex (ms)':>11}  {'1 pasada (ms)':>14}  {'mejora':>7}")
+    for doc in docs.values():
+        t_regex = medir(sanitize_regex, doc)
+        t_nuevo = medir(voces.sanitize_ssml_for_chirp, doc)
+        print(f"{len(doc):>10,}  {t_regex * 1e3:>11.3f}  {t_nuevo * 1e3:>14.3f}  {t_regex / t_nuevo:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
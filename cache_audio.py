@@ -0,0 +1,174 @@
+# cache_audio.py
+# Caché persistente en disco para el audio sintetizado, direccionada por contenido.
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from perfiles import extension
+
+CACHE_DIR = ".cache_audio"
+CACHE_MAX_BYTES = 500 * 1024 * 1024      # 500 MB
+CACHE_MAX_AGE = 30 * 24 * 3600           # 30 días
+
+
+def cache_key(ssml: str, voice_name: str, language_code: str, audio_config: Dict) -> str:
+    """
+    Calcula la clave de caché a partir del SSML ya sanitizado, la voz resuelta,
+    el código de idioma y la configuración de audio (dict serializable). La
+    clave lleva la extensión del formato ('<sha256>.ogg'), que es el nombre
+    del archivo en la caché; para MP3 coincide con el de las entradas previas.
+    """
+    payload = json.dumps(
+        {
+            "ssml": ssml,
+            "voice": voice_name,
+            "language_code": language_code,
+            "audio_config": audio_config,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest() + extension(audio_config)
+
+
+class AudioCache:
+    """
+    Caché de audio en disco. Cada entrada es un archivo con el nombre de su
+    clave dentro de `directory` (repartido en subcarpetas por los dos primeros
+    caracteres). Las claves sin extensión se guardan como <clave>.<ext>.
+    - max_bytes: tamaño total máximo; al superarlo se eliminan las entradas menos usadas.
+    - max_age: antigüedad máxima en segundos; las entradas más viejas se consideran miss.
+    Las escrituras son atómicas (archivo temporal + os.replace).
+    """
+
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES,
+                 max_age: Optional[float] = CACHE_MAX_AGE, ext: str = "mp3"):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.ext = ext
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._approx_bytes = None  # tamaño estimado; se recalcula en evict()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / (key if "." in key else f"{key}.{self.ext}")
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Devuelve el audio cacheado o None (y contabiliza hit/miss)."""
+        path = self._path(key)
+        try:
+            st = path.stat()
+            if self.max_age is not None and time.time() - st.st_mtime > self.max_age:
+                path.unlink()
+                raise FileNotFoundError(path)
+            data = path.read_bytes()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        # Actualizar atime para que la evicción sea LRU aunque el FS use noatime
+        try:
+            os.utime(path, (time.time(), st.st_mtime))
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def contiene(self, key: str) -> bool:
+        """True si hay una entrada vigente para `key` (no cuenta como hit/miss)."""
+        try:
+            st = self._path(key).stat()
+        except FileNotFoundError:
+            return False
+        return self.max_age is None or time.time() - st.st_mtime <= self.max_age
+
+    def ruta(self, key: str, contar_hit: bool = False) -> Optional[Path]:
+        """
+        Ruta del archivo de una entrada vigente, sin leerlo (None si no está).
+        Con contar_hit=True un acierto cuenta como hit, igual que en get().
+        """
+        path = self._path(key)
+        if not self.contiene(key):
+            return None
+        if contar_hit:
+            try:
+                os.utime(path, (time.time(), path.stat().st_mtime))
+            except OSError:
+                pass
+            with self._lock:
+                self.hits += 1
+        return path
+
+    def put(self, key: str, data: bytes) -> Path:
+        """Guarda el audio de forma atómica y aplica la política de evicción."""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        with self._lock:
+            needs_scan = self._approx_bytes is None
+            if not needs_scan:
+                self._approx_bytes += len(data)
+                needs_scan = self._approx_bytes > self.max_bytes
+        if needs_scan:
+            self.evict()
+        return path
+
+    def evict(self):
+        """Elimina entradas vencidas y, si se supera max_bytes, las de acceso más antiguo."""
+        if not self.directory.is_dir():
+            return
+        now = time.time()
+        entries = []
+        total = 0
+        for p in self.directory.glob("*/*.*"):
+            if p.suffix == ".tmp":
+                # Escritura en curso de put()
+                continue
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            if self.max_age is not None and now - st.st_mtime > self.max_age:
+                try:
+                    p.unlink()
+                except OSError:
+                    pass
+                continue
+            entries.append((st.st_atime, st.st_size, p))
+            total += st.st_size
+
+        if total > self.max_bytes:
+            entries.sort()
+            for _, size, p in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    p.unlink()
+                    total -= size
+                except OSError:
+                    pass
+        with self._lock:
+            self._approx_bytes = total
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# catalogo.py
+# Catálogo de voces indexado y persistido localmente a partir de list_voices.
+#
+# Se descarga una vez, se guarda en voces_catalogo.json con un TTL y se indexa
+# en memoria por idioma, género, familia de modelo y sample rate, de modo que
+# elegir o validar una voz no requiera llamadas de red. voces.resolve_voice
+# (y con ella validacion.py, lote.py, audicion.py...) busca en este catálogo
+# las voces que no están en VOICE_INFO.
+#
+# Uso:
+#   python catalogo.py --refrescar
+#   python catalogo.py --idioma es-US --familia chirp3 --genero FEMALE
+
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+log = logging.getLogger(__name__)
+
+CATALOGO_FILE = Path(os.environ.get("TTS_CATALOGO_FILE") or Path(__file__).parent / "voces_catalogo.json")
+CATALOGO_TTL = 24 * 3600  # segundos
+
+# Familia (según el nombre de la voz) -> tipo usado en VOICE_INFO
+TIPO_POR_FAMILIA = {
+    "standard": "standard",
+    "wavenet": "wavenet",
+    "neural2": "neural",
+    "news": "neural",
+    "polyglot": "neural",
+    "studio": "studio",
+    "chirp": "chirp3",
+    "chirp3": "chirp3",
+}
+
+# Precio en USD por 1,000,000 caracteres por tipo (actualizar según tarifas reales)
+PRECIO_POR_TIPO = {
+    "standard": 4.00,
+    "wavenet": 4.00,
+    "neural": 16.00,
+    "studio": 160.00,
+    "chirp3": 30.00,
+}
+
+
+# Índices de un catálogo. Es inmutable y se reemplaza entero en cada refresco,
+# así quien lo leyó antes sigue viendo un conjunto coherente
+Indice = namedtuple("Indice", "voces por_nombre por_idioma por_genero por_familia por_rate")
+
+
+def familia_de(nombre: str) -> str:
+    """'es-US-Chirp3-HD-Achernar' -> 'chirp3'; 'es-US-Wavenet-A' -> 'wavenet'."""
+    partes = nombre.split("-")
+    return partes[2].lower() if len(partes) > 2 else ""
+
+
+def voz_a_dict(v) -> Dict:
+    """Convierte un objeto Voice de la API en el registro compacto del catálogo."""
+    from listar import gender_name
+    return {
+        "name": v.name,
+        "languages": list(v.language_codes),
+        "gender": gender_name(v),
+        "rate": int(getattr(v, "natural_sample_rate_hertz", 0) or 0),
+    }
+
+
+def descargar_voces(client=None) -> List[Dict]:
+    """Llama a list_voices (todas las voces) y devuelve los registros del catálogo."""
+    if client is None:
+        from clientes import get_client
+        client = get_client()
+    from cuota import con_reintentos
+    return [voz_a_dict(v) for v in con_reintentos(client.list_voices, limiter=None).voices]
+
+
+class Catalogo:
+    """Voces con índices en memoria. Las búsquedas no hacen llamadas de red."""
+
+    def __init__(self, voces: Iterable[Dict], fetched_at: float = 0.0):
+        self.fetched_at = fetched_at
+        self._indexar(list(voces))
+
+    def _indexar(self, voces: List[Dict]):
+        por_nombre, por_idioma, por_genero, por_familia, por_rate = {}, {}, {}, {}, {}
+        for v in voces:
+            v = dict(v, family=familia_de(v["name"]))
+            por_nombre[v["name"].lower()] = v
+            for lang in v["languages"]:
+                por_idioma.setdefault(lang.lower(), []).append(v)
+            por_genero.setdefault(v["gender"].upper(), []).append(v)
+            por_familia.setdefault(v["family"], []).append(v)
+            por_rate.setdefault(v["rate"], []).append(v)
+        # Una sola asignación: una lectura concurrente ve el índice viejo o el nuevo, nunca una mezcla
+        self._indice = Indice(list(por_nombre.values()), por_nombre, por_idioma,
+                              por_genero, por_familia, por_rate)
+
+    @property
+    def voces(self) -> List[Dict]:
+        return self._indice.voces
+
+    def __len__(self):
+        return len(self._indice.voces)
+
+    def __contains__(self, nombre: str) -> bool:
+        return nombre.lower() in self._indice.por_nombre
+
+    def get(self, nombre: str) -> Optional[Dict]:
+        return self._indice.por_nombre.get(nombre.lower())
+
+    def buscar(self, idioma: Optional[str] = None, genero: Optional[str] = None,
+               familia: Optional[str] = None, sample_rate: Optional[int] = None) -> List[Dict]:
+        """Voces que cumplen todos los filtros indicados (intersección de índices)."""
+        indice = self._indice
+        candidatos = []
+        if idioma:
+            candidatos.append(indice.por_idioma.get(idioma.lower(), []))
+        if genero:
+            candidatos.append(indice.por_genero.get(genero.upper(), []))
+        if familia:
+            candidatos.append(indice.por_familia.get(familia.lower(), []))
+        if sample_rate:
+            candidatos.append(indice.por_rate.get(int(sample_rate), []))
+        if not candidatos:
+            return list(indice.voces)
+
+        candidatos.sort(key=len)
+        resto = [{id(v) for v in c} for c in candidatos[1:]]
+        return [v for v in candidatos[0] if all(id(v) in r for r in resto)]
+
+    def as_voice_info(self) -> Dict[str, Dict]:
+        """Entradas con el mismo formato que voces.VOICE_INFO."""
+        info = {}
+        for v in self.voces:
+            tipo = TIPO_POR_FAMILIA.get(v["family"], v["family"])
+            info[v["name"]] = {
+                "name": v["name"],
+                "languageCode": v["languages"][0] if v["languages"] else "es-US",
+                "type": tipo,
+                "price_per_million": PRECIO_POR_TIPO.get(tipo, 0.0),
+            }
+        return info
+
+    def refrescar(self, client=None, path: Path = CATALOGO_FILE):
+        """Descarga el catálogo, lo guarda en disco y reconstruye los índices."""
+        voces = descargar_voces(client)
+        self.fetched_at = time.time()
+        guardar_catalogo(voces, path, self.fetched_at)
+        self._indexar(voces)
+        usar_catalogo(self)
+
+    def refrescar_en_fondo(self, client=None, path: Path = CATALOGO_FILE) -> threading.Thread:
+        def tarea():
+            try:
+                self.refrescar(client, path)
+            except Exception as e:
+                log.warning("No se pudo refrescar el catálogo de voces: %s", e)
+        hilo = threading.Thread(target=tarea, name="refresco-catalogo", daemon=True)
+        hilo.start()
+        return hilo
+
+
+def guardar_catalogo(voces: List[Dict], path: Path = CATALOGO_FILE, fetched_at: Optional[float] = None):
+    """Escribe el catálogo en JSON compacto de forma atómica."""
+    path = Path(path)
+    data = {"fetched_at": fetched_at or time.time(), "voices": voces}
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as fh:
+        json.dump(data, fh, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def leer_catalogo(path: Path = CATALOGO_FILE) -> Optional[Catalogo]:
+    """El catálogo guardado en disco tal cual (sin red ni TTL), o None si no hay."""
+    path = Path(path)
+    if not path.is_file():
+        return None
+    with path.open(encoding="utf-8") as fh:
+        data = json.load(fh)
+    return Catalogo(data.get("voices", []), data.get("fetched_at", 0.0))
+
+
+def cargar_catalogo(path: Path = CATALOGO_FILE, ttl: float = CATALOGO_TTL, client=None,
+                    en_fondo: bool = True) -> Catalogo:
+    """
+    Carga el catálogo desde disco. Si no existe se descarga en el momento; si
+    está vencido se usa igualmente y se refresca en segundo plano (o en el
+    momento si en_fondo=False). resolve_voice pasa a usar este catálogo.
+    """
+    catalogo = leer_catalogo(path)
+    if catalogo is None:
+        catalogo = Catalogo([])
+        catalogo.refrescar(client, path)
+        return catalogo
+
+    usar_catalogo(catalogo)
+    if time.time() - catalogo.fetched_at > ttl:
+        if en_fondo:
+            catalogo.refrescar_en_fondo(client, path)
+        else:
+            catalogo.refrescar(client, path)
+    return catalogo
+
+
+def usar_catalogo(catalogo: Catalogo):
+    # Import diferido: voces importa este módulo para leer el catálogo persistido
+    from voces import usar_catalogo as registrar
+    registrar(catalogo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consulta el catálogo local de voces (descargado con list_voices).")
+    parser.add_argument('--refrescar', action='store_true', help='Descargar de nuevo el catálogo.')
+    parser.add_argument('--idioma', '-l', type=str, help='Código de idioma, ej. es-US.')
+    parser.add_argument('--genero', '-g', type=str, help='MALE | FEMALE | NEUTRAL.')
+    parser.add_argument('--familia', '-f', type=str, help='wavenet | neural2 | chirp3 | standard ...')
+    parser.add_argument('--sample-rate', '-r', type=int, help='Sample rate natural en Hz.')
+    args = parser.parse_args()
+
+    catalogo = cargar_catalogo(ttl=0 if args.refrescar else CATALOGO_TTL, en_fondo=False)
+
+    voces = catalogo.buscar(args.idioma, args.genero, args.familia, args.sample_rate)
+    for v in sorted(voces, key=lambda v: v["name"]):
+        print(f"{v['name']:<32} {','.join(v['languages']):<12} {v['gender']:<8} {v['rate']} Hz")
+    print(f"\n{len(voces)} de {len(catalogo)} voces")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,7 @@
 ### checkApi.py (fragmento)
 import os
-from google.oauth2 import service_account
-import google.auth.transport.requests
 import requests
+from clientes import get_access_token
 
 def check_api_enabled_rest(project_id, key_path=None):
     """
@@ -24,11 +23,8 @@ def check_api_enabled_rest(project_id, key_path=None):
         return False
 
     try:
-        scopes = ["https://www.googleapis.com/auth/cloud-platform"]
-        creds = service_account.Credentials.from_service_account_file(key_path, scopes=scopes)
-        auth_req = google.auth.transport.requests.Request()
-        creds.refresh(auth_req)  # obtiene token
-        token = creds.token
+        # Token cacheado hasta cerca de su vencimiento
+        token, _ = get_access_token(key_path)
 
         url = f"https://serviceusage.googleapis.com/v1/projects/{project_id}/services/texttospeech.googleapis.com"
         resp = requests.get(url, headers={"Authorization": f"Bearer {token}"}, timeout=10)
@@ -1,53 +1,119 @@
 #!/usr/bin/env python3
 # check_synthesize_rest.py
 # Llama al endpoint REST v1/text:synthesize y muestra la respuesta cruda
+#
+# Uso:
+#   python check_synthesize_rest.py
+#   python check_synthesize_rest.py --endpoint http://127.0.0.1:8099   # fake_tts.py
 
+import argparse
 import json
+import logging
+import os
 import sys
-from google.auth.transport.requests import Request
-import google.auth
-
-# Si querés usar tu SSML desde voice_input.py
-try:
-    from voice_input import SSML, VOICE
-except Exception:
-    # SSML de fallback mínimo si no existe voice_input.py
-    SSML = "<speak>Hola</speak>"
-    VOICE = "es-US-Chirp-HD-O"
-
-def get_access_token():
-    creds, project = google.auth.default(scopes=["https://www.googleapis.com/auth/cloud-platform"])
-    creds.refresh(Request())
-    return creds.token, project
-
-def call_synthesize(ssml_text, voice_name="es-US-Chirp-HD-O", language_code="es-US"):
-    token, project = get_access_token()
-    import requests
-    url = "https://texttospeech.googleapis.com/v1/text:synthesize"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json; charset=utf-8"
-    }
-    payload = {
+from typing import Optional
+
+from clientes import get_access_token
+from configuracion import cargar_config
+from cuota import CODIGOS_REINTENTABLES, ErrorReintentable, con_reintentos, parse_retry_after
+from metricas import span
+
+log = logging.getLogger(__name__)
+
+ENDPOINT_GOOGLE = "https://texttospeech.googleapis.com"
+# Base del endpoint REST; TTS_ENDPOINT permite apuntar a fake_tts.py u otro proxy
+ENDPOINT = os.environ.get("TTS_ENDPOINT", ENDPOINT_GOOGLE)
+
+# Si querés usar tu SSML desde voice_input.json / voice_input.py
+_config = cargar_config()
+# SSML de fallback mínimo si no hay configuración
+SSML = _config.get("SSML") or "<speak>Hola</speak>"
+VOICE = _config.get("VOICE") or "es-US-Chirp-HD-O"
+
+def construir_payload(ssml_text, voice_name, language_code):
+    return {
         "input": {"ssml": ssml_text},
         "voice": {"languageCode": language_code, "name": voice_name},
         "audioConfig": {"audioEncoding": "MP3"}
     }
-    print("==> Enviando petición REST a", url)
-    print("Payload (truncado a 1000 chars):")
-    s = json.dumps(payload, ensure_ascii=False, indent=2)
-    print(s[:1000])
-    resp = requests.post(url, headers=headers, json=payload)
+
+def post_synthesize(ssml_text, voice_name="es-US-Chirp-HD-O", language_code="es-US",
+                    endpoint: Optional[str] = None, token: Optional[str] = None, session=None):
+    """
+    POST a {endpoint}/v1/text:synthesize sin imprimir nada; devuelve la respuesta
+    de requests. Solo se pide token OAuth si el endpoint es el de Google y no se
+    pasó `token` (los endpoints locales de prueba no autentican).
+    Los 429/5xx se reintentan con backoff; si se agotan los intentos se
+    devuelve la última respuesta.
+    """
+    import requests
+    endpoint = (endpoint or ENDPOINT).rstrip("/")
+    if token is None and endpoint == ENDPOINT_GOOGLE:
+        token, _ = get_access_token()
+    headers = {"Content-Type": "application/json; charset=utf-8"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+
+    def enviar():
+        resp = (session or requests).post(f"{endpoint}/v1/text:synthesize", headers=headers,
+                                          json=construir_payload(ssml_text, voice_name, language_code))
+        if resp.status_code in CODIGOS_REINTENTABLES:
+            raise ErrorReintentable(resp.status_code, parse_retry_after(resp.headers.get("Retry-After")), resp)
+        return resp
+
+    try:
+        with span("llamada_api", via="rest"):
+            return con_reintentos(enviar)
+    except ErrorReintentable as e:
+        return e.respuesta
+
+def validar_local(ssml_text, voice_name) -> bool:
+    """
+    Valida el SSML tal cual se enviará (este script no sanitiza) e imprime los
+    problemas. Devuelve False si la API lo rechazaría.
+    """
+    from validacion import validar_ssml
+    from voces import resolve_voice
+    try:
+        _, _, voice_meta = resolve_voice(voice_name)
+    except KeyError:
+        voice_meta = None
+    # Sin sanitizar, los tags que una voz Chirp no admite también se envían: estricto
+    resultado = validar_ssml(ssml_text, voice_meta, ssml_a_enviar=ssml_text, estricto=True)
+    for e in resultado.errores:
+        print("SSML inválido:", e)
+    return resultado.valido
+
+def call_synthesize(ssml_text, voice_name="es-US-Chirp-HD-O", language_code="es-US",
+                    endpoint: Optional[str] = None, token: Optional[str] = None, validar: bool = True):
+    if validar and not validar_local(ssml_text, voice_name):
+        print("No se envía la petición (usar --sin-validar para enviarla igual).")
+        return None
+    url = f"{(endpoint or ENDPOINT).rstrip('/')}/v1/text:synthesize"
+    log.info("==> Enviando petición REST a %s", url)
+    if log.isEnabledFor(logging.DEBUG):
+        s = json.dumps(construir_payload(ssml_text, voice_name, language_code), ensure_ascii=False, indent=2)
+        log.debug("Payload (truncado a 1000 chars):\n%s", s[:1000])
+    resp = post_synthesize(ssml_text, voice_name, language_code, endpoint=endpoint, token=token)
     print("\n==> HTTP status:", resp.status_code)
     # imprimir body completo (posible JSON de error)
     try:
         print(json.dumps(resp.json(), indent=2, ensure_ascii=False))
     except Exception:
         print(resp.text)
+    return resp
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Llama a v1/text:synthesize y muestra la respuesta cruda.")
+    parser.add_argument('--endpoint', '-e', type=str, default=None, help=f'Base del endpoint REST (por defecto {ENDPOINT}).')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Mostrar también el payload enviado.')
+    parser.add_argument('--sin-validar', action='store_true', help='Enviar aunque la validación local falle.')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format="%(message)s")
     try:
-        call_synthesize(SSML, VOICE, "es-US")
+        resp = call_synthesize(SSML, VOICE, "es-US", endpoint=args.endpoint, validar=not args.sin_validar)
     except Exception as e:
         print("Error al ejecutar la petición REST:", repr(e))
+        sys.exit(1)
+    if resp is None:
         sys.exit(1)
\ No newline at end of file
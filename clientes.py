@@ -0,0 +1,211 @@
+# clientes.py
+# Fábrica compartida de clientes de Text-to-Speech y tokens OAuth.
+#
+# Crear un TextToSpeechClient abre un canal gRPC y refrescar credenciales hace
+# un intercambio de token; ambas cosas se hacen una sola vez por juego de
+# credenciales y se reutilizan entre llamadas (y entre hilos).
+
+import datetime
+import os
+import queue
+import threading
+import weakref
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from metricas import span
+
+SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
+
+# Margen antes del vencimiento a partir del cual se refresca el token
+TOKEN_MARGIN = datetime.timedelta(minutes=5)
+
+# Protege los diccionarios de este módulo; nunca se toma durante una llamada de red
+_lock = threading.Lock()
+_clientes: Dict[str, object] = {}
+_credenciales: Dict[Tuple[str, Tuple[str, ...]], "_Credenciales"] = {}
+_pools: Dict[Tuple[str, int], "ClientPool"] = {}
+# Los clientes async quedan ligados al event loop en el que se crean
+_clientes_async: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def resolve_key_path(key_path: Optional[str] = None) -> Optional[str]:
+    """
+    Determina qué JSON de service account usar:
+    key_path explícito > GOOGLE_APPLICATION_CREDENTIALS > tts-sa-key.json junto al código.
+    Devuelve None si hay que usar las credenciales por defecto (ADC).
+    """
+    if key_path:
+        return str(key_path)
+
+    # Si la variable de entorno está definida y apunta a un archivo -> ADC la usará
+    env_path = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
+    if env_path and Path(env_path).is_file():
+        return None
+
+    # Fallback: buscar un archivo JSON común en el mismo directorio
+    candidate = Path(__file__).parent / "tts-sa-key.json"
+    if candidate.is_file():
+        return str(candidate)
+
+    # Último recurso: credenciales por defecto (puede fallar si no hay credenciales)
+    return None
+
+
+def _crear_cliente(key_path: Optional[str]):
+    from google.cloud import texttospeech
+    with span("crear_cliente"):
+        if key_path:
+            return texttospeech.TextToSpeechClient.from_service_account_file(key_path)
+        return texttospeech.TextToSpeechClient()
+
+
+def get_client(key_path: Optional[str] = None):
+    """Devuelve el cliente de larga vida para ese juego de credenciales (se crea la primera vez)."""
+    key_path = resolve_key_path(key_path)
+    cache_id = key_path or "adc"
+    client = _clientes.get(cache_id)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clientes.get(cache_id)
+        if client is None:
+            client = _crear_cliente(key_path)
+            _clientes[cache_id] = client
+    return client
+
+
+def get_async_client(key_path: Optional[str] = None):
+    """
+    Devuelve el TextToSpeechAsyncClient compartido del event loop actual para
+    ese juego de credenciales. Debe llamarse desde una corrutina.
+    """
+    import asyncio
+    loop = asyncio.get_running_loop()
+    key_path = resolve_key_path(key_path)
+    cache_id = key_path or "adc"
+    with _lock:
+        por_loop = _clientes_async.setdefault(loop, {})
+        client = por_loop.get(cache_id)
+        if client is None:
+            from google.cloud import texttospeech
+            with span("crear_cliente", tipo="async"):
+                if key_path:
+                    client = texttospeech.TextToSpeechAsyncClient.from_service_account_file(key_path)
+                else:
+                    client = texttospeech.TextToSpeechAsyncClient()
+            por_loop[cache_id] = client
+    return client
+
+
+def _token_vigente(creds) -> bool:
+    if not getattr(creds, "token", None):
+        return False
+    expiry = getattr(creds, "expiry", None)
+    if expiry is None:
+        return bool(getattr(creds, "valid", False))
+    # google-auth guarda expiry como datetime UTC sin zona horaria
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    return expiry - now > TOKEN_MARGIN
+
+
+class _Credenciales:
+    """Credenciales de un key_path + scopes, con su propio lock para cargarlas y refrescarlas."""
+    __slots__ = ("lock", "creds", "project")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.creds = None
+        self.project = None
+
+
+def get_access_token(key_path: Optional[str] = None, scopes=SCOPES) -> Tuple[str, Optional[str]]:
+    """
+    Devuelve (token, project_id). El token se cachea y solo se refresca cuando
+    falta menos de TOKEN_MARGIN para su vencimiento. La carga y el refresco
+    (llamadas de red) toman solo el lock de esas credenciales: no frenan la
+    creación de clientes ni los tokens de otras credenciales.
+    """
+    cache_id = (key_path or "adc", tuple(scopes))
+    with _lock:
+        entrada = _credenciales.get(cache_id)
+        if entrada is None:
+            entrada = _credenciales[cache_id] = _Credenciales()
+
+    with entrada.lock:
+        if entrada.creds is None:
+            if key_path:
+                from google.oauth2 import service_account
+                creds = service_account.Credentials.from_service_account_file(key_path, scopes=list(scopes))
+                project = getattr(creds, "project_id", None)
+            else:
+                import google.auth
+                creds, project = google.auth.default(scopes=list(scopes))
+            entrada.creds, entrada.project = creds, project
+
+        if not _token_vigente(entrada.creds):
+            from google.auth.transport.requests import Request
+            with span("refrescar_token"):
+                entrada.creds.refresh(Request())  # obtiene token
+        return entrada.creds.token, entrada.project
+
+
+class ClientPool:
+    """
+    Pool de clientes para llamadores concurrentes. Cada cliente tiene su propio
+    canal gRPC, así las llamadas simultáneas no compiten por uno solo.
+
+        pool = get_pool(4)
+        with pool.cliente() as client:
+            client.synthesize_speech(...)
+    """
+
+    def __init__(self, size: int = 4, key_path: Optional[str] = None):
+        self.size = size
+        self.key_path = resolve_key_path(key_path)
+        self._libres: "queue.Queue" = queue.Queue()
+        self._creados = 0
+        self._lock = threading.Lock()
+
+    def adquirir(self, timeout: Optional[float] = None):
+        try:
+            return self._libres.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._creados < self.size:
+                self._creados += 1
+                crear = True
+            else:
+                crear = False
+        if crear:
+            try:
+                return _crear_cliente(self.key_path)
+            except BaseException:
+                with self._lock:
+                    self._creados -= 1
+                raise
+        return self._libres.get(timeout=timeout)
+
+    def liberar(self, client):
+        self._libres.put(client)
+
+    @contextmanager
+    def cliente(self, timeout: Optional[float] = None):
+        client = self.adquirir(timeout)
+        try:
+            yield client
+        finally:
+            self.liberar(client)
+
+
+def get_pool(size: int = 4, key_path: Optional[str] = None) -> ClientPool:
+    """Devuelve el pool compartido de `size` clientes para ese juego de credenciales."""
+    cache_id = (resolve_key_path(key_path) or "adc", size)
+    with _lock:
+        pool = _pools.get(cache_id)
+        if pool is None:
+            pool = ClientPool(size, key_path)
+            _pools[cache_id] = pool
+    return pool
@@ -0,0 +1,145 @@
+# coalescer.py
+# Deduplicación en memoria de llamadas concurrentes idénticas ("single-flight").
+#
+# Si varios hilos piden el mismo audio a la vez, solo el primero llama a la
+# API; el resto espera y recibe el mismo resultado (o la misma excepción). No
+# guarda nada una vez terminada la llamada: para eso está AudioCache.
+#
+# hacer_async hace lo mismo para corrutinas y comparte las llamadas en vuelo
+# con hacer: un hilo y una corrutina que piden el mismo audio esperan una sola
+# llamada, sin importar cuál de los dos la hace.
+#
+# La cancelación o el timeout de quien hace la llamada son suyos: no se pasan
+# a los que esperan, que vuelven a intentarla (uno de ellos pasa a hacerla).
+
+import asyncio
+import threading
+from typing import Callable, Dict, Hashable
+
+from metricas import incrementar
+
+# Errores de quien hace la llamada, no de la llamada: no se comparten
+_PROPIOS = (asyncio.CancelledError, asyncio.TimeoutError)
+
+
+class _Llamada:
+    __slots__ = ("evento", "resultado", "error", "abandonada", "futuros")
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.error = None
+        # Quien la hacía se canceló o venció su timeout: sin resultado que compartir
+        self.abandonada = False
+        # (loop, future) de las corrutinas que esperan esta llamada
+        self.futuros = []
+
+    def terminar(self):
+        self.evento.set()
+        for loop, futuro in self.futuros:
+            try:
+                loop.call_soon_threadsafe(_despertar, futuro)
+            except RuntimeError:
+                pass  # el event loop de esa corrutina ya se cerró
+
+    def valor(self):
+        if self.error is not None:
+            raise self.error
+        return self.resultado
+
+
+def _despertar(futuro):
+    if not futuro.done():
+        futuro.set_result(None)
+
+
+class Coalescer:
+    """
+    Agrupa llamadas concurrentes con la misma clave en una sola ejecución.
+
+        coalescer = Coalescer()
+        audio = coalescer.hacer(clave, lambda: client.synthesize_speech(...))
+        audio = await coalescer.hacer_async(clave, lambda: async_client.synthesize_speech(...))
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._en_vuelo: Dict[Hashable, _Llamada] = {}
+        self.ejecutadas = 0
+        self.compartidas = 0
+
+    def _unirse(self, key: Hashable, loop=None):
+        # (llamada, espera): espera es None para quien hace la llamada; para
+        # el resto, el Event (hilos) o el future (corrutinas) que avisa al terminar
+        with self._lock:
+            llamada = self._en_vuelo.get(key)
+            if llamada is None:
+                llamada = self._en_vuelo[key] = _Llamada()
+                self.ejecutadas += 1
+                return llamada, None
+            self.compartidas += 1
+            if loop is None:
+                return llamada, llamada.evento
+            futuro = loop.create_future()
+            llamada.futuros.append((loop, futuro))
+            return llamada, futuro
+
+    def _terminar(self, key: Hashable, llamada: _Llamada):
+        # Las llamadas que lleguen después de esto ejecutan de nuevo
+        with self._lock:
+            del self._en_vuelo[key]
+        llamada.terminar()
+
+    def hacer(self, key: Hashable, fn: Callable, *args, **kwargs):
+        while True:
+            llamada, espera = self._unirse(key)
+            if espera is None:
+                break
+            incrementar("llamadas_compartidas")
+            espera.wait()
+            if not llamada.abandonada:
+                return llamada.valor()
+
+        try:
+            llamada.resultado = fn(*args, **kwargs)
+            return llamada.resultado
+        except _PROPIOS:
+            llamada.abandonada = True
+            raise
+        except BaseException as e:
+            llamada.error = e
+            raise
+        finally:
+            self._terminar(key, llamada)
+
+    async def hacer_async(self, key: Hashable, fn: Callable, *args, **kwargs):
+        """Como hacer, para una función que devuelve una corrutina (await fn(...))."""
+        loop = asyncio.get_running_loop()
+        while True:
+            llamada, espera = self._unirse(key, loop)
+            if espera is None:
+                break
+            incrementar("llamadas_compartidas")
+            await espera
+            if not llamada.abandonada:
+                return llamada.valor()
+
+        try:
+            llamada.resultado = await fn(*args, **kwargs)
+            return llamada.resultado
+        except _PROPIOS:
+            llamada.abandonada = True
+            raise
+        except BaseException as e:
+            llamada.error = e
+            raise
+        finally:
+            self._terminar(key, llamada)
+
+    def en_vuelo(self) -> int:
+        with self._lock:
+            return len(self._en_vuelo)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"ejecutadas": self.ejecutadas, "compartidas": self.compartidas}
@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+# cola.py
+# Cola de trabajos de síntesis persistente en SQLite, con reanudación tras una
+# caída.
+#
+# Los trabajos se cargan desde el mismo JSONL que lote.py ({ssml, voice,
+# output, ...}). Cada uno guarda su estado (pendiente, en_curso, ok, error),
+# la ruta de salida y el SHA-256 del audio escrito. Los workers toman trabajos
+# con un lease que renuevan mientras sintetizan. Si un proceso muere, su lease
+# vence y otro worker retoma el trabajo, y lo ya terminado no se vuelve a
+# sintetizar ni a facturar. Varios procesos pueden trabajar sobre la misma base.
+#
+# Uso:
+#   python cola.py encolar trabajos.jsonl
+#   python cola.py procesar --workers 8          # se puede lanzar en varias máquinas/procesos
+#   python cola.py procesar trabajos.jsonl       # encola y procesa (volver a correrlo reanuda)
+#   python cola.py estado
+#   python cola.py verificar                     # re-encola salidas borradas o modificadas
+#   python cola.py reintentar                    # vuelve a pendiente los trabajos con error
+#   python cola.py manifiesto manifest.jsonl
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+from cuota import backoff, es_reintentable
+import metricas
+import presupuesto
+
+log = logging.getLogger(__name__)
+
+COLA_DB = os.environ.get("TTS_COLA_DB", "cola_tts.db")
+LEASE = 300.0            # segundos; se renueva cada LEASE / 3 mientras el trabajo corre
+MAX_INTENTOS = 3
+WORKERS = 8
+ESPERA_VACIA = 0.5       # segundos entre consultas cuando solo quedan trabajos en backoff
+
+ESTADOS = ("pendiente", "en_curso", "ok", "error")
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS trabajos (
+    id          INTEGER PRIMARY KEY,
+    clave       TEXT NOT NULL UNIQUE,
+    origen      TEXT,
+    linea       INTEGER,
+    trabajo     TEXT NOT NULL,
+    output      TEXT,
+    estado      TEXT NOT NULL DEFAULT 'pendiente',
+    intentos    INTEGER NOT NULL DEFAULT 0,
+    disponible  REAL NOT NULL DEFAULT 0,
+    worker      TEXT,
+    lease_hasta REAL,
+    sha256      TEXT,
+    bytes       INTEGER,
+    error       TEXT,
+    actualizado REAL
+);
+CREATE INDEX IF NOT EXISTS trabajos_estado ON trabajos (estado, disponible, id);
+"""
+
+
+def clave_trabajo(trabajo: Dict) -> str:
+    """Identidad del trabajo: su contenido, sin el número de línea."""
+    datos = {k: v for k, v in trabajo.items() if k != "linea"}
+    return hashlib.sha256(json.dumps(datos, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def sha256_archivo(path: str) -> Tuple[str, int]:
+    """(SHA-256, tamaño) leyendo el archivo por bloques."""
+    h = hashlib.sha256()
+    total = 0
+    with open(path, "rb") as fh:
+        for bloque in iter(lambda: fh.read(1024 * 1024), b""):
+            h.update(bloque)
+            total += len(bloque)
+    return h.hexdigest(), total
+
+
+def proceso_vivo(pid: int) -> bool:
+    if os.name == "nt":
+        # En Windows os.kill terminaría el proceso: se espera al lease
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ColaTrabajos:
+    """
+    Cola de trabajos en una base SQLite (modo WAL). Cada hilo usa su propia
+    conexión; las transiciones de estado son transacciones cortas.
+
+        cola = ColaTrabajos("cola_tts.db")
+        cola.encolar("trabajos.jsonl")
+        cola.procesar(workers=8)
+    """
+
+    def __init__(self, path: str = COLA_DB, lease: float = LEASE, max_intentos: int = MAX_INTENTOS):
+        self.path = path
+        self.lease = lease
+        self.max_intentos = max_intentos
+        self._local = threading.local()
+        self._prefijo = f"{socket.gethostname()}:{os.getpid()}"
+        self._conexion().executescript(_ESQUEMA)
+
+    def _conexion(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaccion(self):
+        """BEGIN IMMEDIATE: toma el lock de escritura al empezar, sin carreras entre workers."""
+        db = self._conexion()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    # --- carga -----------------------------------------------------------
+
+    def encolar(self, path: str) -> Dict[str, int]:
+        """
+        Agrega los trabajos del JSONL. Un trabajo idéntico ya encolado (en
+        cualquier estado) no se duplica, así volver a encolar el mismo archivo
+        reanuda en lugar de repetir. Las líneas inválidas quedan como error.
+        """
+        from lote import leer_trabajos
+
+        resumen = {"nuevos": 0, "existentes": 0, "invalidos": 0}
+        ahora = time.time()
+        with self._transaccion() as db:
+            for trabajo in leer_trabajos(path):
+                if "error" in trabajo:
+                    estado, error = "error", trabajo["error"]
+                    clave = hashlib.sha256(f"{os.path.abspath(path)}:{trabajo['linea']}".encode()).hexdigest()
+                else:
+                    estado, error = "pendiente", None
+                    clave = clave_trabajo(trabajo)
+                cursor = db.execute(
+                    "INSERT OR IGNORE INTO trabajos (clave, origen, linea, trabajo, output, estado, error, actualizado)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (clave, path, trabajo["linea"], json.dumps(trabajo, ensure_ascii=False),
+                     trabajo.get("output"), estado, error, ahora))
+                if cursor.rowcount == 0:
+                    resumen["existentes"] += 1
+                elif estado == "error":
+                    resumen["invalidos"] += 1
+                else:
+                    resumen["nuevos"] += 1
+        return resumen
+
+    # --- leases ------------------------------------------------------------
+
+    def tomar(self, worker: str) -> Optional[Tuple[int, Dict]]:
+        """
+        Toma el siguiente trabajo disponible (pendiente o con el lease vencido)
+        y lo marca en_curso para `worker`. Devuelve (id, trabajo) o None.
+        """
+        ahora = time.time()
+        with self._transaccion() as db:
+            while True:
+                fila = db.execute(
+                    "SELECT id, trabajo, intentos, estado FROM trabajos"
+                    " WHERE (estado = 'pendiente' AND disponible <= ?)"
+                    "    OR (estado = 'en_curso' AND lease_hasta < ?)"
+                    " ORDER BY id LIMIT 1", (ahora, ahora)).fetchone()
+                if fila is None:
+                    return None
+                if fila["estado"] == "en_curso" and fila["intentos"] >= self.max_intentos:
+                    # El worker murió en cada intento: no insistir
+                    db.execute("UPDATE trabajos SET estado = 'error', error = ?, worker = NULL, actualizado = ?"
+                               " WHERE id = ?",
+                               (f"lease vencido {fila['intentos']} veces", ahora, fila["id"]))
+                    continue
+                if fila["estado"] == "en_curso":
+                    log.warning("Cola: retomando el trabajo %d (lease vencido)", fila["id"])
+                db.execute("UPDATE trabajos SET estado = 'en_curso', worker = ?, lease_hasta = ?,"
+                           " intentos = intentos + 1, actualizado = ? WHERE id = ?",
+                           (worker, ahora + self.lease, ahora, fila["id"]))
+                return fila["id"], json.loads(fila["trabajo"])
+
+    def recuperar_huerfanos(self) -> int:
+        """
+        Vence ya el lease de los trabajos en curso de procesos de esta máquina
+        que no existen más (caída, kill -9), así se retoman sin esperar al lease.
+        """
+        host = socket.gethostname()
+        muertos = []
+        for fila in self._conexion().execute("SELECT id, worker FROM trabajos WHERE estado = 'en_curso'"
+                                             " AND worker LIKE ?", (host + ":%",)):
+            pid = fila["worker"][len(host) + 1:].split(":")[0]
+            if pid.isdigit() and int(pid) != os.getpid() and not proceso_vivo(int(pid)):
+                muertos.append(fila["id"])
+        with self._transaccion() as db:
+            db.executemany("UPDATE trabajos SET lease_hasta = 0 WHERE id = ? AND estado = 'en_curso'",
+                           [(i,) for i in muertos])
+        return len(muertos)
+
+    def renovar(self) -> int:
+        """Extiende el lease de todos los trabajos en curso de este proceso."""
+        ahora = time.time()
+        with self._transaccion() as db:
+            return db.execute("UPDATE trabajos SET lease_hasta = ? WHERE estado = 'en_curso' AND worker LIKE ?",
+                              (ahora + self.lease, self._prefijo + ":%")).rowcount
+
+    def completar(self, id_trabajo: int, worker: str, output: str):
+        """Marca ok con el checksum de la salida (solo si el worker sigue siendo el dueño)."""
+        sha, n = sha256_archivo(output)
+        with self._transaccion() as db:
+            db.execute("UPDATE trabajos SET estado = 'ok', sha256 = ?, bytes = ?, error = NULL, worker = NULL,"
+                       " lease_hasta = NULL, actualizado = ? WHERE id = ? AND worker = ?",
+                       (sha, n, time.time(), id_trabajo, worker))
+
+    def fallar(self, id_trabajo: int, worker: str, error: str, reintentable: bool) -> str:
+        """
+        Vuelve a pendiente con backoff si el error es transitorio y quedan
+        intentos; si no, error. Devuelve 'reintento' o 'error'.
+        """
+        ahora = time.time()
+        with self._transaccion() as db:
+            fila = db.execute("SELECT intentos FROM trabajos WHERE id = ? AND worker = ?",
+                              (id_trabajo, worker)).fetchone()
+            if fila is None:
+                # Otro worker lo retomó (lease vencido): su resultado es el que cuenta
+                return "error"
+            if reintentable and fila["intentos"] < self.max_intentos:
+                db.execute("UPDATE trabajos SET estado = 'pendiente', disponible = ?, error = ?, worker = NULL,"
+                           " lease_hasta = NULL, actualizado = ? WHERE id = ?",
+                           (ahora + backoff(fila["intentos"]), error, ahora, id_trabajo))
+                return "reintento"
+            db.execute("UPDATE trabajos SET estado = 'error', error = ?, worker = NULL, lease_hasta = NULL,"
+                       " actualizado = ? WHERE id = ?", (error, ahora, id_trabajo))
+            return "error"
+
+    # --- consultas y mantenimiento -------------------------------------------
+
+    def estado(self) -> Dict[str, int]:
+        conteo = {e: 0 for e in ESTADOS}
+        for fila in self._conexion().execute("SELECT estado, COUNT(*) AS n FROM trabajos GROUP BY estado"):
+            conteo[fila["estado"]] = fila["n"]
+        return conteo
+
+    def _hay_pendientes(self) -> bool:
+        """Quedan trabajos pendientes (quizá en backoff) o con lease vencido."""
+        return self._conexion().execute(
+            "SELECT 1 FROM trabajos WHERE estado = 'pendiente' OR (estado = 'en_curso' AND lease_hasta < ?)"
+            " LIMIT 1", (time.time(),)).fetchone() is not None
+
+    def verificar(self) -> int:
+        """Vuelve a pendiente los trabajos ok cuya salida falta o no coincide con el checksum."""
+        cambiados = []
+        for fila in self._conexion().execute("SELECT id, output, sha256 FROM trabajos WHERE estado = 'ok'"):
+            try:
+                sha, _ = sha256_archivo(fila["output"])
+            except OSError:
+                sha = None
+            if sha != fila["sha256"]:
+                cambiados.append(fila["id"])
+        with self._transaccion() as db:
+            db.executemany("UPDATE trabajos SET estado = 'pendiente', intentos = 0, disponible = 0, sha256 = NULL,"
+                           " error = 'salida ausente o modificada' WHERE id = ?", [(i,) for i in cambiados])
+        return len(cambiados)
+
+    def reintentar(self) -> int:
+        """Vuelve a pendiente (con intentos en cero) los trabajos con error válidos."""
+        with self._transaccion() as db:
+            return db.execute("UPDATE trabajos SET estado = 'pendiente', intentos = 0, disponible = 0"
+                              " WHERE estado = 'error' AND output IS NOT NULL").rowcount
+
+    def registros(self) -> Iterator[Dict]:
+        """Un registro por trabajo con el formato del manifiesto de lote.py."""
+        for fila in self._conexion().execute("SELECT * FROM trabajos ORDER BY origen, linea"):
+            trabajo = json.loads(fila["trabajo"])
+            registro = {"linea": fila["linea"], "voice": trabajo.get("voice"), "output": fila["output"],
+                        "estado": fila["estado"], "intentos": fila["intentos"]}
+            if fila["sha256"]:
+                registro["sha256"] = fila["sha256"]
+            if fila["error"] and fila["estado"] != "ok":
+                registro["error"] = fila["error"]
+            yield registro
+
+    # --- workers -------------------------------------------------------------
+
+    def _ejecutar(self, id_trabajo: int, trabajo: Dict, worker: str, client, cache) -> str:
+        from lote import sintetizar_trabajo
+        try:
+            sintetizar_trabajo(trabajo, client, cache)
+        except (presupuesto.PresupuestoExcedido, KeyError, ValueError) as e:
+            # Presupuesto, voz o perfil desconocidos, guion inválido: reintentar no sirve
+            return self.fallar(id_trabajo, worker, str(e), reintentable=False)
+        except Exception as e:
+            return self.fallar(id_trabajo, worker, repr(e), es_reintentable(e))
+        self.completar(id_trabajo, worker, trabajo["output"])
+        return "ok"
+
+    def procesar(self, workers: int = WORKERS, client=None, cache=None) -> Dict[str, int]:
+        """
+        Procesa la cola con `workers` hilos hasta que no queden trabajos
+        pendientes. Los trabajos en curso de otros procesos vivos no se tocan.
+        Si se interrumpe (Ctrl+C), cada hilo termina su trabajo actual y sale;
+        lo que quede en curso se retoma cuando venza el lease.
+        Devuelve cuántos terminaron ok, con error y cuántos se reencolaron.
+        """
+        from clientes import get_client
+        if client is None:
+            client = get_client()
+
+        huerfanos = self.recuperar_huerfanos()
+        if huerfanos:
+            log.warning("Cola: %d trabajos de procesos caídos se retoman ahora", huerfanos)
+
+        resumen = {"ok": 0, "error": 0, "reintento": 0}
+        lock = threading.Lock()
+        fin = threading.Event()
+
+        def latido():
+            while not fin.wait(self.lease / 3):
+                try:
+                    self.renovar()
+                except sqlite3.Error as e:
+                    # Sin renovar, el lease vence y otro worker puede repetir el trabajo
+                    log.warning("Cola: no se pudo renovar el lease: %s", e)
+
+        def trabajar(n: int):
+            worker = f"{self._prefijo}:{n}"
+            while not fin.is_set():
+                tomado = self.tomar(worker)
+                if tomado is None:
+                    if not self._hay_pendientes():
+                        return
+                    time.sleep(ESPERA_VACIA)
+                    continue
+                id_trabajo, trabajo = tomado
+                resultado = self._ejecutar(id_trabajo, trabajo, worker, client, cache)
+                metricas.incrementar("trabajos_cola", labels={"estado": resultado})
+                log.info("Cola: trabajo %d (línea %s) -> %s", id_trabajo, trabajo.get("linea"), resultado)
+                with lock:
+                    resumen[resultado] += 1
+
+        hilo_latido = threading.Thread(target=latido, name="cola-latido", daemon=True)
+        hilo_latido.start()
+        hilos = [threading.Thread(target=trabajar, args=(i,), name=f"cola-{i}") for i in range(max(1, workers))]
+        try:
+            for h in hilos:
+                h.start()
+            for h in hilos:
+                while h.is_alive():
+                    h.join(0.5)
+        finally:
+            fin.set()
+        return resumen
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cola persistente (SQLite) de trabajos de síntesis con reanudación.")
+    parser.add_argument('--db', type=str, default=COLA_DB, help='Archivo SQLite de la cola.')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Mostrar el detalle de cada trabajo.')
+    sub = parser.add_subparsers(dest="comando", metavar="COMANDO")
+    sub.required = True
+
+    p = sub.add_parser("encolar", help="Agrega los trabajos de un JSONL (formato de lote.py).")
+    p.add_argument('jobs', type=str)
+    p = sub.add_parser("procesar", help="Procesa la cola (opcionalmente encolando antes un JSONL).")
+    p.add_argument('jobs', type=str, nargs='?')
+    p.add_argument('--workers', '-w', type=int, default=WORKERS, help='Hilos worker en este proceso.')
+    p.add_argument('--lease', type=float, default=LEASE, help='Segundos de lease por trabajo.')
+    p.add_argument('--intentos', type=int, default=MAX_INTENTOS, help='Intentos máximos por trabajo.')
+    p.add_argument('--sin-cache', action='store_true', help='No usar la caché de audio en disco.')
+    sub.add_parser("estado", help="Cantidad de trabajos por estado.")
+    sub.add_parser("verificar", help="Re-encola trabajos ok cuya salida falta o cambió.")
+    sub.add_parser("reintentar", help="Vuelve a pendiente los trabajos con error.")
+    p = sub.add_parser("manifiesto", help="Escribe el estado de cada trabajo en un JSONL (formato de lote.py).")
+    p.add_argument('salida', type=str)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format="%(message)s")
+    cola = ColaTrabajos(args.db, lease=getattr(args, "lease", LEASE), max_intentos=getattr(args, "intentos", MAX_INTENTOS))
+
+    if args.comando in ("encolar", "procesar") and args.jobs:
+        r = cola.encolar(args.jobs)
+        print(f"Encolados: {r['nuevos']} nuevos, {r['existentes']} ya en la cola, {r['invalidos']} inválidos")
+    if args.comando == "procesar":
+        from cache_audio import AudioCache
+        inicio = time.monotonic()
+        r = cola.procesar(args.workers, cache=None if args.sin_cache else AudioCache())
+        print(f"Procesados: {r['ok']} ok, {r['error']} con error, {r['reintento']} reencolados "
+              f"({time.monotonic() - inicio:.1f}s)")
+    elif args.comando == "verificar":
+        print(f"Re-encolados: {cola.verificar()}")
+    elif args.comando == "reintentar":
+        print(f"Re-encolados: {cola.reintentar()}")
+    elif args.comando == "manifiesto":
+        n = 0
+        with open(args.salida, "w", encoding="utf-8") as fh:
+            for registro in cola.registros():
+                fh.write(json.dumps(registro, ensure_ascii=False) + "\n")
+                n += 1
+        print(f"Manifiesto con {n} trabajos escrito en: {args.salida}")
+
+    estado = cola.estado()
+    print("Cola: " + "  ".join(f"{e}: {estado[e]}" for e in ESTADOS))
+    if args.comando == "procesar" and (estado["error"] or estado["pendiente"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
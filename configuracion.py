@@ -0,0 +1,85 @@
+# configuracion.py
+# Carga la configuración de entrada (SSML, VOICE, FREE_TIER_CHARS...) desde un
+# archivo de datos en lugar de ejecutar voice_input.py como código.
+#
+# Orden de búsqueda:
+#   1. ruta explícita o variable TTS_CONFIG
+#   2. voice_input.json junto al código
+#   3. voice_input.py (obsoleto: se importa como antes y se avisa con un
+#      DeprecationWarning; el repositorio ya trae voice_input.json)
+#
+# Para pasar de voice_input.py a JSON:
+#   python tts.py config --exportar
+
+import json
+import logging
+import os
+import warnings
+from pathlib import Path
+from typing import Dict, Optional
+
+log = logging.getLogger(__name__)
+
+CONFIG_JSON = Path(__file__).parent / "voice_input.json"
+CONFIG_PY = Path(__file__).parent / "voice_input.py"
+
+# Diferencia de mtime tolerada entre el .py y el JSON (un checkout escribe ambos)
+TOLERANCIA_MTIME = 2.0
+
+# Variables que se leen de la configuración
+CLAVES = ("SSML", "SSML_FILE", "VOICE", "USE_TEXT_ONLY", "VOICE_INFO", "FREE_TIER_CHARS")
+
+_cache: Dict[str, Dict] = {}
+
+
+def _desde_modulo() -> Dict:
+    try:
+        import voice_input
+    except ImportError:
+        return {}
+    return {k: getattr(voice_input, k) for k in CLAVES if hasattr(voice_input, k)}
+
+
+def cargar_config(path: Optional[str] = None) -> Dict:
+    """
+    Devuelve un dict con las variables definidas (solo las presentes en
+    CLAVES). Un dict vacío significa que no hay configuración.
+    """
+    path = path or os.environ.get("TTS_CONFIG")
+    origen = str(path) if path else "auto"
+    if origen in _cache:
+        return _cache[origen]
+
+    json_path = Path(path) if path else CONFIG_JSON
+    if json_path.is_file():
+        if not path and CONFIG_PY.is_file() and \
+                CONFIG_PY.stat().st_mtime > json_path.stat().st_mtime + TOLERANCIA_MTIME:
+            log.warning("%s es más nuevo que %s; regenerarlo con: python tts.py config --exportar",
+                        CONFIG_PY.name, json_path.name)
+        with json_path.open(encoding="utf-8") as fh:
+            data = json.load(fh)
+        config = {k: data[k] for k in CLAVES if k in data}
+    elif path:
+        raise FileNotFoundError(f"No existe el archivo de configuración: {path}")
+    else:
+        config = _desde_modulo()
+        if config:
+            mensaje = (f"Leer la configuración de {CONFIG_PY.name} está obsoleto (ejecuta código); "
+                       f"generar {CONFIG_JSON.name} con: python tts.py config --exportar")
+            warnings.warn(mensaje, DeprecationWarning, stacklevel=2)
+            log.warning("%s", mensaje)
+
+    _cache[origen] = config
+    return config
+
+
+def exportar_config(destino: Path = CONFIG_JSON) -> Path:
+    """Escribe en JSON las variables de voice_input.py."""
+    config = _desde_modulo()
+    if not config:
+        raise FileNotFoundError("No se encontró voice_input.py para exportar.")
+    destino = Path(destino)
+    destino.write_text(json.dumps({k: (dict(v) if isinstance(v, dict) else v) for k, v in config.items()},
+                                  indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    _cache.clear()
+    return destino
@@ -7,14 +7,20 @@ Cuenta caracteres en SSML y estima costos según el modelo declarado en VOICE_IN
 Uso:
   python costs_models.py --ssml-file ejemplo.ssml --voice es-AR-Wavenet-A
   cat ejemplo.ssml | python costs_models.py --voice es-AR-Wavenet-A
+  python costs_models.py --corpus guiones/ --csv costos.csv --json resumen.json
+  python costs_models.py --corpus trabajos.jsonl --use-text-only
 """
 
 import argparse
+import csv
+import json
 import sys
 import re
 import html
 from pathlib import Path
-from voces import VOICE_INFO
+from typing import Dict, Iterator, List, Tuple
+from configuracion import cargar_config
+import voces
 
 # VOICE_INFO: actualizar precios según tarifas reales.
 # key: voice name (ej. 'es-AR-Wavenet-A')
@@ -69,6 +75,174 @@ def estimate_cost(char_count: int, type: str, price_per_million: float, free_tie
         'estimated_cost_usd_for_10k': estimated_cost_usd_for_10k,
     }
 
+def free_tier_for(model_type: str, free_tiers: Dict[str, int] = None) -> int:
+    """
+    Franquicia gratuita para un tipo de modelo. Compara sin distinguir mayúsculas
+    y por prefijo, para que 'wavenet' encuentre 'WaveNet' y 'neural' a 'Neural2'.
+    Reemplaza a la búsqueda exacta FREE_TIER_CHARS.get(tipo) que usaba antes la
+    estimación de un solo documento: con los tipos en minúsculas de VOICE_INFO
+    esa búsqueda nunca encontraba la franquicia y la daba por 0.
+    """
+    if free_tiers is None:
+        free_tiers = FREE_TIER_CHARS
+    t = (model_type or '').lower()
+    if not t:
+        return 0
+    for key, chars in free_tiers.items():
+        k = key.lower()
+        if k == t or k.startswith(t) or t.startswith(k):
+            return chars
+    return 0
+
+# Extensiones que se leen al recorrer un directorio de guiones
+CORPUS_EXTENSIONS = {'.ssml', '.xml', '.txt'}
+
+def iter_corpus(path: Path) -> Iterator[Tuple[str, str]]:
+    """
+    Recorre un corpus sin cargarlo entero: un directorio (un guion por archivo)
+    o un JSONL con el SSML en el campo 'ssml'. Devuelve pares (id, ssml).
+    """
+    if path.is_dir():
+        for f in sorted(path.rglob('*')):
+            if f.is_file() and f.suffix.lower() in CORPUS_EXTENSIONS:
+                yield str(f.relative_to(path)), read_ssml_from_file(f)
+        return
+    with path.open(encoding='utf-8') as fh:
+        for n, line in enumerate(fh, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                doc = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(doc, dict) and doc.get('ssml'):
+                yield str(doc.get('id', doc.get('output', n))), doc['ssml']
+
+def count_chars(ssml: str) -> Tuple[int, int]:
+    """
+    (caracteres del SSML sin espacios en los extremos, caracteres del texto sin
+    tags ni entidades) de un documento: una pasada de strip y otra de
+    strip_ssml_tags.
+    """
+    ssml = ssml.strip()
+    return len(ssml), len(strip_ssml_tags(ssml))
+
+def estimate_corpus(docs: Iterator[Tuple[str, str]], voices: List[str], voice_info: Dict[str, Dict],
+                    free_tiers: Dict[str, int], use_text_only: bool = False,
+                    block_size: int = 4096, csv_out=None) -> Dict:
+    """
+    Matriz de costos voces x documentos calculada con NumPy por bloques de
+    `block_size` documentos, de modo que la memoria no depende del tamaño del
+    corpus. La franquicia gratuita se descuenta de forma acumulada en el orden
+    de los documentos (como si todo el corpus se sintetizara con cada voz en el
+    mismo mes). Si se pasa `csv_out` (un csv.writer) se escribe una fila por
+    documento. Devuelve el resumen por voz.
+    """
+    import numpy as np
+
+    metas = [voice_info[v] for v in voices]
+    prices = np.array([float(m.get('price_per_million', 0.0)) for m in metas])[:, None] / 1_000_000.0
+    free = np.array([free_tier_for(m.get('type', ''), free_tiers) for m in metas], dtype=np.int64)[:, None]
+    used = np.zeros((len(voices), 1), dtype=np.int64)       # caracteres acumulados por voz
+    total_cost = np.zeros(len(voices))
+    total_billable = np.zeros(len(voices), dtype=np.int64)
+    n_docs = raw_total = text_total = 0
+
+    if csv_out is not None:
+        csv_out.writerow(['document', 'raw_chars', 'text_chars'] + voices)
+
+    def flush(ids, raw, text):
+        nonlocal used, n_docs, raw_total, text_total
+        raw = np.array(raw, dtype=np.int64)
+        text = np.array(text, dtype=np.int64)
+        chars = text if use_text_only else raw
+        # Caracteres facturables de cada documento tras la franquicia acumulada
+        cum = used + np.cumsum(chars)[None, :]
+        billable_cum = np.maximum(cum - free, 0)
+        prev = np.concatenate([np.maximum(used - free, 0), billable_cum[:, :-1]], axis=1)
+        billable = billable_cum - prev
+        cost = billable * prices
+        used = cum[:, -1:]
+        total_cost[:] += cost.sum(axis=1)
+        total_billable[:] += billable.sum(axis=1)
+        n_docs += len(ids)
+        raw_total += int(raw.sum())
+        text_total += int(text.sum())
+        if csv_out is not None:
+            for j, doc_id in enumerate(ids):
+                csv_out.writerow([doc_id, int(raw[j]), int(text[j])] + [f"{c:.6f}" for c in cost[:, j]])
+
+    ids, raw, text = [], [], []
+    for doc_id, ssml in docs:
+        r, t = count_chars(ssml)
+        ids.append(doc_id)
+        raw.append(r)
+        text.append(t)
+        if len(ids) >= block_size:
+            flush(ids, raw, text)
+            ids, raw, text = [], [], []
+    if ids:
+        flush(ids, raw, text)
+
+    return {
+        'documents': n_docs,
+        'raw_chars': raw_total,
+        'text_chars': text_total,
+        'basis': 'text' if use_text_only else 'ssml',
+        'voices': {
+            v: {
+                'model_type': metas[i].get('type', 'Unknown'),
+                'price_per_million': float(metas[i].get('price_per_million', 0.0)),
+                'free_tier_chars': int(free[i, 0]),
+                'total_chars': int(used[i, 0]),
+                'billable_chars': int(total_billable[i]),
+                'estimated_cost_usd': float(total_cost[i]),
+            }
+            for i, v in enumerate(voices)
+        },
+    }
+
+def run_corpus(args, voice_info: Dict[str, Dict], free_tiers: Dict[str, int], use_text_only: bool):
+    """Modo --corpus: estima todo el corpus para todas las voces (o las de --voice)."""
+    corpus = Path(args.corpus)
+    if not corpus.exists():
+        print(f"No existe el corpus: {corpus}")
+        sys.exit(2)
+    voices = [args.voice] if args.voice else sorted(voice_info)
+    for v in voices:
+        if v not in voice_info:
+            print(f"Voz '{v}' no encontrada en VOICE_INFO.")
+            sys.exit(2)
+
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        print("El modo --corpus requiere numpy (pip install numpy).")
+        sys.exit(2)
+
+    csv_fh = open(args.csv, 'w', encoding='utf-8', newline='') if args.csv else None
+    try:
+        summary = estimate_corpus(iter_corpus(corpus), voices, voice_info, free_tiers,
+                                  use_text_only=use_text_only, block_size=args.block_size,
+                                  csv_out=csv.writer(csv_fh) if csv_fh else None)
+    finally:
+        if csv_fh:
+            csv_fh.close()
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(summary, indent=2, ensure_ascii=False), encoding='utf-8')
+
+    print(f"\nCorpus: {corpus} ({summary['documents']:,} documentos)")
+    print(f"  - Caracteres SSML: {summary['raw_chars']:,}  |  texto sin tags: {summary['text_chars']:,}")
+    print(f"  - Base de facturación: {'texto sin tags' if use_text_only else 'SSML bruto'}")
+    for v, r in summary['voices'].items():
+        print(f"  {v:<24} {r['model_type']:<8} facturables {r['billable_chars']:>14,}  coste ${r['estimated_cost_usd']:,.4f}")
+    if args.csv:
+        print(f"\nMatriz por documento escrita en: {args.csv}")
+    if args.json:
+        print(f"Resumen escrito en: {args.json}")
+
 def pretty_print(result: dict, label: str):
     print(f"\nEstimación para: {label}")
     print(f"  Modelo: {result['model_type']}")
@@ -84,33 +258,39 @@ def pretty_print(result: dict, label: str):
         print(f"  Coste estimado para 10,000 chars (teniendo en cuenta franquicia): ${result['estimated_cost_usd_for_10k']:.6f}")
 
 def main():
-    parser = argparse.ArgumentParser(description="Cuenta caracteres SSML y estima costos según VOICE_INFO. Toma valores desde voice_input.py si existe.")
+    parser = argparse.ArgumentParser(description="Cuenta caracteres SSML y estima costos según VOICE_INFO. Toma valores desde voice_input.json / voice_input.py si existe.")
     parser.add_argument('--ssml-file', '-f', type=str, help='Archivo que contiene SSML. Si no se provee, se lee de stdin o desde voice_input.SSML/SSML_FILE si existe.')
     parser.add_argument('--voice', '-v', type=str, help='Nombre de la voz (clave en VOICE_INFO). Si no se provee, se usará voice_input.VOICE o la primera voz en VOICE_INFO.')
     parser.add_argument('--use-text-only', action='store_true', help='Estimar costos basados en texto limpio (sin tags) además del SSML bruto.')
+    parser.add_argument('--corpus', '-c', type=str, help='Directorio de guiones o JSONL con campo "ssml": estima el corpus completo para todas las voces.')
+    parser.add_argument('--csv', type=str, help='(--corpus) CSV de salida con el costo de cada documento por voz.')
+    parser.add_argument('--json', type=str, help='(--corpus) JSON de salida con el resumen por voz.')
+    parser.add_argument('--block-size', type=int, default=4096, help='(--corpus) Documentos por bloque (acota la memoria).')
     args = parser.parse_args()
 
-    # Intentar cargar voice_input.py
-    voice_input = None
+    # Configuración: voice_input.json (o voice_input.py si no hay JSON)
     try:
-        import voice_input
-        voice_input = voice_input
-    except Exception:
-        voice_input = None
-
-    # Sobrescribir VOICE_INFO/FREE_TIER_CHARS si están en voice_input
-    global VOICE_INFO, FREE_TIER_CHARS
-    if voice_input is not None:
-        if hasattr(voice_input, 'VOICE_INFO'):
-            VOICE_INFO = getattr(voice_input, 'VOICE_INFO')
-        if hasattr(voice_input, 'FREE_TIER_CHARS'):
-            FREE_TIER_CHARS = getattr(voice_input, 'FREE_TIER_CHARS')
-
-    # Determinar voz: CLI > voice_input.VOICE > primera en VOICE_INFO
-    voice = args.voice if args.voice else (getattr(voice_input, 'VOICE', None) if voice_input is not None else None)
+        config = cargar_config()
+    except Exception as e:
+        print(f"No se pudo leer la configuración: {e}")
+        config = {}
+
+    # VOICE_INFO/FREE_TIER_CHARS de la configuración tienen prioridad
+    voice_info = config['VOICE_INFO'] if 'VOICE_INFO' in config else voces.VOICE_INFO
+    free_tiers = config['FREE_TIER_CHARS'] if 'FREE_TIER_CHARS' in config else FREE_TIER_CHARS
+
+    # Determinar use_text_only por CLI o configuración
+    use_text_only = args.use_text_only or bool(config.get('USE_TEXT_ONLY', False))
+
+    if args.corpus:
+        run_corpus(args, voice_info, free_tiers, use_text_only)
+        return
+
+    # Determinar voz: CLI > VOICE de la configuración > primera en VOICE_INFO
+    voice = args.voice or config.get('VOICE')
     if not voice:
         try:
-            voice = next(iter(VOICE_INFO.keys()))
+            voice = next(iter(voice_info.keys()))
         except StopIteration:
             voice = None
 
@@ -118,24 +298,21 @@ def main():
         print("No se especificó ninguna voz y VOICE_INFO está vacío. Define VOICE en voice_input.py o pasa --voice.")
         sys.exit(2)
 
-    if voice not in VOICE_INFO:
+    if voice not in voice_info:
         print(f"Voz '{voice}' no encontrada en VOICE_INFO. Voces disponibles:")
-        for k in sorted(VOICE_INFO.keys()):
-            print(f"  - {k}  ({VOICE_INFO[k].get('model_type', 'Unknown')})")
+        for k in sorted(voice_info.keys()):
+            print(f"  - {k}  ({voice_info[k].get('model_type', 'Unknown')})")
         sys.exit(2)
 
-    # Determinar use_text_only por CLI o voice_input
-    use_text_only = args.use_text_only or (bool(getattr(voice_input, 'USE_TEXT_ONLY', False)) if voice_input is not None else False)
-
-    # Obtener SSML: priority SSML string in voice_input > SSML_FILE in voice_input > CLI file > stdin
+    # Obtener SSML: priority SSML string in config > SSML_FILE in config > CLI file > stdin
     ssml = None
-    if voice_input is not None and hasattr(voice_input, 'SSML') and getattr(voice_input, 'SSML'):
-        ssml = getattr(voice_input, 'SSML')
-    elif voice_input is not None and hasattr(voice_input, 'SSML_FILE') and getattr(voice_input, 'SSML_FILE'):
+    if config.get('SSML'):
+        ssml = config['SSML']
+    elif config.get('SSML_FILE'):
         try:
-            ssml = read_ssml_from_file(Path(getattr(voice_input, 'SSML_FILE')))
+            ssml = read_ssml_from_file(Path(config['SSML_FILE']))
         except Exception as e:
-            print(f"No se pudo leer SSML desde voice_input.SSML_FILE: {e}")
+            print(f"No se pudo leer SSML desde SSML_FILE: {e}")
             ssml = None
 
     if ssml is None:
@@ -152,10 +329,11 @@ def main():
     text_only = strip_ssml_tags(ssml)
     text_chars = len(text_only)
 
-    voice_meta = VOICE_INFO[voice]
+    voice_meta = voice_info[voice]
     model_type = voice_meta.get('type', 'Unknown')
     price_per_million = float(voice_meta.get('price_per_million', 0.0))
-    free_tier = FREE_TIER_CHARS.get(model_type, 0)
+    # Sin distinguir mayúsculas y por prefijo (ver free_tier_for)
+    free_tier = free_tier_for(model_type, free_tiers)
 
     print("\nResumen de conteo:")
     print(f"  - Longitud SSML (incluye etiquetas): {raw_chars:,} caracteres")
@@ -171,7 +349,7 @@ def main():
 
     print("\nObservaciones:")
     print("  - Google Cloud factura por caracteres procesados (incluyendo etiquetas SSML).")
-    print("  - Si define variables en voice_input.py, estas se han cargado automáticamente (VOICE, SSML, SSML_FILE, VOICE_INFO, FREE_TIER_CHARS, USE_TEXT_ONLY).")
+    print("  - Si define variables en voice_input.json (o voice_input.py), estas se han cargado automáticamente (VOICE, SSML, SSML_FILE, VOICE_INFO, FREE_TIER_CHARS, USE_TEXT_ONLY).")
     print("  - Actualiza los valores en VOICE_INFO y FREE_TIER_CHARS con las tarifas y límites reales.")
     print("  - Esta es una estimación. Revisa la facturación del proyecto en Google Cloud para valores finales.\n")
 
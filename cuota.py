@@ -0,0 +1,350 @@
+# cuota.py
+# Limitador de tasa (token bucket adaptativo) y reintentos con backoff
+# exponencial + jitter para las llamadas a Text-to-Speech.
+#
+# El limitador baja la tasa cuando la API responde 429 / RESOURCE_EXHAUSTED
+# (respetando Retry-After) y la sube de a poco mientras las llamadas salen
+# bien, así un lote se mantiene cerca del techo de la cuota en lugar de
+# alternar entre saturarla y fallar.
+#
+# Por defecto el estado vive en memoria (compartido entre hilos). Con
+# TTS_RATE_FILE (o path=...) se guarda en un archivo con bloqueo, y lo
+# comparten todos los procesos que apunten al mismo archivo.
+#
+# con_reintentos_async es la misma política para corrutinas: espera el
+# limitador y el backoff con asyncio.sleep sin bloquear el event loop (con
+# estado en archivo, el bloqueo y la E/S van a un hilo del executor).
+
+import asyncio
+import email.utils
+import json
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional, Tuple
+
+from metricas import incrementar, span
+
+# Cuota por defecto de synthesize_speech: 1000 peticiones por minuto por proyecto
+RATE = float(os.environ.get("TTS_RATE", 1000 / 60))
+RATE_MIN = 0.5
+# Al recibir un 429 la tasa se multiplica por este factor
+FACTOR_BAJA = 0.5
+# Peticiones/segundo que se recuperan por cada segundo de llamadas exitosas
+RECUPERACION = 0.5
+
+REINTENTOS = 5
+BACKOFF_BASE = 0.5       # segundos
+BACKOFF_MAX = 32.0       # segundos
+
+# Códigos HTTP y estados gRPC transitorios. ABORTED (409 en HTTP) se
+# reintenta por su estado gRPC: un 409 de REST no es transitorio
+CODIGOS_REINTENTABLES = {408, 429, 500, 502, 503, 504}
+ESTADOS_REINTENTABLES = {"RESOURCE_EXHAUSTED", "UNAVAILABLE", "DEADLINE_EXCEEDED", "INTERNAL", "ABORTED"}
+ESTADOS_HTTP = {"RESOURCE_EXHAUSTED": 429, "UNAVAILABLE": 503, "DEADLINE_EXCEEDED": 504,
+                "INTERNAL": 500, "ABORTED": 409}
+
+
+class ErrorReintentable(Exception):
+    """Respuesta HTTP transitoria (429/5xx) convertida en excepción para reintentarla."""
+
+    def __init__(self, code: int, retry_after: Optional[float] = None, respuesta=None):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+        self.retry_after = retry_after
+        self.respuesta = respuesta
+
+
+def parse_retry_after(valor) -> Optional[float]:
+    """Retry-After en segundos o como fecha HTTP -> segundos a esperar."""
+    if valor is None or valor == "":
+        return None
+    try:
+        return max(0.0, float(valor))
+    except (TypeError, ValueError):
+        pass
+    try:
+        fecha = email.utils.parsedate_to_datetime(str(valor))
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, fecha.timestamp() - time.time())
+
+
+def _codigo(e: BaseException):
+    code = getattr(e, "code", None)
+    if callable(code):
+        # grpc.RpcError: code() devuelve un StatusCode
+        try:
+            code = code()
+        except Exception:
+            code = None
+    return code
+
+
+def _estado_grpc(e: BaseException) -> Optional[str]:
+    """Nombre del estado gRPC de la excepción ('UNAVAILABLE', ...) o None."""
+    # google.api_core guarda el StatusCode en grpc_status_code y el HTTP en code
+    for code in (getattr(e, "grpc_status_code", None), _codigo(e)):
+        nombre = getattr(code, "name", None)
+        if nombre:
+            return nombre
+    return None
+
+
+def clasificar_error(e: BaseException) -> Tuple[Optional[int], Optional[float]]:
+    """
+    Devuelve (código HTTP equivalente, retry_after) de una excepción de
+    google.api_core, grpc, requests o fake_tts. (None, None) si no se reconoce.
+    """
+    code = _codigo(e)
+    nombre = getattr(code, "name", None)
+    if nombre:
+        code = ESTADOS_HTTP.get(nombre, code)
+    if not isinstance(code, int):
+        respuesta = getattr(e, "response", None)
+        code = getattr(respuesta, "status_code", None)
+
+    retry_after = getattr(e, "retry_after", None)
+    if retry_after is None:
+        headers = getattr(getattr(e, "response", None), "headers", None) or {}
+        retry_after = parse_retry_after(headers.get("Retry-After"))
+    return (code if isinstance(code, int) else None), retry_after
+
+
+def _errores_de_red() -> Tuple[type, ...]:
+    # Los de requests heredan de RequestException/IOError, no de los builtins.
+    # Si requests no está importado, ninguna excepción puede ser suya
+    requests = sys.modules.get("requests")
+    if requests is None:
+        return ConnectionError, TimeoutError
+    return (ConnectionError, TimeoutError,
+            requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
+
+def es_reintentable(e: BaseException) -> bool:
+    if _estado_grpc(e) in ESTADOS_REINTENTABLES:
+        return True
+    code, _ = clasificar_error(e)
+    if code in CODIGOS_REINTENTABLES:
+        return True
+    # Errores de conexión / timeouts de red sin código HTTP
+    return isinstance(e, _errores_de_red())
+
+
+def backoff(intento: int, base: float = BACKOFF_BASE, maximo: float = BACKOFF_MAX) -> float:
+    """Espera del intento `intento` (1, 2, ...): backoff exponencial con jitter completo."""
+    return random.uniform(0, min(maximo, base * 2 ** (intento - 1)))
+
+
+class _EstadoMemoria:
+    def __init__(self, rate: float, capacidad: float):
+        self._lock = threading.Lock()
+        self._estado = {"tokens": capacidad, "t": time.time(), "rate": rate, "pausa_hasta": 0.0}
+
+    @contextmanager
+    def abrir(self):
+        with self._lock:
+            yield self._estado
+
+
+class _EstadoArchivo:
+    """Estado del bucket en un archivo JSON con bloqueo exclusivo (compartido entre procesos)."""
+
+    def __init__(self, path: str, rate: float, capacidad: float):
+        self.path = path
+        self._lock = threading.Lock()
+        self._inicial = {"tokens": capacidad, "t": time.time(), "rate": rate, "pausa_hasta": 0.0}
+
+    @contextmanager
+    def abrir(self):
+        with self._lock, open(self.path, "a+", encoding="utf-8") as fh:
+            bloquear_archivo(fh)
+            try:
+                fh.seek(0)
+                try:
+                    estado = json.loads(fh.read() or "null") or dict(self._inicial)
+                except ValueError:
+                    estado = dict(self._inicial)
+                yield estado
+                fh.seek(0)
+                fh.truncate()
+                fh.write(json.dumps(estado))
+                fh.flush()
+            finally:
+                desbloquear_archivo(fh)
+
+
+def bloquear_archivo(fh):
+    """Bloqueo exclusivo (entre procesos) de un archivo abierto."""
+    try:
+        import fcntl
+        fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+    except ImportError:
+        import msvcrt
+        fh.seek(0)
+        msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+
+
+def desbloquear_archivo(fh):
+    try:
+        import fcntl
+        fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+    except ImportError:
+        import msvcrt
+        fh.seek(0)
+        msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class RateLimiter:
+    """
+    Token bucket con tasa adaptativa (aumento aditivo, disminución multiplicativa).
+
+        limiter = RateLimiter(rate=16)
+        limiter.adquirir()          # bloquea hasta que haya un token
+        ...
+        limiter.exito()             # o limiter.penalizar(retry_after)
+    """
+
+    def __init__(self, rate: float = RATE, capacidad: Optional[float] = None,
+                 rate_min: float = RATE_MIN, rate_max: Optional[float] = None,
+                 path: Optional[str] = None):
+        self.rate_min = rate_min
+        self.rate_max = rate_max or rate
+        capacidad = capacidad if capacidad is not None else max(1.0, rate)
+        self.capacidad = capacidad
+        self._estado = _EstadoArchivo(path, rate, capacidad) if path else _EstadoMemoria(rate, capacidad)
+
+    def _rellenar(self, st, ahora: float):
+        transcurrido = max(0.0, ahora - st["t"])
+        st["tokens"] = min(self.capacidad, st["tokens"] + transcurrido * st["rate"])
+        st["t"] = ahora
+
+    def _tomar(self, n: float) -> float:
+        # Consume `n` tokens si los hay (devuelve 0) o devuelve cuánto esperar
+        with self._estado.abrir() as st:
+            ahora = time.time()
+            self._rellenar(st, ahora)
+            if ahora < st["pausa_hasta"]:
+                return st["pausa_hasta"] - ahora
+            if st["tokens"] >= n:
+                st["tokens"] -= n
+                return 0.0
+            return (n - st["tokens"]) / st["rate"]
+
+    def adquirir(self, n: float = 1.0):
+        """Bloquea hasta poder consumir `n` tokens."""
+        while True:
+            espera = self._tomar(n)
+            if not espera:
+                return
+            time.sleep(espera)
+
+    async def _async(self, fn, *args):
+        # Con estado en archivo el flock y la E/S bloquean: fuera del event loop
+        if isinstance(self._estado, _EstadoArchivo):
+            return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+        return fn(*args)
+
+    async def adquirir_async(self, n: float = 1.0):
+        """Como adquirir, pero espera con asyncio.sleep."""
+        while True:
+            espera = await self._async(self._tomar, n)
+            if not espera:
+                return
+            await asyncio.sleep(espera)
+
+    def exito(self):
+        """Llamada exitosa: la tasa sube de a poco hasta rate_max."""
+        with self._estado.abrir() as st:
+            if st["rate"] < self.rate_max:
+                st["rate"] = min(self.rate_max, st["rate"] + RECUPERACION / st["rate"])
+
+    def penalizar(self, retry_after: Optional[float] = None):
+        """La API indicó cuota agotada: baja la tasa y, si hay Retry-After, pausa a todos."""
+        with self._estado.abrir() as st:
+            ahora = time.time()
+            self._rellenar(st, ahora)
+            st["rate"] = max(self.rate_min, st["rate"] * FACTOR_BAJA)
+            st["tokens"] = min(st["tokens"], 0.0)
+            if retry_after:
+                st["pausa_hasta"] = max(st["pausa_hasta"], ahora + retry_after)
+
+    async def exito_async(self):
+        await self._async(self.exito)
+
+    async def penalizar_async(self, retry_after: Optional[float] = None):
+        await self._async(self.penalizar, retry_after)
+
+    def rate(self) -> float:
+        with self._estado.abrir() as st:
+            return st["rate"]
+
+
+# Limitador compartido por todas las llamadas del proceso
+LIMITADOR = RateLimiter(path=os.environ.get("TTS_RATE_FILE") or None)
+
+
+def con_reintentos(fn: Callable, *args, limiter: Optional[RateLimiter] = LIMITADOR,
+                   intentos: int = REINTENTOS, base: float = BACKOFF_BASE,
+                   maximo: float = BACKOFF_MAX, **kwargs):
+    """
+    Llama a fn(*args, **kwargs) respetando el limitador y reintenta los errores
+    transitorios (429 y 5xx) con backoff exponencial + jitter, o esperando lo
+    que indique Retry-After si es mayor. Los demás errores se propagan sin
+    reintentar.
+    """
+    for intento in range(1, intentos + 1):
+        if limiter is not None:
+            with span("esperar_cuota"):
+                limiter.adquirir()
+        try:
+            resultado = fn(*args, **kwargs)
+        except Exception as e:
+            if not es_reintentable(e) or intento == intentos:
+                raise
+            code, retry_after = clasificar_error(e)
+            incrementar("reintentos", labels={"codigo": code or "red"})
+            if code == 429 and limiter is not None:
+                incrementar("errores_cuota")
+                limiter.penalizar(retry_after)
+            time.sleep(max(retry_after or 0.0, backoff(intento, base, maximo)))
+            continue
+        if limiter is not None:
+            limiter.exito()
+        return resultado
+
+
+async def con_reintentos_async(fn: Callable, *args, limiter: Optional[RateLimiter] = LIMITADOR,
+                               intentos: int = REINTENTOS, base: float = BACKOFF_BASE,
+                               maximo: float = BACKOFF_MAX, plazo: Optional[float] = None, **kwargs):
+    """
+    con_reintentos para corrutinas: await fn(*args, **kwargs) con la misma
+    política. `plazo` (segundos) es un límite para todo el proceso: intentos,
+    esperas del limitador y backoff; al vencer lanza asyncio.TimeoutError.
+    """
+    if plazo is not None:
+        return await asyncio.wait_for(
+            con_reintentos_async(fn, *args, limiter=limiter, intentos=intentos, base=base, maximo=maximo, **kwargs),
+            timeout=plazo)
+    for intento in range(1, intentos + 1):
+        if limiter is not None:
+            with span("esperar_cuota"):
+                await limiter.adquirir_async()
+        try:
+            resultado = await fn(*args, **kwargs)
+        except Exception as e:
+            if not es_reintentable(e) or intento == intentos:
+                raise
+            code, retry_after = clasificar_error(e)
+            incrementar("reintentos", labels={"codigo": code or "red"})
+            if code == 429 and limiter is not None:
+                incrementar("errores_cuota")
+                await limiter.penalizar_async(retry_after)
+            await asyncio.sleep(max(retry_after or 0.0, backoff(intento, base, maximo)))
+            continue
+        if limiter is not None:
+            await limiter.exito_async()
+        return resultado
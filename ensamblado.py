@@ -0,0 +1,171 @@
+# ensamblado.py
+# Ensamblado en disco de audio largo a partir de fragmentos ya escritos en
+# archivos (entradas de la caché o archivos temporales).
+#
+# Se conoce el tamaño de cada fragmento, así que el archivo de salida se
+# preasigna entero y cada fragmento se copia directo a su offset, sin juntar
+# el audio en memoria. La copia usa, según lo que ofrezca el sistema:
+#   copy_file_range  copia en el kernel con offsets explícitos (Linux)
+#   sendfile         copia en el kernel a la posición actual (Linux)
+#   mmap             readinto sobre la ventana mapeada de cada parte (portable)
+# Si el kernel rechaza la copia (p. ej. otro sistema de archivos), se sigue con
+# pread/pwrite por bloques. En todos los casos la memoria usada no depende del
+# largo del audio.
+#
+# Uso:
+#   partes = [Parte("frag0.mp3", 0, 41_000), Parte("frag1.mp3", 10, 40_872)]
+#   ensamblar(partes, "audiolibro.mp3")
+
+import errno
+import logging
+import mmap
+import os
+import sys
+from collections import namedtuple
+from typing import List, Sequence
+
+from metricas import incrementar, span
+
+log = logging.getLogger(__name__)
+
+# Rango útil [inicio, fin) de bytes dentro del archivo `path`
+Parte = namedtuple("Parte", "path inicio fin")
+
+METODOS = ("copy_file_range", "sendfile", "mmap")
+# Bytes por llamada al copiar (copy_file_range / sendfile / readinto)
+BLOQUE = 8 * 1024 * 1024
+
+
+def metodo_disponible() -> str:
+    """Mejor método de copia disponible en este sistema."""
+    if hasattr(os, "copy_file_range"):
+        return "copy_file_range"
+    if hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+        # En macOS sendfile solo escribe a sockets
+        return "sendfile"
+    return "mmap"
+
+
+def offsets(partes: Sequence[Parte]) -> List[int]:
+    """Offset de cada parte en el archivo ensamblado."""
+    resultado, total = [], 0
+    for p in partes:
+        resultado.append(total)
+        total += p.fin - p.inicio
+    return resultado
+
+
+def preasignar(fd: int, total: int):
+    """Reserva `total` bytes para el archivo (posix_fallocate si existe)."""
+    if total <= 0:
+        return
+    if hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(fd, 0, total)
+            return
+        except OSError:
+            # Algunos sistemas de archivos no lo soportan
+            pass
+    os.ftruncate(fd, total)
+
+
+def _copiar_copy_file_range(src: int, dst: int, inicio: int, n: int, offset: int):
+    while n > 0:
+        copiados = os.copy_file_range(src, dst, min(n, BLOQUE), inicio, offset)
+        if copiados == 0:
+            raise OSError(f"copy_file_range terminó antes de tiempo (faltan {n} bytes)")
+        inicio, offset, n = inicio + copiados, offset + copiados, n - copiados
+
+
+def _copiar_sendfile(src: int, dst: int, inicio: int, n: int, offset: int):
+    os.lseek(dst, offset, os.SEEK_SET)
+    while n > 0:
+        copiados = os.sendfile(dst, src, inicio, min(n, BLOQUE))
+        if copiados == 0:
+            raise OSError(f"sendfile terminó antes de tiempo (faltan {n} bytes)")
+        inicio, n = inicio + copiados, n - copiados
+
+
+def _copiar_pwrite(src: int, dst: int, inicio: int, n: int, offset: int):
+    while n > 0:
+        datos = os.pread(src, min(n, BLOQUE), inicio)
+        if not datos:
+            raise OSError(f"archivo más corto de lo esperado (faltan {n} bytes)")
+        escritos = os.pwrite(dst, datos, offset)
+        inicio, offset, n = inicio + escritos, offset + escritos, n - escritos
+
+
+# Errores con los que el kernel indica que no puede copiar entre esos archivos
+_NO_SOPORTADO = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.EBADF}
+
+
+def _copiar_mmap(src, dst: int, inicio: int, n: int, offset: int):
+    # Se mapea solo la ventana de esta parte: al cerrarla sus páginas dejan de
+    # contar en el RSS del proceso
+    if n <= 0:
+        return
+    alineado = offset - offset % mmap.ALLOCATIONGRANULARITY
+    src.seek(inicio)
+    with mmap.mmap(dst, n + offset - alineado, offset=alineado) as mapa:
+        vista = memoryview(mapa)
+        try:
+            pos, fin = offset - alineado, offset - alineado + n
+            while pos < fin:
+                leidos = src.readinto(vista[pos:min(fin, pos + BLOQUE)])
+                if not leidos:
+                    raise OSError(f"{src.name}: archivo más corto de lo esperado")
+                pos += leidos
+        finally:
+            vista.release()
+
+
+def ensamblar(partes: Sequence[Parte], destino: str, metodo: str = "auto") -> int:
+    """
+    Escribe las partes en orden en `destino` y devuelve el tamaño final.
+    `destino` aparece completo o no cambia.
+    `metodo`: auto | copy_file_range | sendfile | mmap.
+    """
+    if metodo == "auto":
+        metodo = metodo_disponible()
+    if metodo not in METODOS:
+        raise ValueError(f"Método de ensamblado desconocido: {metodo} (opciones: {', '.join(METODOS)})")
+    posiciones = offsets(partes)
+    total = posiciones[-1] + partes[-1].fin - partes[-1].inicio if partes else 0
+
+    # Se arma en un temporal del mismo directorio y se mueve con os.replace (como
+    # cache_audio.py): un error a mitad de camino no deja en `destino` un archivo
+    # del tamaño final pero con huecos en blanco
+    tmp = os.path.join(os.path.dirname(destino) or ".", f".{os.path.basename(destino)}.{os.urandom(6).hex()}.tmp")
+    fd = os.open(tmp, os.O_RDWR | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+    try:
+        with span("ensamblar", metodo=metodo):
+            preasignar(fd, total)
+            if metodo == "mmap":
+                for p, offset in zip(partes, posiciones):
+                    with open(p.path, "rb", buffering=0) as src:
+                        _copiar_mmap(src, fd, p.inicio, p.fin - p.inicio, offset)
+            else:
+                copiar = _copiar_copy_file_range if metodo == "copy_file_range" else _copiar_sendfile
+                for p, offset in zip(partes, posiciones):
+                    with open(p.path, "rb") as src:
+                        try:
+                            copiar(src.fileno(), fd, p.inicio, p.fin - p.inicio, offset)
+                        except OSError as e:
+                            if e.errno not in _NO_SOPORTADO:
+                                raise
+                            log.debug("%s no disponible (%s); se copia con pwrite", metodo, e)
+                            copiar = _copiar_pwrite
+                            copiar(src.fileno(), fd, p.inicio, p.fin - p.inicio, offset)
+        os.close(fd)
+        fd = None
+        os.replace(tmp, destino)
+    except BaseException:
+        if fd is not None:
+            os.close(fd)
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    incrementar("bytes_ensamblados", total)
+    return total
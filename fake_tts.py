@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# fake_tts.py
+# Backend falso de Text-to-Speech para pruebas y benchmarks sin red ni
+# credenciales: imita synthesize_speech / list_voices (cliente gRPC) y el
+# endpoint REST v1/text:synthesize, con latencia, tasa de errores y tamaño de
+# audio configurables.
+#
+# Uso:
+#   python fake_tts.py --puerto 8099 --latencia 0.08 --tasa-error 0.02
+#   python check_synthesize_rest.py --endpoint http://127.0.0.1:8099
+#
+# Desde código:
+#   from fake_tts import FakeConfig, FakeTTSClient
+#   sintetizar_audio(ssml, voz, "x.mp3", client=FakeTTSClient(FakeConfig(latencia=0.05)))
+
+import argparse
+import asyncio
+import base64
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Dict, Optional, Tuple
+
+from perfiles import nombre_encoding, wav
+
+# Bytes de audio por carácter de entrada (MP3 32 kbps a ~15 caracteres por segundo)
+BYTES_POR_CARACTER = 270
+
+# Bytes por segundo del MP3 falso (32 kbps), para dar la misma duración en otros formatos
+BYTES_POR_SEGUNDO_MP3 = 4000
+
+# Límite de la API para el campo input (bytes UTF-8)
+MAX_INPUT_BYTES = 5000
+
+# Códigos de error que devuelve el backend falso y su estado gRPC/REST
+ESTADOS = {
+    400: "INVALID_ARGUMENT",
+    429: "RESOURCE_EXHAUSTED",
+    500: "INTERNAL",
+    503: "UNAVAILABLE",
+}
+
+
+class FakeTTSError(Exception):
+    """Error simulado de la API. `code` es el código HTTP equivalente."""
+
+    def __init__(self, code: int, message: str = "", retry_after: Optional[float] = None):
+        super().__init__(message or ESTADOS.get(code, "ERROR"))
+        self.code = code
+        self.retry_after = retry_after
+
+
+class FakeConfig:
+    """
+    Comportamiento del backend falso.
+
+    latencia     segundos de espera base por llamada
+    jitter       variación uniforme +/- sobre la latencia (segundos)
+    tasa_error   probabilidad de que una llamada falle
+    codigos      códigos de error entre los que se elige al fallar
+    retry_after  valor de Retry-After (segundos) para los 429
+    bytes_audio  tamaño fijo del audio; si es None, proporcional al texto
+    semilla      semilla del generador aleatorio (resultados reproducibles)
+    """
+
+    def __init__(self, latencia: float = 0.05, jitter: float = 0.0, tasa_error: float = 0.0,
+                 codigos: Tuple[int, ...] = (503,), retry_after: Optional[float] = 1.0,
+                 bytes_audio: Optional[int] = None, bytes_por_caracter: int = BYTES_POR_CARACTER,
+                 semilla: Optional[int] = None):
+        self.latencia = latencia
+        self.jitter = jitter
+        self.tasa_error = tasa_error
+        self.codigos = tuple(codigos)
+        self.retry_after = retry_after
+        self.bytes_audio = bytes_audio
+        self.bytes_por_caracter = bytes_por_caracter
+        self._rng = random.Random(semilla)
+        self._lock = threading.Lock()
+
+    def espera(self) -> float:
+        with self._lock:
+            extra = self._rng.uniform(-self.jitter, self.jitter) if self.jitter else 0.0
+        return max(0.0, self.latencia + extra)
+
+    def error(self) -> Optional[FakeTTSError]:
+        """Error a devolver en esta llamada, o None si debe salir bien."""
+        with self._lock:
+            if not self.tasa_error or self._rng.random() >= self.tasa_error:
+                return None
+            code = self._rng.choice(self.codigos)
+        return FakeTTSError(code, retry_after=self.retry_after if code == 429 else None)
+
+    def tamanio_audio(self, texto: str) -> int:
+        if self.bytes_audio is not None:
+            return self.bytes_audio
+        return max(1, len(texto)) * self.bytes_por_caracter
+
+
+def audio_falso(n_bytes: int) -> bytes:
+    """MP3 falso de `n_bytes`: cabecera ID3v2 vacía y frames con sync word (unir_mp3 lo trata como real)."""
+    id3 = b"ID3\x04\x00\x00\x00\x00\x00\x00"
+    frame = b"\xff\xfb\x90\x64" + bytes(413)
+    cuerpo = frame * (max(0, n_bytes - len(id3)) // len(frame) + 1)
+    return (id3 + cuerpo)[:max(n_bytes, len(id3))]
+
+
+# Un período de tono (64 muestras) para el LINEAR16 falso
+_PERIODO_PCM = b"".join(int(8000 * math.sin(2 * math.pi * i / 64)).to_bytes(2, "little", signed=True)
+                        for i in range(64))
+# Silencio en G.711
+_SILENCIO = {"MULAW": b"\xff", "ALAW": b"\xd5"}
+
+
+def audio_falso_en(n_bytes: int, encoding=None, sample_rate: Optional[int] = None) -> bytes:
+    """
+    Audio falso en la codificación pedida: MP3/OGG_OPUS como audio_falso();
+    LINEAR16/MULAW/ALAW como WAV con la duración de un MP3 de `n_bytes`.
+    """
+    encoding = nombre_encoding(encoding)
+    if encoding not in ("LINEAR16", "MULAW", "ALAW"):
+        return audio_falso(n_bytes)
+    rate = sample_rate or 24000
+    muestras = max(1, n_bytes * rate // BYTES_POR_SEGUNDO_MP3)
+    if encoding == "LINEAR16":
+        datos = (_PERIODO_PCM * (muestras // 64 + 1))[:muestras * 2]
+    else:
+        datos = _SILENCIO[encoding] * muestras
+    return wav(datos, rate, encoding)
+
+
+def _campo(obj, nombre: str, default=None):
+    # Acepta tanto objetos de google.cloud.texttospeech como dicts
+    if isinstance(obj, dict):
+        return obj.get(nombre, default)
+    return getattr(obj, nombre, default)
+
+
+def texto_de_peticion(input) -> str:
+    return _campo(input, "ssml") or _campo(input, "text") or ""
+
+
+def validar_texto(texto: str) -> Optional[FakeTTSError]:
+    """Mismo rechazo que la API real para entradas que superan MAX_INPUT_BYTES."""
+    if len(texto.encode("utf-8")) > MAX_INPUT_BYTES:
+        return FakeTTSError(400, f"Input size limit exceeded: {MAX_INPUT_BYTES} bytes")
+    return None
+
+
+def voces_falsas(language_code: Optional[str] = None):
+    """Voces de VOICE_INFO con el formato de list_voices()."""
+    from voces import VOICE_INFO
+    voces = []
+    for meta in VOICE_INFO.values():
+        lang = meta.get("languageCode") or "es-US"
+        if language_code and lang.lower() != language_code.lower():
+            continue
+        tipo = (meta.get("type") or "").lower()
+        voces.append(SimpleNamespace(
+            name=meta["name"],
+            language_codes=[lang],
+            ssml_gender=2,
+            natural_sample_rate_hertz=24000 if tipo.startswith("chirp") else 22050,
+        ))
+    return voces
+
+
+class FakeTTSClient:
+    """
+    Sustituto de texttospeech.TextToSpeechClient. Cuenta las llamadas recibidas
+    (`llamadas`, `errores`) para verificar caché, reintentos, etc.
+    """
+
+    def __init__(self, config: Optional[FakeConfig] = None):
+        self.config = config or FakeConfig()
+        self.llamadas = 0
+        self.errores = 0
+        self._lock = threading.Lock()
+
+    def _responder(self, input, audio_config=None):
+        with self._lock:
+            self.llamadas += 1
+        texto = texto_de_peticion(input)
+        error = validar_texto(texto) or self.config.error()
+        if error is not None:
+            with self._lock:
+                self.errores += 1
+            raise error
+        return SimpleNamespace(audio_content=audio_falso_en(self.config.tamanio_audio(texto),
+                                                            _campo(audio_config, "audio_encoding"),
+                                                            _campo(audio_config, "sample_rate_hertz")))
+
+    def synthesize_speech(self, input=None, voice=None, audio_config=None, request=None, timeout=None, **kwargs):
+        if request is not None:
+            input = _campo(request, "input")
+            audio_config = _campo(request, "audio_config")
+        time.sleep(self.config.espera())
+        return self._responder(input, audio_config)
+
+    def list_voices(self, language_code: Optional[str] = None, **kwargs):
+        time.sleep(self.config.espera())
+        return SimpleNamespace(voices=voces_falsas(language_code))
+
+    def streaming_synthesize(self, requests=None, timeout=None, **kwargs):
+        """
+        Sustituto de streaming_synthesize: la primera petición trae la
+        configuración y cada una de las siguientes un texto, que se responde
+        con su audio LINEAR16. Cada respuesta cuenta como una llamada.
+        """
+        peticiones = iter(requests)
+        next(peticiones, None)
+        for peticion in peticiones:
+            time.sleep(self.config.espera())
+            yield self._responder(_campo(peticion, "input"), {"audio_encoding": "LINEAR16"})
+
+
+class FakeTTSAsyncClient(FakeTTSClient):
+    """Sustituto de texttospeech.TextToSpeechAsyncClient (espera con asyncio.sleep)."""
+
+    async def synthesize_speech(self, input=None, voice=None, audio_config=None, request=None, timeout=None, **kwargs):
+        if request is not None:
+            input = _campo(request, "input")
+            audio_config = _campo(request, "audio_config")
+        await asyncio.sleep(self.config.espera())
+        return self._responder(input, audio_config)
+
+    async def list_voices(self, language_code: Optional[str] = None, **kwargs):
+        await asyncio.sleep(self.config.espera())
+        return SimpleNamespace(voices=voces_falsas(language_code))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    config: FakeConfig = FakeConfig()
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # silencioso: el servidor se usa en benchmarks
+
+    def _json(self, status: int, data: Dict, headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, error: FakeTTSError):
+        headers = {"Retry-After": f"{error.retry_after:g}"} if error.retry_after else None
+        self._json(error.code, {"error": {"code": error.code, "message": str(error),
+                                          "status": ESTADOS.get(error.code, "UNKNOWN")}}, headers)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length)
+        if self.path.split("?")[0] != "/v1/text:synthesize":
+            return self._json(404, {"error": {"code": 404, "message": "Not Found", "status": "NOT_FOUND"}})
+        try:
+            payload = json.loads(raw or b"{}")
+        except ValueError:
+            return self._json(400, {"error": {"code": 400, "message": "JSON inválido", "status": "INVALID_ARGUMENT"}})
+
+        time.sleep(self.config.espera())
+        texto = texto_de_peticion(payload.get("input") or {})
+        error = validar_texto(texto) or self.config.error()
+        if error is not None:
+            return self._error(error)
+        audio_config = payload.get("audioConfig") or {}
+        audio = audio_falso_en(self.config.tamanio_audio(texto), audio_config.get("audioEncoding"),
+                               audio_config.get("sampleRateHertz"))
+        self._json(200, {"audioContent": base64.b64encode(audio).decode("ascii")})
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/v1/voices":
+            return self._json(404, {"error": {"code": 404, "message": "Not Found", "status": "NOT_FOUND"}})
+        time.sleep(self.config.espera())
+        voces = [{"name": v.name, "languageCodes": v.language_codes, "ssmlGender": "FEMALE",
+                  "naturalSampleRateHertz": v.natural_sample_rate_hertz} for v in voces_falsas()]
+        self._json(200, {"voices": voces})
+
+
+def iniciar_servidor(config: Optional[FakeConfig] = None, host: str = "127.0.0.1",
+                     puerto: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Levanta el servidor REST falso en un hilo daemon. Con puerto=0 se elige uno
+    libre. Devuelve (servidor, endpoint); detenerlo con servidor.shutdown().
+    """
+    handler = type("FakeHandler", (_Handler,), {"config": config or FakeConfig()})
+    servidor = ThreadingHTTPServer((host, puerto), handler)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="fake-tts", daemon=True).start()
+    host, puerto = servidor.server_address[:2]
+    return servidor, f"http://{host}:{puerto}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor REST falso de Text-to-Speech (v1/text:synthesize).")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--puerto', '-p', type=int, default=8099)
+    parser.add_argument('--latencia', type=float, default=0.05, help='Latencia base por llamada (segundos).')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Variación +/- de la latencia (segundos).')
+    parser.add_argument('--tasa-error', type=float, default=0.0, help='Probabilidad de error por llamada (0-1).')
+    parser.add_argument('--codigos', type=str, default="503", help='Códigos de error separados por coma (429,500,503).')
+    parser.add_argument('--bytes-audio', type=int, help='Tamaño fijo del audio (por defecto, proporcional al texto).')
+    args = parser.parse_args()
+
+    config = FakeConfig(latencia=args.latencia, jitter=args.jitter, tasa_error=args.tasa_error,
+                        codigos=tuple(int(c) for c in args.codigos.split(",") if c.strip()),
+                        bytes_audio=args.bytes_audio)
+    servidor, endpoint = iniciar_servidor(config, args.host, args.puerto)
+    print(f"Fake TTS escuchando en {endpoint}/v1/text:synthesize (Ctrl+C para salir)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        servidor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
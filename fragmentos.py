@@ -0,0 +1,430 @@
+# fragmentos.py
+# Síntesis de guiones largos: divide el SSML en fragmentos por debajo del límite
+# de bytes de la API, los sintetiza en paralelo y une el audio en orden.
+#
+# El audio unido no pasa por memoria: cada fragmento queda en un archivo (la
+# entrada de la caché, enlazada, o un temporal) y ensamblado.py lo copia a su
+# offset en el archivo de salida.
+#
+# Para voces que no son Chirp se conservan todos los tags: los que abarcan
+# varias oraciones (<prosody>, <voice>, <lang>, <emphasis>...) se cierran al
+# final de cada oración y se reabren al principio de la siguiente, así que
+# cada fragmento es un documento completo con la misma prosodia que el guion.
+
+import logging
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from xml.parsers import expat
+from xml.sax.saxutils import escape, quoteattr
+
+from cache_audio import AudioCache, cache_key
+from clientes import get_client
+from ensamblado import Parte, ensamblar
+from sintetizador import AUDIO_CONFIG, MAX_INPUT_BYTES, preparar_sintesis, sintetizar_con_clave
+from metricas import incrementar, span
+from validacion import SSML_TAGS, SSMLInvalido
+from voces import CHIRP_ALLOWED_TAGS, es_chirp, split_ssml_sentences, resolve_voice
+
+log = logging.getLogger(__name__)
+
+CONCURRENCIA = 8
+
+# Tags que se conservan al fragmentar SSML para voces que no son Chirp: todos
+# los que acepta la API (<p>/<s> marcan los cortes)
+LONG_FORM_ALLOWED_TAGS = SSML_TAGS - {'speak'}
+# Elementos que se copian enteros, sin cortar dentro de ellos
+_ATOMICOS = {'say-as', 'sub', 'phoneme', 'audio', 'par', 'seq', 'media', 'desc'}
+_VACIOS = {'break', 'mark'}
+_CORTE = re.compile(r'\s*\n\s*\n\s*|(?<=[\.\!\?\…])\s+')
+_ESPACIOS = re.compile(r'\s+')
+
+_ENVOLTURA = "<speak><p></p></speak>"
+
+
+def tags_permitidos(voice_meta: dict):
+    """Tags que se conservan al fragmentar para la voz dada."""
+    return CHIRP_ALLOWED_TAGS if es_chirp(voice_meta) else LONG_FORM_ALLOWED_TAGS
+
+
+def _envolver(oraciones: List[str]) -> str:
+    return "<speak><p>" + "".join(f"<s>{o}</s>" for o in oraciones) + "</p></speak>"
+
+
+def _partir_oracion(oracion: str, max_bytes: int) -> List[str]:
+    """Parte una oración demasiado larga por palabras (último recurso)."""
+    partes, actual = [], ""
+    for palabra in oracion.split(" "):
+        candidata = f"{actual} {palabra}" if actual else palabra
+        if actual and len(candidata.encode("utf-8")) > max_bytes:
+            partes.append(actual)
+            actual = palabra
+        else:
+            actual = candidata
+    if actual:
+        partes.append(actual)
+    return partes
+
+
+def dividir_ssml(ssml: str, allowed_tags=CHIRP_ALLOWED_TAGS, max_bytes: int = MAX_INPUT_BYTES) -> List[str]:
+    """
+    Divide el SSML en documentos <speak> completos, cortando en límites de <p>/<s>
+    (mismo criterio que voces.sanitize_ssml_for_chirp), de modo que cada uno
+    ocupe como máximo `max_bytes` en UTF-8.
+    """
+    return agrupar_oraciones(oraciones_ssml(ssml, allowed_tags, max_bytes), max_bytes)
+
+
+def oraciones_ssml(ssml: str, allowed_tags=CHIRP_ALLOWED_TAGS, max_bytes: int = MAX_INPUT_BYTES) -> List[str]:
+    """Oraciones del SSML, partiendo por palabras las que no entran solas en `max_bytes`."""
+    # Bytes disponibles para el texto de cada oración (<s></s> = 7 bytes)
+    presupuesto = max_bytes - len(_ENVOLTURA) - 7
+    if not set(allowed_tags) <= CHIRP_ALLOWED_TAGS:
+        return _oraciones_con_contexto(ssml, allowed_tags, presupuesto)
+    oraciones = []
+    for o in split_ssml_sentences(ssml, allowed_tags):
+        if len(o.encode("utf-8")) > presupuesto:
+            oraciones.extend(_partir_oracion(o, presupuesto))
+        else:
+            oraciones.append(o)
+    return oraciones
+
+
+class _Oraciones:
+    """
+    Estado de _oraciones_con_contexto: la oración en curso y los tags abiertos.
+    Cada oración empieza reabriendo los tags que estaban abiertos al cortar la
+    anterior y termina cerrando los que siguen abiertos.
+    """
+
+    def __init__(self, presupuesto: int):
+        self.presupuesto = presupuesto
+        self.oraciones: List[str] = []
+        self.abiertos: List[Tuple[str, str]] = []   # (nombre, tag de apertura)
+        self.prefijo = ""
+        self.partes: List[str] = []
+        self.bytes = 0
+        self.con_contenido = False
+
+    def cierre(self) -> str:
+        return "".join(f"</{nombre}>" for nombre, _ in reversed(self.abiertos))
+
+    def libres(self) -> int:
+        return self.presupuesto - len((self.prefijo + self.cierre()).encode("utf-8")) - self.bytes
+
+    def agregar(self, pieza: str, contenido: bool = True):
+        self.partes.append(pieza)
+        self.bytes += len(pieza.encode("utf-8"))
+        self.con_contenido = self.con_contenido or contenido
+
+    def cortar(self):
+        if self.con_contenido:
+            self.oraciones.append((self.prefijo + "".join(self.partes)).strip() + self.cierre())
+        self.prefijo = "".join(tag for _, tag in self.abiertos)
+        self.partes, self.bytes, self.con_contenido = [], 0, False
+
+    def texto(self, texto: str):
+        """Agrega texto (ya escapado), cortando por palabras si no entra."""
+        if not self.con_contenido:
+            texto = texto.lstrip()
+        if not texto:
+            return
+        if len(texto.encode("utf-8")) <= self.libres():
+            self.agregar(texto, bool(texto.strip()))
+            return
+        for palabra in texto.split(" "):
+            if not palabra:
+                continue
+            pieza = f" {palabra}" if self.con_contenido else palabra
+            if self.con_contenido and len(pieza.encode("utf-8")) > self.libres():
+                self.cortar()
+                pieza = palabra
+            if len(pieza.encode("utf-8")) > self.libres():
+                raise SSMLInvalido([f"la palabra «{palabra[:40]}» no entra en un fragmento"])
+            self.agregar(pieza)
+        if texto.endswith(" ") and self.libres() > 0:
+            self.agregar(" ", contenido=False)
+
+    def elemento(self, ssml: str):
+        """Agrega un elemento que no se puede partir (say-as, audio, break...)."""
+        n = len(ssml.encode("utf-8"))
+        if self.con_contenido and n > self.libres():
+            self.cortar()
+        if n > self.libres():
+            raise SSMLInvalido([f"el elemento {ssml[:40]}... ocupa {n} bytes y no se puede partir "
+                                f"en fragmentos de {self.presupuesto}"])
+        self.agregar(ssml)
+
+
+def _apertura(nombre: str, atributos: Dict[str, str], vacio: bool = False) -> str:
+    attrs = "".join(f" {k}={quoteattr(v)}" for k, v in atributos.items())
+    return f"<{nombre}{attrs}{'/' if vacio else ''}>"
+
+
+def _oraciones_con_contexto(ssml: str, allowed_tags, presupuesto: int) -> List[str]:
+    """
+    Oraciones del SSML (voces que no son Chirp) como fragmentos SSML
+    balanceados: corta en <p>/<s> y en la puntuación final, y cada oración
+    reabre los tags que la envuelven (<prosody>, <voice>, <lang>...). Los
+    elementos de _ATOMICOS no se parten. El SSML tiene que estar bien formado
+    (validacion.py lo exige antes de sintetizar); si no, lanza SSMLInvalido.
+    """
+    estado = _Oraciones(presupuesto)
+    # Elementos que se descartan (conservando su texto) o que se copian enteros
+    descartados: List[str] = []
+    atomico: List[str] = []
+    profundidad_atomica = 0
+
+    def inicio(nombre, atributos):
+        nonlocal profundidad_atomica
+        base = nombre.lower()
+        if profundidad_atomica:
+            profundidad_atomica += 1
+            atomico.append(_apertura(nombre, atributos))
+        elif base == "speak" or base not in allowed_tags:
+            descartados.append(nombre)
+        elif base in ("p", "s"):
+            estado.cortar()
+        elif base in _VACIOS:
+            # break y mark no tienen contenido: el cierre lo ignora fin()
+            estado.elemento(_apertura(nombre, atributos, vacio=True))
+        elif base in _ATOMICOS:
+            profundidad_atomica = 1
+            atomico[:] = [_apertura(nombre, atributos)]
+        else:
+            tag = _apertura(nombre, atributos)
+            estado.agregar(tag, contenido=False)
+            estado.abiertos.append((nombre, tag))
+
+    def fin(nombre):
+        nonlocal profundidad_atomica
+        base = nombre.lower()
+        if profundidad_atomica:
+            profundidad_atomica -= 1
+            atomico.append(f"</{nombre}>")
+            if not profundidad_atomica:
+                estado.elemento("".join(atomico))
+        elif descartados and descartados[-1] == nombre:
+            descartados.pop()
+        elif base in ("p", "s"):
+            estado.cortar()
+        elif base in _VACIOS:
+            pass
+        else:
+            estado.abiertos.pop()
+            estado.agregar(f"</{nombre}>", contenido=False)
+
+    def texto(datos):
+        if profundidad_atomica:
+            atomico.append(escape(datos))
+            return
+        trozos = _CORTE.split(datos)
+        for i, trozo in enumerate(trozos):
+            if i:
+                estado.cortar()
+            estado.texto(_ESPACIOS.sub(" ", escape(trozo)))
+
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+    parser.StartElementHandler = inicio
+    parser.EndElementHandler = fin
+    parser.CharacterDataHandler = texto
+    try:
+        parser.Parse(ssml, True)
+    except expat.ExpatError as e:
+        raise SSMLInvalido([f"SSML mal formado ({expat.ErrorString(e.code)}, línea {e.lineno}); "
+                            f"no se puede fragmentar conservando los tags"]) from e
+    estado.cortar()
+    return estado.oraciones
+
+
+def agrupar_oraciones(oraciones: List[str], max_bytes: int = MAX_INPUT_BYTES) -> List[str]:
+    """Empaqueta oraciones consecutivas en documentos <speak> de hasta `max_bytes`."""
+    presupuesto = max_bytes - len(_ENVOLTURA)
+    fragmentos, actual, tam = [], [], 0
+    for o in oraciones:
+        n = len(o.encode("utf-8")) + 7
+        if actual and tam + n > presupuesto:
+            fragmentos.append(_envolver(actual))
+            actual, tam = [], 0
+        actual.append(o)
+        tam += n
+    if actual:
+        fragmentos.append(_envolver(actual))
+    return fragmentos
+
+
+def rango_id3(cabecera: bytes, cola: bytes, tamanio: int, primero: bool, ultimo: bool) -> Tuple[int, int]:
+    """
+    Rango [inicio, fin) de un fragmento MP3 de `tamanio` bytes sin la cabecera
+    ID3v2 (salvo en el primero) ni el ID3v1 final (salvo en el último), a
+    partir de sus primeros 10 bytes y sus últimos 128.
+    """
+    inicio, fin = 0, tamanio
+    if not primero and cabecera[:3] == b"ID3" and len(cabecera) >= 10:
+        # Tamaño en formato syncsafe (7 bits por byte)
+        size = (cabecera[6] << 21) | (cabecera[7] << 14) | (cabecera[8] << 7) | cabecera[9]
+        footer = 10 if cabecera[5] & 0x10 else 0
+        inicio = min(tamanio, 10 + size + footer)
+    if not ultimo and tamanio - inicio >= 128 and cola[-128:-125] == b"TAG":
+        fin = tamanio - 128
+    return inicio, fin
+
+
+def quitar_id3(data: bytes, primero: bool, ultimo: bool) -> bytes:
+    """Quita la cabecera ID3v2 (salvo en el primer fragmento) y el ID3v1 final (salvo en el último)."""
+    inicio, fin = rango_id3(data[:10], data[-128:], len(data), primero, ultimo)
+    return data[inicio:fin]
+
+
+def parte_mp3(path: str, primero: bool, ultimo: bool) -> Parte:
+    """Parte (ver ensamblado.py) con el rango útil de un fragmento MP3 en disco."""
+    with open(path, "rb") as fh:
+        cabecera = fh.read(10)
+        tamanio = os.fstat(fh.fileno()).st_size
+        fh.seek(max(0, tamanio - 128))
+        cola = fh.read(128)
+    return Parte(path, *rango_id3(cabecera, cola, tamanio, primero, ultimo))
+
+
+def unir_mp3(partes: List[bytes]) -> bytes:
+    """Concatena fragmentos MP3 en orden sin metadatos intermedios."""
+    n = len(partes)
+    return b"".join(quitar_id3(p, i == 0, i == n - 1) for i, p in enumerate(partes))
+
+
+def _enlazar(origen: Path, destino: str) -> bool:
+    # Enlace duro: no copia datos y el fragmento sobrevive aunque la caché lo desaloje
+    try:
+        os.link(origen, destino)
+        return True
+    except OSError:
+        return False
+
+
+def directorio_spool(output_file: str, cache: Optional[AudioCache] = None) -> Path:
+    """Dónde dejar los fragmentos: junto a la caché (para enlazarlos) o junto a la salida."""
+    directorio = cache.directory if cache is not None else Path(output_file).resolve().parent
+    directorio.mkdir(parents=True, exist_ok=True)
+    return directorio
+
+
+def fragmento_desde_cache(cache: Optional[AudioCache], key: str, destino: str) -> bool:
+    """Enlaza en `destino` la entrada de caché de `key` si existe (un hit sin leer el audio)."""
+    if cache is None:
+        return False
+    ruta = cache.ruta(key, contar_hit=True)
+    if ruta is not None and _enlazar(ruta, destino):
+        incrementar("cache_hits")
+        return True
+    return False
+
+
+def guardar_fragmento(audio: bytes, clave: str, destino: str, cache: Optional[AudioCache] = None):
+    """Deja el fragmento en `destino`: enlazando su entrada de caché o escribiéndolo."""
+    ruta = cache.ruta(clave) if cache is not None else None
+    if ruta is None or not _enlazar(ruta, destino):
+        with open(destino, "wb") as fh:
+            fh.write(audio)
+
+
+def unir_en_archivo(rutas: List[str], output_file: str) -> int:
+    """Ensambla en `output_file` los fragmentos MP3 en disco, en orden. Devuelve el tamaño."""
+    n = len(rutas)
+    partes = [parte_mp3(r, i == 0, i == n - 1) for i, r in enumerate(rutas)]
+    with span("escribir_archivo"):
+        return ensamblar(partes, output_file)
+
+
+def sintetizar_a_archivo(preparados: List[tuple], output_file: str, client=None,
+                         cache: Optional[AudioCache] = None, concurrencia: int = CONCURRENCIA) -> int:
+    """
+    Sintetiza los fragmentos ya preparados (ver preparar_sintesis) y escribe el
+    MP3 unido en `output_file` sin juntar el audio en memoria: en memoria hay
+    a lo sumo un fragmento por hilo. Devuelve el tamaño del archivo.
+    """
+    with tempfile.TemporaryDirectory(dir=directorio_spool(output_file, cache), prefix=".fragmentos-") as spool:
+
+        def sintetizar(item):
+            i, (ssml_a_usar, voice_name_resolved, language_code, _) = item
+            # Extensión propia: que AudioCache.evict no confunda el spool con entradas
+            destino = os.path.join(spool, f"{i:06d}.parte")
+            key = cache_key(ssml_a_usar, voice_name_resolved, language_code, AUDIO_CONFIG)
+            if fragmento_desde_cache(cache, key, destino):
+                return destino
+            audio, clave = sintetizar_con_clave(ssml_a_usar, voice_name_resolved, language_code,
+                                                client=client, cache=cache)
+            guardar_fragmento(audio, clave, destino, cache)
+            return destino
+
+        # map conserva el orden; el tiempo total lo marca el fragmento más lento
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrencia, len(preparados)))) as pool:
+            rutas = list(pool.map(sintetizar, enumerate(preparados)))
+
+        return unir_en_archivo(rutas, output_file)
+
+
+def sintetizar_largo(ssml_input: str, voice_name: str, output_file: str = "output.mp3",
+                     client=None, cache: Optional[AudioCache] = None,
+                     concurrencia: int = CONCURRENCIA, max_bytes: int = MAX_INPUT_BYTES) -> int:
+    """
+    Sintetiza un guion de cualquier longitud: lo fragmenta, sintetiza los
+    fragmentos en paralelo con un cliente compartido y escribe el audio unido
+    en `output_file`. Devuelve la cantidad de fragmentos.
+    """
+    _, _, voice_meta = resolve_voice(voice_name)
+    fragmentos = dividir_ssml(ssml_input, tags_permitidos(voice_meta), max_bytes)
+
+    preparados = [preparar_sintesis(f, voice_name) for f in fragmentos]
+
+    if client is None:
+        client = get_client()
+
+    sintetizar_a_archivo(preparados, output_file, client=client, cache=cache, concurrencia=concurrencia)
+
+    log.info("Audio generado (%d fragmentos) y guardado en: %s", len(preparados), output_file)
+    return len(preparados)
+
+
+def sintetizar_incremental(ssml_input: str, voice_name: str, output_file: str = "output.mp3",
+                           client=None, cache: Optional[AudioCache] = None,
+                           concurrencia: int = CONCURRENCIA) -> Dict[str, int]:
+    """
+    Sintetiza el guion oración por oración, cacheando cada una por
+    oración + voz + configuración de audio, y une el resultado. Al editar una
+    línea de un guion ya sintetizado solo se piden a la API las oraciones que
+    cambiaron; el resto sale de la caché.
+
+    Devuelve {'oraciones', 'reutilizadas', 'sintetizadas', 'caracteres'}, donde
+    'caracteres' son los enviados a la API en esta llamada.
+    """
+    if cache is None:
+        cache = AudioCache()
+    _, _, voice_meta = resolve_voice(voice_name)
+    oraciones = oraciones_ssml(ssml_input, tags_permitidos(voice_meta))
+    preparados = [preparar_sintesis(_envolver([o]), voice_name) for o in oraciones]
+
+    # Oraciones (distintas) que no están en caché: las únicas que se facturan
+    nuevas = {}
+    for ssml_a_usar, voice_name_resolved, language_code, _ in preparados:
+        key = cache_key(ssml_a_usar, voice_name_resolved, language_code, AUDIO_CONFIG)
+        if key not in nuevas and not cache.contiene(key):
+            nuevas[key] = len(ssml_a_usar)
+
+    if nuevas and client is None:
+        client = get_client()
+
+    sintetizar_a_archivo(preparados, output_file, client=client, cache=cache, concurrencia=concurrencia)
+
+    resumen = {
+        "oraciones": len(preparados),
+        "reutilizadas": len(preparados) - len(nuevas),
+        "sintetizadas": len(nuevas),
+        "caracteres": sum(nuevas.values()),
+    }
+    log.info("Audio generado (%d de %d oraciones sintetizadas, %s caracteres) y guardado en: %s",
+             resumen["sintetizadas"], resumen["oraciones"], f"{resumen['caracteres']:,}", output_file)
+    return resumen
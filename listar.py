@@ -1,39 +1,33 @@
 # listar.py
-import os
 from pathlib import Path
-from google.cloud import texttospeech
 import sys
 
+import clientes
+from cuota import con_reintentos
+
 OUT_FILENAME = "voces_listadas.txt"
 
 def get_client():
-    # Si la variable de entorno está definida y apunta a un archivo -> usar ADC (cliente por defecto)
-    env_path = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
-    if env_path and Path(env_path).is_file():
-        # ADC funcionará cuando exista la variable, así que usamos el cliente por defecto
-        return texttospeech.TextToSpeechClient()
-
-    # Fallback: buscar un archivo JSON común en el mismo directorio
-    candidate = Path(__file__).parent / "tts-sa-key.json"
-    if candidate.is_file():
-        return texttospeech.TextToSpeechClient.from_service_account_file(str(candidate))
+    # Cliente compartido: GOOGLE_APPLICATION_CREDENTIALS > tts-sa-key.json local > ADC
+    return clientes.get_client()
 
-    # Último recurso: intentar cliente por defecto (puede fallar si no hay credenciales)
-    return texttospeech.TextToSpeechClient()
+GENDERS = {
+    0: "SSML_VOICE_GENDER_UNSPECIFIED",
+    1: "MALE",
+    2: "FEMALE",
+    3: "NEUTRAL"
+}
 
-def format_voice(v):
-    # Convierte un objeto Voice en texto legible
-    genders = {
-        0: "SSML_VOICE_GENDER_UNSPECIFIED",
-        1: "MALE",
-        2: "FEMALE",
-        3: "NEUTRAL"
-    }
+def gender_name(v):
     # v.ssml_gender es un enum int en algunas versiones; intentar resolver
     try:
-        gender = genders.get(int(v.ssml_gender), str(v.ssml_gender))
+        return GENDERS.get(int(v.ssml_gender), str(v.ssml_gender))
     except Exception:
-        gender = str(v.ssml_gender)
+        return str(v.ssml_gender)
+
+def format_voice(v):
+    # Convierte un objeto Voice en texto legible
+    gender = gender_name(v)
 
     lines = [
         f"Name: {v.name}",
@@ -62,11 +56,11 @@ def main():
 
     try:
         # Pedimos la lista filtrada por language_code (si el servicio lo soporta)
-        resp = client.list_voices(language_code=language_code)
+        resp = con_reintentos(client.list_voices, language_code=language_code, limiter=None)
         voices = resp.voices
         if not voices:
             # Fallback si no hay voces para ese language_code
-            resp_all = client.list_voices()
+            resp_all = con_reintentos(client.list_voices, limiter=None)
             voices = resp_all.voices
             header = f"No se encontraron voces para '{language_code}'. Listando todas las voces disponibles:\n\n"
         else:
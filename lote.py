@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# lote.py
+# Síntesis por lotes a partir de un archivo JSONL de trabajos {ssml, voice, output}.
+# Opcionales: "perfil" (formato de audio, ver perfiles.py) y "salidas"
+# ({perfil: archivo}) para generar el mismo guion en varios formatos.
+#
+# Uso:
+#   python lote.py trabajos.jsonl --manifest manifest.jsonl --concurrencia 8
+#   python lote.py trabajos.jsonl --procesos 8      # un proceso por núcleo
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from cache_audio import AudioCache
+from clientes import get_client
+from cuota import backoff, es_reintentable
+import metricas
+import presupuesto
+from perfiles import sintetizar_perfiles
+from sintetizador import sintetizar_audio
+
+CONCURRENCIA = 8
+REINTENTOS = 3
+
+
+def parsear_trabajo(line: str, n: int) -> Dict:
+    """Trabajo de la línea `n` con su 'linea'; si es inválida, {'linea', 'error'}."""
+    try:
+        trabajo = json.loads(line)
+    except json.JSONDecodeError as e:
+        return {"linea": n, "error": f"JSON inválido: {e}"}
+    faltantes = [k for k in ("ssml", "voice", "output") if not trabajo.get(k)]
+    if faltantes:
+        return {"linea": n, "error": f"faltan campos: {', '.join(faltantes)}"}
+    trabajo["linea"] = n
+    return trabajo
+
+
+def leer_trabajos(path: str) -> Iterator[Dict]:
+    """
+    Lee el JSONL línea a línea (sin cargarlo entero en memoria).
+    Cada trabajo lleva además 'linea' con su número de línea. Las líneas
+    inválidas se devuelven con la clave 'error'.
+    """
+    with open(path, encoding="utf-8") as fh:
+        for n, line in enumerate(fh, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            yield parsear_trabajo(line, n)
+
+
+def sintetizar_trabajo(trabajo: Dict, client=None, cache: Optional[AudioCache] = None):
+    """Sintetiza un trabajo ya parseado en su formato (o formatos, con 'salidas')."""
+    if trabajo.get("salidas"):
+        salidas = {trabajo.get("perfil") or "mp3": trabajo["output"], **trabajo["salidas"]}
+        sintetizar_perfiles(trabajo["ssml"], trabajo["voice"], salidas, client=client, cache=cache)
+    else:
+        sintetizar_audio(trabajo["ssml"], trabajo["voice"], trabajo["output"],
+                         client=client, cache=cache, incremental=bool(trabajo.get("incremental")),
+                         perfil=trabajo.get("perfil"))
+
+
+def procesar_trabajo(trabajo: Dict, client=None, cache: Optional[AudioCache] = None,
+                     reintentos: int = REINTENTOS) -> Dict:
+    """
+    Sintetiza un trabajo y devuelve su registro para el manifiesto. Cada llamada
+    a la API ya pasa por el limitador y reintenta los 429/5xx y los errores de
+    red (cuota.py): si uno de esos llega hasta aquí, con_reintentos ya agotó sus
+    intentos y no se vuelve a empezar. El trabajo completo se reintenta solo por
+    errores de E/S locales (escribir la salida o la caché).
+    """
+    resultado = {
+        "linea": trabajo["linea"],
+        "voice": trabajo["voice"],
+        "output": trabajo["output"],
+    }
+    if trabajo.get("perfil"):
+        resultado["perfil"] = trabajo["perfil"]
+    # Al menos un intento: con reintentos=0 el trabajo se intenta igual una vez
+    reintentos = max(1, reintentos)
+    inicio = time.monotonic()
+    for intento in range(1, reintentos + 1):
+        try:
+            sintetizar_trabajo(trabajo, client, cache)
+            resultado["estado"] = "ok"
+            break
+        except presupuesto.PresupuestoExcedido as e:
+            resultado["estado"] = "error"
+            resultado["error"] = str(e)
+            break
+        except (KeyError, ValueError) as e:
+            # Voz o perfil desconocidos, SSML inválido: reintentar no sirve de nada
+            resultado["estado"] = "error"
+            resultado["error"] = str(e)
+            break
+        except Exception as e:
+            resultado["estado"] = "error"
+            resultado["error"] = repr(e)
+            if es_reintentable(e) or not isinstance(e, OSError):
+                break
+            if intento < reintentos:
+                time.sleep(backoff(intento))
+    resultado["intentos"] = intento
+    resultado["segundos"] = round(time.monotonic() - inicio, 3)
+    return resultado
+
+
+def ejecutar_lote(path: str, manifest_path: str, concurrencia: int = CONCURRENCIA,
+                  reintentos: int = REINTENTOS, client=None,
+                  cache: Optional[AudioCache] = None) -> Dict[str, int]:
+    """
+    Procesa todos los trabajos de `path` con un pool de hilos de `concurrencia`
+    workers y un único cliente compartido. Escribe un registro JSON por trabajo
+    en `manifest_path` a medida que terminan. Devuelve un resumen {ok, error}.
+    """
+    if client is None:
+        client = get_client()
+
+    resumen = {"ok": 0, "error": 0}
+    # Ventana acotada de trabajos en vuelo para no leer todo el archivo de golpe
+    max_pendientes = concurrencia * 2
+
+    with open(manifest_path, "w", encoding="utf-8") as manifest, \
+            ThreadPoolExecutor(max_workers=concurrencia) as pool:
+
+        def registrar(resultado):
+            resumen[resultado["estado"]] += 1
+            manifest.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+            manifest.flush()
+
+        pendientes = set()
+        for trabajo in leer_trabajos(path):
+            if "error" in trabajo:
+                registrar({"linea": trabajo["linea"], "estado": "error", "error": trabajo["error"]})
+                continue
+            if len(pendientes) >= max_pendientes:
+                hechos, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+                for f in hechos:
+                    registrar(f.result())
+            pendientes.add(pool.submit(procesar_trabajo, trabajo, client, cache, reintentos))
+
+        for f in pendientes:
+            registrar(f.result())
+
+    return resumen
+
+
+def indexar_trabajos(path: str) -> List[Tuple[int, int, int]]:
+    """
+    (bytes, offset, linea) de cada línea no vacía, de la más larga a la más
+    corta. No parsea el JSON ni guarda el SSML: solo tres enteros por trabajo.
+    """
+    indice = []
+    offset = 0
+    with open(path, "rb") as fh:
+        for n, line in enumerate(fh, start=1):
+            if line.strip():
+                indice.append((len(line), offset, n))
+            offset += len(line)
+    indice.sort(key=lambda t: (-t[0], t[2]))
+    return indice
+
+
+# Estado de cada proceso worker (un cliente y un descriptor del JSONL por proceso)
+_worker: Dict = {}
+
+
+def _iniciar_worker(path: str, cache_dir: Optional[str], reintentos: int):
+    _worker["fh"] = open(path, "rb")
+    _worker["client"] = get_client()
+    _worker["cache"] = AudioCache(cache_dir) if cache_dir else None
+    _worker["reintentos"] = reintentos
+
+
+def _procesar_linea(offset: int, n: int) -> Dict:
+    fh = _worker["fh"]
+    fh.seek(offset)
+    trabajo = parsear_trabajo(fh.readline().decode("utf-8").strip(), n)
+    if "error" in trabajo:
+        return {"linea": n, "estado": "error", "error": trabajo["error"]}
+    return procesar_trabajo(trabajo, _worker["client"], _worker["cache"], _worker["reintentos"])
+
+
+def ejecutar_lote_procesos(path: str, manifest_path: str, procesos: Optional[int] = None,
+                           reintentos: int = REINTENTOS,
+                           cache_dir: Optional[str] = None) -> Dict[str, int]:
+    """
+    Igual que ejecutar_lote pero repartiendo los trabajos entre `procesos`
+    procesos (por defecto uno por núcleo), para cuando la sanitización, la
+    fragmentación y el post-proceso de audio saturan un solo intérprete.
+
+    Los trabajos se envían de a uno, del guion más largo al más corto, y cada
+    worker toma el siguiente en cuanto se libera: los guiones largos arrancan
+    primero y no quedan rezagados al final. Cada worker tiene su propio
+    cliente; el manifiesto lo escribe solo el proceso principal. El limitador
+    de tasa se comparte entre procesos mediante TTS_RATE_FILE.
+    """
+    procesos = procesos or os.cpu_count() or 1
+    rate_file = None
+    if not os.environ.get("TTS_RATE_FILE"):
+        # Los workers heredan el entorno: todos comparten el mismo bucket de cuota
+        rate_file = os.path.join(tempfile.gettempdir(), f"tts_rate_{os.getpid()}.json")
+        os.environ["TTS_RATE_FILE"] = rate_file
+    try:
+        return _ejecutar_en_procesos(path, manifest_path, procesos, reintentos, cache_dir)
+    finally:
+        if rate_file:
+            del os.environ["TTS_RATE_FILE"]
+            try:
+                os.remove(rate_file)
+            except OSError:
+                pass
+
+
+def _ejecutar_en_procesos(path: str, manifest_path: str, procesos: int, reintentos: int,
+                          cache_dir: Optional[str]) -> Dict[str, int]:
+    resumen = {"ok": 0, "error": 0}
+    max_pendientes = procesos * 2
+    # spawn: los canales gRPC no sobreviven a un fork
+    contexto = multiprocessing.get_context("spawn")
+
+    with open(manifest_path, "w", encoding="utf-8") as manifest, \
+            ProcessPoolExecutor(max_workers=procesos, mp_context=contexto, initializer=_iniciar_worker,
+                                initargs=(path, cache_dir, reintentos)) as pool:
+
+        def registrar(resultado):
+            resumen[resultado["estado"]] += 1
+            manifest.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+            manifest.flush()
+
+        pendientes = set()
+        for _, offset, n in indexar_trabajos(path):
+            if len(pendientes) >= max_pendientes:
+                hechos, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+                for f in hechos:
+                    registrar(f.result())
+            pendientes.add(pool.submit(_procesar_linea, offset, n))
+
+        for f in pendientes:
+            registrar(f.result())
+
+    return resumen
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sintetiza en lote los trabajos {ssml, voice, output} de un archivo JSONL.")
+    parser.add_argument('jobs', type=str, help='Archivo JSONL con un trabajo por línea.')
+    parser.add_argument('--manifest', '-m', type=str, default='manifest.jsonl', help='Archivo JSONL de resultados.')
+    parser.add_argument('--concurrencia', '-c', type=int, default=CONCURRENCIA, help='Máximo de síntesis simultáneas.')
+    parser.add_argument('--reintentos', '-r', type=int, default=REINTENTOS, help='Intentos por trabajo ante errores de E/S locales (los de la API ya los reintenta cuota.py).')
+    parser.add_argument('--sin-cache', action='store_true', help='No usar la caché de audio en disco.')
+    parser.add_argument('--procesos', '-p', type=int, nargs='?', const=0, default=None,
+                        help='Repartir los trabajos entre procesos (sin valor: uno por núcleo).')
+    parser.add_argument('--metricas-puerto', type=int, help='Exponer /metrics (formato Prometheus) en este puerto.')
+    parser.add_argument('--metricas-jsonl', type=str, help='Escribir cada span y contador en este JSONL (también desde los workers).')
+    parser.add_argument('--presupuesto', type=float, help='Tope de gasto del mes en USD (rechaza o degrada los trabajos que lo superan).')
+    parser.add_argument('--presupuesto-file', type=str, default=presupuesto.PRESUPUESTO_FILE, help='Archivo con el total del mes.')
+    parser.add_argument('--sin-degradar', action='store_true', help='Rechazar en lugar de degradar a una voz más barata.')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Mostrar el detalle de cada trabajo.')
+    args = parser.parse_args()
+    if args.reintentos < 1:
+        parser.error("--reintentos debe ser al menos 1")
+    if args.concurrencia < 1:
+        parser.error("--concurrencia debe ser al menos 1")
+    if args.procesos is not None and args.procesos < 0:
+        parser.error("--procesos no puede ser negativo")
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format="%(message)s")
+    if args.metricas_jsonl:
+        # Los workers (--procesos) lo toman del entorno al importar metricas
+        os.environ["TTS_METRICS_JSONL"] = args.metricas_jsonl
+        metricas.configurar(args.metricas_jsonl)
+    if args.metricas_puerto:
+        metricas.servir(args.metricas_puerto)
+    libro = None
+    if args.presupuesto is not None:
+        # Los workers (--procesos) lo activan desde el entorno al importar presupuesto
+        os.environ["TTS_PRESUPUESTO_USD"] = str(args.presupuesto)
+        os.environ["TTS_PRESUPUESTO_FILE"] = args.presupuesto_file
+        if args.sin_degradar:
+            os.environ["TTS_PRESUPUESTO_SIN_DEGRADAR"] = "1"
+        libro = presupuesto.activar(args.presupuesto, args.presupuesto_file,
+                                    degradar=None if args.sin_degradar else presupuesto.DEGRADAR)
+
+    cache = None if args.sin_cache else AudioCache()
+    inicio = time.monotonic()
+    if args.procesos is not None:
+        resumen = ejecutar_lote_procesos(args.jobs, args.manifest, args.procesos or None, args.reintentos,
+                                         cache_dir=None if cache is None else str(cache.directory))
+    else:
+        resumen = ejecutar_lote(args.jobs, args.manifest, args.concurrencia, args.reintentos, cache=cache)
+    total = time.monotonic() - inicio
+
+    print(f"Trabajos OK: {resumen['ok']}  Errores: {resumen['error']}  ({total:.1f}s)")
+    print(f"Manifiesto escrito en: {args.manifest}")
+    if cache is not None and args.procesos is None:
+        print(f"Caché: {cache.stats()}")
+    if args.procesos is None:
+        print(f"Métricas: {metricas.METRICAS.resumen()['contadores']}")
+    if libro is not None:
+        libro.guardar()
+        r = libro.resumen()
+        print(f"Presupuesto {r['mes']}: {r['usd']:.4f} de {r['limite_usd']:.2f} USD ({args.presupuesto_file})")
+    if resumen["error"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+# metricas.py
+# Métricas de la ruta de síntesis: spans de tiempo (resolver voz, sanitizar,
+# crear cliente, refrescar token, llamada a la API, escribir archivo) y
+# contadores (caracteres facturados, bytes de audio, hits de caché,
+# reintentos...).
+#
+# Todo se acumula en memoria (un lock y unas sumas por evento). Se puede
+# exponer en formato de texto de Prometheus con servir(puerto) o volcar cada
+# evento a un JSONL con configurar(jsonl=...) / TTS_METRICS_JSONL.
+#
+# Uso:
+#   from metricas import span, incrementar
+#   with span("llamada_api"):
+#       ...
+#   incrementar("caracteres_facturados", len(ssml))
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+PREFIJO = "tts_"
+# Límites superiores (segundos) de los buckets del histograma de spans
+BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Etiquetas = Tuple[Tuple[str, str], ...]
+
+
+def _etiquetas(labels: Optional[Dict[str, str]]) -> Etiquetas:
+    return tuple(sorted((k, str(v)) for k, v in labels.items())) if labels else ()
+
+
+def _formatear(labels: Etiquetas, extra: str = "") -> str:
+    partes = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+class _Histograma:
+    __slots__ = ("cuenta", "suma", "buckets")
+
+    def __init__(self):
+        self.cuenta = 0
+        self.suma = 0.0
+        self.buckets = [0] * len(BUCKETS)
+
+    def observar(self, valor: float):
+        self.cuenta += 1
+        self.suma += valor
+        for i, limite in enumerate(BUCKETS):
+            if valor <= limite:
+                self.buckets[i] += 1
+                break
+
+
+class Metricas:
+    """Registro de contadores e histogramas de spans, seguro entre hilos."""
+
+    def __init__(self, jsonl: Optional[str] = None):
+        self._lock = threading.Lock()
+        self._contadores: Dict[Tuple[str, Etiquetas], float] = {}
+        self._spans: Dict[Tuple[str, Etiquetas], _Histograma] = {}
+        self._jsonl = None
+        if jsonl:
+            self.configurar(jsonl)
+
+    def configurar(self, jsonl: Optional[str]):
+        """Activa (ruta) o desactiva (None) el volcado de eventos a JSONL."""
+        with self._lock:
+            if self._jsonl is not None:
+                self._jsonl.close()
+            # Modo append: varios procesos pueden escribir al mismo archivo
+            self._jsonl = open(jsonl, "a", encoding="utf-8", buffering=1) if jsonl else None
+
+    def _emitir(self, evento: Dict):
+        if self._jsonl is not None:
+            self._jsonl.write(json.dumps(evento, ensure_ascii=False) + "\n")
+
+    def incrementar(self, nombre: str, valor: float = 1, labels: Optional[Dict[str, str]] = None):
+        clave = (nombre, _etiquetas(labels))
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + valor
+            if self._jsonl is not None:
+                self._emitir({"ts": time.time(), "contador": nombre, "valor": valor, **(labels or {})})
+
+    def observar(self, nombre: str, segundos: float, labels: Optional[Dict[str, str]] = None):
+        clave = (nombre, _etiquetas(labels))
+        with self._lock:
+            hist = self._spans.get(clave)
+            if hist is None:
+                hist = self._spans[clave] = _Histograma()
+            hist.observar(segundos)
+            if self._jsonl is not None:
+                self._emitir({"ts": time.time(), "span": nombre, "segundos": round(segundos, 6), **(labels or {})})
+
+    @contextmanager
+    def span(self, nombre: str, **labels):
+        """Mide el bloque y lo registra como span `nombre` (también si lanza excepción)."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nombre, time.perf_counter() - inicio, labels or None)
+
+    def resumen(self) -> Dict:
+        """Contadores y, por span, cuenta y segundos totales (para logs o tests)."""
+        with self._lock:
+            return {
+                "contadores": {n + _formatear(l): v for (n, l), v in self._contadores.items()},
+                "spans": {n + _formatear(l): {"cuenta": h.cuenta, "segundos": round(h.suma, 6)}
+                          for (n, l), h in self._spans.items()},
+            }
+
+    def prometheus(self) -> str:
+        """Exposición en formato de texto de Prometheus (versión 0.0.4)."""
+        lineas = []
+        with self._lock:
+            contadores = sorted(self._contadores.items())
+            spans = sorted((k, (h.cuenta, h.suma, list(h.buckets))) for k, h in self._spans.items())
+        vistos = set()
+        for (nombre, labels), valor in contadores:
+            metrica = f"{PREFIJO}{nombre}_total"
+            if metrica not in vistos:
+                vistos.add(metrica)
+                lineas.append(f"# TYPE {metrica} counter")
+            lineas.append(f"{metrica}{_formatear(labels)} {valor:g}")
+        if spans:
+            metrica = f"{PREFIJO}span_seconds"
+            lineas.append(f"# TYPE {metrica} histogram")
+            for (nombre, labels), (cuenta, suma, buckets) in spans:
+                labels = (("span", nombre),) + labels
+                acumulado = 0
+                for limite, n in zip(BUCKETS, buckets):
+                    acumulado += n
+                    le = 'le="%g"' % limite
+                    lineas.append(f"{metrica}_bucket{_formatear(labels, le)} {acumulado}")
+                le = 'le="+Inf"'
+                lineas.append(f"{metrica}_bucket{_formatear(labels, le)} {cuenta}")
+                lineas.append(f"{metrica}_sum{_formatear(labels)} {suma:.6f}")
+                lineas.append(f"{metrica}_count{_formatear(labels)} {cuenta}")
+        return "\n".join(lineas) + "\n"
+
+    def reiniciar(self):
+        with self._lock:
+            self._contadores.clear()
+            self._spans.clear()
+
+
+# Registro compartido por todo el proceso
+METRICAS = Metricas(os.environ.get("TTS_METRICS_JSONL") or None)
+
+span = METRICAS.span
+incrementar = METRICAS.incrementar
+configurar = METRICAS.configurar
+
+
+def servir(puerto: int = 9464, host: str = "127.0.0.1", metricas: Metricas = METRICAS) -> ThreadingHTTPServer:
+    """Expone GET /metrics (texto Prometheus) en un hilo daemon. Devuelve el servidor."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metricas.prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    servidor = ThreadingHTTPServer((host, puerto), Handler)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="metricas", daemon=True).start()
+    return servidor
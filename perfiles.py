@@ -0,0 +1,319 @@
+# perfiles.py
+# Perfiles de audio por canal de destino (web, telefonía, podcast...) y
+# transcodificación local.
+#
+# Cada perfil fija la codificación y el sample rate que se piden a la API, así
+# un trabajo para telefonía recibe MULAW a 8 kHz (8 KB/s) en lugar de MP3 a la
+# tasa natural de la voz. Cuando el mismo guion se necesita en varios formatos,
+# sintetizar_perfiles() pide LINEAR16 una sola vez y deriva el resto localmente
+# en un pool de hilos: una llamada a la API (y un cargo) en lugar de una por
+# formato.
+#
+# LINEAR16 / MULAW / ALAW se derivan con numpy; OGG_OPUS y MP3 con bitrate
+# necesitan ffmpeg en el PATH. Lo que no se puede derivar se pide a la API.
+#
+# Uso:
+#   sintetizar_audio(ssml, voz, "aviso.wav", perfil="telefonia")
+#   sintetizar_perfiles(ssml, voz, {"web": "x.ogg", "telefonia": "x_8k.wav", "podcast": "x.mp3"})
+
+import io
+import logging
+import shutil
+import struct
+import subprocess
+import wave
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from metricas import incrementar, span
+from validacion import exigir_ssml_valido
+
+log = logging.getLogger(__name__)
+
+# bitrate (kbps) solo se aplica al derivar localmente: la API v1 no permite elegirlo
+Perfil = namedtuple("Perfil", "nombre encoding sample_rate bitrate")
+
+PERFILES = {
+    "mp3": Perfil("mp3", "MP3", None, None),
+    "podcast": Perfil("podcast", "MP3", 44100, 128),
+    "mp3-64k": Perfil("mp3-64k", "MP3", 24000, 64),
+    "web": Perfil("web", "OGG_OPUS", 48000, None),
+    "opus-24k": Perfil("opus-24k", "OGG_OPUS", 24000, None),
+    "wav": Perfil("wav", "LINEAR16", None, None),
+    "wav-16k": Perfil("wav-16k", "LINEAR16", 16000, None),
+    "wav-24k": Perfil("wav-24k", "LINEAR16", 24000, None),
+    "telefonia": Perfil("telefonia", "MULAW", 8000, None),
+    "telefonia-alaw": Perfil("telefonia-alaw", "ALAW", 8000, None),
+}
+PERFIL_POR_DEFECTO = "mp3"
+
+EXTENSIONES = {"MP3": ".mp3", "OGG_OPUS": ".ogg", "LINEAR16": ".wav", "MULAW": ".wav", "ALAW": ".wav"}
+
+# Códigos de formato del chunk fmt de WAV
+WAV_PCM, WAV_ALAW, WAV_MULAW = 1, 6, 7
+_FORMATO_WAV = {"LINEAR16": WAV_PCM, "ALAW": WAV_ALAW, "MULAW": WAV_MULAW}
+
+# Valores de AudioEncoding de la API (para respuestas con el enum como entero)
+ENCODINGS = {1: "LINEAR16", 2: "MP3", 3: "OGG_OPUS", 5: "MULAW", 6: "ALAW"}
+
+CONCURRENCIA = 4
+
+
+def obtener_perfil(perfil) -> Perfil:
+    """Nombre de perfil (o Perfil) -> Perfil. KeyError si no existe."""
+    if isinstance(perfil, Perfil):
+        return perfil
+    nombre = (perfil or PERFIL_POR_DEFECTO).lower()
+    if nombre not in PERFILES:
+        raise KeyError(f"Perfil de audio desconocido: {perfil!r} (opciones: {', '.join(PERFILES)})")
+    return PERFILES[nombre]
+
+
+def audio_config(perfil) -> Dict:
+    """
+    Configuración de audio que se pide a la API para el perfil (también es
+    parte de la clave de caché). El perfil mp3 da {"audio_encoding": "MP3"},
+    igual que antes, así la caché existente sigue valiendo.
+    """
+    p = obtener_perfil(perfil)
+    config = {"audio_encoding": p.encoding}
+    if p.sample_rate:
+        config["sample_rate_hertz"] = p.sample_rate
+    return config
+
+
+def nombre_encoding(encoding) -> str:
+    """AudioEncoding (enum, entero o texto) -> 'MP3', 'LINEAR16', ..."""
+    nombre = getattr(encoding, "name", None)
+    if nombre:
+        return nombre
+    if isinstance(encoding, int):
+        return ENCODINGS.get(encoding, str(encoding))
+    return str(encoding or "MP3").upper()
+
+
+def extension(audio_config: Optional[Dict]) -> str:
+    """Extensión del archivo para una configuración de audio: {"audio_encoding": "OGG_OPUS"} -> '.ogg'."""
+    return EXTENSIONES.get(nombre_encoding((audio_config or {}).get("audio_encoding")), ".audio")
+
+
+def rate_natural(voice_name: str) -> Optional[int]:
+    """Sample rate natural de la voz según el catálogo local (None si no hay catálogo)."""
+    from catalogo import CATALOGO_FILE, cargar_catalogo
+    if not CATALOGO_FILE.is_file():
+        return None
+    voz = cargar_catalogo(ttl=float("inf")).get(voice_name)
+    return (voz or {}).get("rate") or None
+
+
+# --- WAV -------------------------------------------------------------------
+
+def wav(datos: bytes, sample_rate: int, encoding: str = "LINEAR16") -> bytes:
+    """Envuelve muestras mono en un WAV (PCM 16 bits, o G.711 de 8 bits para MULAW/ALAW)."""
+    formato = _FORMATO_WAV[encoding]
+    bits = 16 if formato == WAV_PCM else 8
+    alineacion = bits // 8
+    if formato == WAV_PCM:
+        fmt = struct.pack("<HHIIHH", formato, 1, sample_rate, sample_rate * alineacion, alineacion, bits)
+        extra = b""
+    else:
+        # Formatos no PCM: fmt de 18 bytes y chunk fact con la cantidad de muestras
+        fmt = struct.pack("<HHIIHHH", formato, 1, sample_rate, sample_rate * alineacion, alineacion, bits, 0)
+        extra = b"fact" + struct.pack("<II", 4, len(datos))
+    cuerpo = (b"WAVE" + b"fmt " + struct.pack("<I", len(fmt)) + fmt + extra
+              + b"data" + struct.pack("<I", len(datos)) + datos)
+    return b"RIFF" + struct.pack("<I", len(cuerpo)) + cuerpo
+
+
+def leer_wav(data: bytes, sample_rate: Optional[int] = None) -> Tuple[bytes, int]:
+    """
+    (muestras PCM 16 bits mono, sample rate) de una respuesta LINEAR16. La API
+    devuelve LINEAR16 con cabecera WAV; sin cabecera hace falta `sample_rate`.
+    """
+    if data[:4] != b"RIFF":
+        if not sample_rate:
+            raise ValueError("LINEAR16 sin cabecera WAV: indicar sample_rate")
+        return data, sample_rate
+    with wave.open(io.BytesIO(data)) as w:
+        if w.getsampwidth() != 2 or w.getnchannels() != 1:
+            raise ValueError("Se esperaba LINEAR16 mono de 16 bits")
+        return w.readframes(w.getnframes()), w.getframerate()
+
+
+# --- transcodificación -----------------------------------------------------
+
+def remuestrear(pcm, de: int, a: int):
+    """Cambia el sample rate de un array int16 (filtro pasabajos antes de bajar la tasa)."""
+    import numpy as np
+    if de == a or len(pcm) == 0:
+        return pcm
+    x = pcm.astype(np.float64)
+    if a < de:
+        # Sinc con ventana de Hamming, corte en la nueva frecuencia de Nyquist
+        corte = a / de
+        n = np.arange(-32, 33)
+        kernel = corte * np.sinc(corte * n) * np.hamming(len(n))
+        x = np.convolve(x, kernel / kernel.sum(), mode="same")
+    t = np.arange(int(round(len(x) * a / de))) * (de / a)
+    y = np.interp(t, np.arange(len(x)), x)
+    return np.clip(np.round(y), -32768, 32767).astype(np.int16)
+
+
+# Fin de cada segmento de mu-law (14 bits) y A-law (13 bits), como en g711.c
+_SEGMENTOS_MULAW = (0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF)
+_SEGMENTOS_ALAW = (0x1F, 0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF)
+
+
+def a_mulaw(pcm):
+    """PCM int16 -> G.711 mu-law (uint8)."""
+    import numpy as np
+    x = pcm.astype(np.int32) >> 2
+    mascara = np.where(x < 0, 0x7F, 0xFF)
+    x = np.minimum(np.abs(x), 8159) + 0x21
+    segmento = np.searchsorted(np.array(_SEGMENTOS_MULAW), x)
+    valor = (np.minimum(segmento, 7) << 4) | ((x >> (np.minimum(segmento, 7) + 1)) & 0x0F)
+    valor = np.where(segmento >= 8, 0x7F, valor)
+    return ((valor ^ mascara) & 0xFF).astype(np.uint8)
+
+
+def a_alaw(pcm):
+    """PCM int16 -> G.711 A-law (uint8)."""
+    import numpy as np
+    x = pcm.astype(np.int32) >> 3
+    mascara = np.where(x >= 0, 0xD5, 0x55)
+    x = np.where(x >= 0, x, -x - 1)
+    segmento = np.searchsorted(np.array(_SEGMENTOS_ALAW), x)
+    desplazamiento = np.where(segmento < 2, 1, segmento)
+    valor = (np.minimum(segmento, 7) << 4) | ((x >> np.minimum(desplazamiento, 7)) & 0x0F)
+    valor = np.where(segmento >= 8, 0x7F, valor)
+    return ((valor ^ mascara) & 0xFF).astype(np.uint8)
+
+
+def hay_ffmpeg() -> bool:
+    return shutil.which("ffmpeg") is not None
+
+
+def _ffmpeg(pcm: bytes, de: int, p: Perfil) -> bytes:
+    args = ["ffmpeg", "-hide_banner", "-loglevel", "error",
+            "-f", "s16le", "-ar", str(de), "-ac", "1", "-i", "pipe:0"]
+    if p.sample_rate:
+        args += ["-ar", str(p.sample_rate)]
+    if p.encoding == "OGG_OPUS":
+        args += ["-c:a", "libopus", "-b:a", f"{p.bitrate or 32}k", "-f", "ogg"]
+    else:
+        args += ["-c:a", "libmp3lame", "-b:a", f"{p.bitrate or 32}k", "-f", "mp3"]
+    resultado = subprocess.run(args + ["pipe:1"], input=pcm, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, check=False)
+    if resultado.returncode != 0:
+        raise RuntimeError(f"ffmpeg falló: {resultado.stderr.decode('utf-8', 'replace').strip()}")
+    return resultado.stdout
+
+
+def puede_derivar(perfil) -> bool:
+    """True si el perfil se puede obtener localmente a partir de LINEAR16."""
+    p = obtener_perfil(perfil)
+    if p.encoding in _FORMATO_WAV:
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            return False
+        return True
+    return hay_ffmpeg()
+
+
+def transcodificar(linear16: bytes, perfil, sample_rate: Optional[int] = None) -> bytes:
+    """Convierte una respuesta LINEAR16 (WAV) al formato del perfil."""
+    p = obtener_perfil(perfil)
+    pcm, de = leer_wav(linear16, sample_rate)
+    with span("transcodificar", perfil=p.nombre):
+        if p.encoding not in _FORMATO_WAV:
+            return _ffmpeg(pcm, de, p)
+        import numpy as np
+        a = p.sample_rate or de
+        muestras = remuestrear(np.frombuffer(pcm, dtype="<i2"), de, a)
+        if p.encoding == "MULAW":
+            datos = a_mulaw(muestras).tobytes()
+        elif p.encoding == "ALAW":
+            datos = a_alaw(muestras).tobytes()
+        else:
+            datos = muestras.astype("<i2").tobytes()
+        return wav(datos, a, p.encoding)
+
+
+# --- síntesis en varios formatos ---------------------------------------------
+
+def _rate_base(derivados, natural: Optional[int]) -> Optional[int]:
+    """
+    Sample rate del LINEAR16 a pedir: el mayor que necesiten los perfiles
+    derivados (sin superar la tasa natural de la voz). None = tasa natural.
+    """
+    # OGG_OPUS/MP3 se remuestrean en ffmpeg: les basta la tasa natural
+    rates = [p.sample_rate if p.encoding in _FORMATO_WAV else None for p in derivados]
+    if any(r is None for r in rates):
+        return None
+    rate = max(rates)
+    return min(rate, natural) if natural else rate
+
+
+def sintetizar_perfiles(ssml_input: str, voice_name: str, salidas: Dict[str, str],
+                        client=None, cache=None, derivar: bool = True,
+                        concurrencia: int = CONCURRENCIA) -> Dict[str, str]:
+    """
+    Sintetiza el guion en cada perfil de `salidas` ({perfil: archivo}).
+
+    Con derivar=True, si dos o más perfiles se pueden obtener localmente (o
+    alguno pide un bitrate que la API no ofrece), se pide LINEAR16 una sola
+    vez y se transcodifica en un pool de hilos; el resto se pide a la API en su
+    formato. Devuelve {perfil: 'api' | 'derivado'}.
+    """
+    from sintetizador import MAX_INPUT_BYTES, preparar_sintesis, sintetizar_bytes
+
+    perfiles = {obtener_perfil(n).nombre: (obtener_perfil(n), ruta) for n, ruta in salidas.items()}
+    ssml_a_usar, voice_name_resolved, language_code, voice_meta = preparar_sintesis(ssml_input, voice_name)
+    exigir_ssml_valido(ssml_input, voice_meta, ssml_a_enviar=ssml_a_usar, permitir_largo=True)
+    if len(ssml_a_usar.encode("utf-8")) > MAX_INPUT_BYTES:
+        raise ValueError(f"sintetizar_perfiles admite guiones de hasta {MAX_INPUT_BYTES} bytes; "
+                         "usar sintetizar_audio por perfil para guiones largos")
+
+    derivables = {n: (p, r) for n, (p, r) in perfiles.items() if derivar and puede_derivar(p)}
+    if not (len(derivables) >= 2 or any(p.bitrate for p, _ in derivables.values())):
+        derivables = {}
+    for nombre, (p, _) in perfiles.items():
+        if p.bitrate and nombre not in derivables:
+            log.warning("Perfil %s: la API no permite elegir bitrate; se pide MP3 estándar (falta ffmpeg)", nombre)
+
+    def escribir(ruta: str, audio: bytes):
+        with span("escribir_archivo"), open(ruta, "wb") as out:
+            out.write(audio)
+
+    origen = {}
+    for nombre, (p, ruta) in perfiles.items():
+        if nombre in derivables:
+            continue
+        escribir(ruta, sintetizar_bytes(ssml_a_usar, voice_name_resolved, language_code,
+                                        client=client, cache=cache, audio_config=audio_config(p)))
+        origen[nombre] = "api"
+
+    if derivables:
+        base = {"audio_encoding": "LINEAR16"}
+        rate = _rate_base([p for p, _ in derivables.values()], rate_natural(voice_name_resolved))
+        if rate:
+            base["sample_rate_hertz"] = rate
+        linear16 = sintetizar_bytes(ssml_a_usar, voice_name_resolved, language_code,
+                                    client=client, cache=cache, audio_config=base)
+
+        def derivar_uno(item):
+            nombre, (p, ruta) = item
+            escribir(ruta, transcodificar(linear16, p, rate))
+            incrementar("perfiles_derivados", labels={"perfil": nombre})
+            return nombre
+
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrencia, len(derivables)))) as pool:
+            for nombre in pool.map(derivar_uno, derivables.items()):
+                origen[nombre] = "derivado"
+
+    log.info("Audio generado en %d formatos (%d llamadas a la API): %s", len(origen),
+             sum(1 for o in origen.values() if o == "api") + (1 if derivables else 0),
+             ", ".join(ruta for _, ruta in perfiles.values()))
+    return origen
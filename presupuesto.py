@@ -0,0 +1,396 @@
+# presupuesto.py
+# Libro de gastos del mes y tope de presupuesto para la síntesis.
+#
+# Lleva los caracteres facturados por tipo de voz (wavenet, neural, chirp3...)
+# y su costo en USD aplicando FREE_TIER_CHARS y price_per_million de
+# VOICE_INFO. Si un trabajo haría superar el tope, se degrada a un tipo más
+# barato (p. ej. Chirp -> WaveNet) o se rechaza con PresupuestoExcedido.
+#
+# Con tope y archivo, cada proceso toma del total compartido un cupo (una
+# parte del tope) bajo un bloqueo exclusivo del archivo (flock, como el
+# limitador de cuota.py) y descuenta las reservas de ese cupo en memoria:
+# solo vuelve al archivo cuando el cupo no alcanza. El archivo lleva lo
+# gastado y el cupo vigente de cada proceso, y la suma nunca pasa del tope.
+# El cupo de un proceso caído se da por gastado (no se sabe cuánto usó).
+# Lo gastado se suma al archivo cada INTERVALO_GUARDADO segundos y al salir,
+# cuando además se devuelve el cupo sin usar. Sin tope solo se lleva la
+# cuenta: cada reserva toma un lock para unas sumas.
+#
+# Activación: TTS_PRESUPUESTO_USD=50 (y opcional TTS_PRESUPUESTO_FILE), o
+# presupuesto.activar(50) / lote.py --presupuesto 50.
+
+import atexit
+import itertools
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from collections import namedtuple
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from cuota import bloquear_archivo, desbloquear_archivo
+from metricas import incrementar
+from voces import VOICE_INFO, resolve_voice
+
+log = logging.getLogger(__name__)
+
+PRESUPUESTO_FILE = os.environ.get("TTS_PRESUPUESTO_FILE", "presupuesto_mes.json")
+# Segundos entre escrituras del total en disco
+INTERVALO_GUARDADO = 5.0
+# Parte del tope que un proceso toma de una vez del total compartido
+CUPO_FRACCION = 0.02
+# Margen de redondeo al comparar sumas de USD con el tope
+EPSILON_USD = 1e-9
+
+# Tipo de voz -> tipo más barato al que se degrada si no alcanza el presupuesto
+DEGRADAR = {
+    "chirp3": "wavenet",
+    "studio": "neural",
+    "neural": "wavenet",
+}
+
+# Reserva hecha por reservar(): voz e idioma a usar y lo que se cargó al libro
+Reserva = namedtuple("Reserva", "voz idioma tipo caracteres usd")
+
+
+class PresupuestoExcedido(Exception):
+    """El trabajo superaría el tope del mes incluso con la voz más barata permitida."""
+
+
+def mes_actual() -> str:
+    return time.strftime("%Y-%m", time.gmtime())
+
+
+def _free_tiers_por_defecto() -> Dict[str, int]:
+    # Misma fuente que costs_models: FREE_TIER_CHARS de la configuración si existe
+    from configuracion import cargar_config
+    config = cargar_config()
+    if "FREE_TIER_CHARS" in config:
+        return config["FREE_TIER_CHARS"]
+    from costs_models import FREE_TIER_CHARS
+    return FREE_TIER_CHARS
+
+
+def _voz_de_tipo(tipo: str, idioma: str) -> Optional[Dict]:
+    """Primera voz de VOICE_INFO de ese tipo y mismo idioma."""
+    for meta in VOICE_INFO.values():
+        if (meta.get("type") or "").lower() == tipo and (meta.get("languageCode") or "es-US") == idioma:
+            return meta
+    return None
+
+
+class Presupuesto:
+    """
+    Libro de gastos mensual con tope opcional.
+
+        libro = Presupuesto(limite_usd=50)
+        reserva = libro.reservar("es-US-Chirp-HD-O", "es-US", len(ssml))
+        try:
+            ... sintetizar con reserva.voz ...
+        except Exception:
+            libro.devolver(reserva)
+            raise
+    """
+
+    def __init__(self, limite_usd: Optional[float] = None, path: Optional[str] = PRESUPUESTO_FILE,
+                 degradar: Optional[Dict[str, str]] = DEGRADAR, free_tiers: Optional[Dict[str, int]] = None,
+                 intervalo: float = INTERVALO_GUARDADO):
+        from costs_models import free_tier_for
+        self._free_tier_for = free_tier_for
+        self.limite_usd = limite_usd
+        self.path = Path(path) if path else None
+        self.degradar = degradar or {}
+        self.free_tiers = free_tiers if free_tiers is not None else _free_tiers_por_defecto()
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._lock_guardado = threading.Lock()
+        self.mes = mes_actual()
+        # base: totales del mes ya en disco (de todos los procesos); delta: de este proceso sin guardar
+        self._base: Dict[str, Dict[str, float]] = {}
+        self._delta: Dict[str, Dict[str, float]] = {}
+        # cupo: USD tomados del total compartido y aún sin gastar; ajeno: cupos
+        # de los demás procesos más lo perdido por procesos caídos
+        self._pid = os.getpid()
+        self._proceso = _id_proceso()
+        self._cupo = 0.0
+        self._ajeno = 0.0
+        self._ultimo_guardado = time.monotonic()
+        self._cargar()
+
+    # --- persistencia -----------------------------------------------------
+
+    def _leer_archivo(self, fh) -> Dict:
+        fh.seek(0)
+        try:
+            data = json.loads(fh.read() or "null") or {}
+        except ValueError:
+            data = {}
+        if data.get("mes") != self.mes:
+            data = {}
+        return {"tipos": data.get("tipos", {}), "cupos": data.get("cupos", {}),
+                "perdido_usd": data.get("perdido_usd", 0.0)}
+
+    def _cargar(self):
+        if self.path is None or not self.path.is_file():
+            return
+        with self.path.open("r", encoding="utf-8") as fh:
+            datos = self._leer_archivo(fh)
+        self._base = datos["tipos"]
+        self._ajeno = datos["perdido_usd"] + sum(datos["cupos"].values())
+
+    @staticmethod
+    def _acumular(tipos: Dict[str, Dict[str, float]], delta: Dict[str, Dict[str, float]]):
+        for tipo, d in delta.items():
+            t = tipos.setdefault(tipo, {"caracteres": 0, "usd": 0.0})
+            t["caracteres"] += d["caracteres"]
+            t["usd"] += d["usd"]
+
+    def _abrir(self):
+        # Lectura y escritura sin modo append (que ignora el seek(0) al escribir)
+        return open(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644), "r+", encoding="utf-8")
+
+    def _escribir_archivo(self, fh, datos: Dict):
+        # JSON de una línea (codificador en C) y truncar al final
+        fh.seek(0)
+        fh.write(json.dumps(dict(datos, mes=self.mes)) + "\n")
+        fh.truncate()
+        fh.flush()
+
+    def _sincronizar(self, fh, necesario: Optional[float] = None, liberar: bool = False):
+        # Con el archivo bloqueado y self._lock tomado: suma lo gastado por este
+        # proceso, relee lo de los demás y, con `necesario`, renueva el cupo
+        datos = self._leer_archivo(fh)
+        self._acumular(datos["tipos"], self._delta)
+        self._delta = {}
+        cupos = datos["cupos"]
+        # El cupo anterior vuelve al total antes de calcular lo disponible
+        cupos.pop(self._proceso, None)
+        for proceso in [p for p in cupos if _caido(p)]:
+            datos["perdido_usd"] += cupos.pop(proceso)
+        self._base = datos["tipos"]
+        self._ajeno = datos["perdido_usd"] + sum(cupos.values())
+        if necesario is not None and self.limite_usd is not None:
+            disponible = self.limite_usd - self._usd() - self._ajeno
+            self._cupo = max(0.0, min(disponible, max(necesario, self.limite_usd * CUPO_FRACCION)))
+        if liberar:
+            self._cupo = 0.0
+        if self._cupo > 0:
+            cupos[self._proceso] = self._cupo
+        self._escribir_archivo(fh, datos)
+
+    def guardar(self, liberar: bool = False):
+        """
+        Suma lo gastado por este proceso al total del archivo y relee lo de los
+        demás. Con liberar=True además devuelve el cupo sin usar (al salir).
+        """
+        if self.path is None:
+            return
+        with self._lock_guardado, self._abrir() as fh:
+            bloquear_archivo(fh)
+            try:
+                with self._lock:
+                    self._sincronizar(fh, liberar=liberar)
+            finally:
+                desbloquear_archivo(fh)
+        self._ultimo_guardado = time.monotonic()
+
+    def cerrar(self):
+        """Guarda y devuelve el cupo al total compartido."""
+        self.guardar(liberar=True)
+
+    def _quizas_guardar(self):
+        # Solo un hilo guarda; los demás siguen sin esperar
+        if time.monotonic() - self._ultimo_guardado < self.intervalo:
+            return
+        if self._lock_guardado.locked():
+            return
+        try:
+            self.guardar()
+        except OSError as e:
+            log.warning("No se pudo guardar el presupuesto en %s: %s", self.path, e)
+
+    # --- contabilidad -------------------------------------------------------
+
+    def _caracteres(self, tipo: str) -> float:
+        return self._base.get(tipo, {}).get("caracteres", 0) + self._delta.get(tipo, {}).get("caracteres", 0)
+
+    def _usd(self) -> float:
+        return sum(t["usd"] for t in self._base.values()) + sum(t["usd"] for t in self._delta.values())
+
+    def _marginal(self, tipo: str, precio: float, n: int) -> float:
+        free = self._free_tier_for(tipo, self.free_tiers)
+        usado = self._caracteres(tipo)
+        facturable = max(0, usado + n - free) - max(0, usado - free)
+        return facturable * precio / 1_000_000
+
+    def _sumar(self, tipo: str, n: float, usd: float):
+        d = self._delta.setdefault(tipo, {"caracteres": 0, "usd": 0.0})
+        d["caracteres"] += n
+        d["usd"] += usd
+
+    def _candidatas(self, voice_name: str, language_code: str) -> List[Dict]:
+        """La voz pedida y, en orden, las voces a las que se puede degradar."""
+        _, _, meta = resolve_voice(voice_name)
+        candidatas, vistos = [meta], {(meta.get("type") or "").lower()}
+        tipo = (meta.get("type") or "").lower()
+        while tipo in self.degradar:
+            tipo = self.degradar[tipo]
+            if tipo in vistos:
+                break
+            vistos.add(tipo)
+            alternativa = _voz_de_tipo(tipo, language_code)
+            if alternativa is not None:
+                candidatas.append(alternativa)
+        return candidatas
+
+    def _costo(self, meta: Dict, caracteres: int) -> float:
+        tipo = (meta.get("type") or "").lower()
+        return self._marginal(tipo, float(meta.get("price_per_million", 0.0)), caracteres)
+
+    def _elegir(self, candidatas: List[Dict], language_code: str, caracteres: int, con_cupo: bool = False):
+        # Con self._lock tomado: carga la primera candidata que entra en el tope
+        # (con_cupo: en el cupo de este proceso, que ya descuenta a los demás)
+        if mes_actual() != self.mes:
+            # Cambio de mes: el total arranca de cero y el cupo se pide de nuevo
+            self.mes, self._base, self._delta, self._cupo, self._ajeno = mes_actual(), {}, {}, 0.0, 0.0
+        gastado = self._usd()
+        for meta in candidatas:
+            usd = self._costo(meta, caracteres)
+            if con_cupo:
+                entra = usd <= self._cupo + EPSILON_USD
+            else:
+                entra = self.limite_usd is None or gastado + usd <= self.limite_usd + EPSILON_USD
+            if entra:
+                tipo = (meta.get("type") or "").lower()
+                self._sumar(tipo, caracteres, usd)
+                if con_cupo:
+                    self._cupo = max(0.0, self._cupo - usd)
+                return Reserva(meta["name"], meta.get("languageCode") or language_code, tipo, caracteres, usd), gastado
+        return None, gastado
+
+    def _despues_de_fork(self):
+        # Un proceso hijo no hereda el cupo ni lo gastado sin guardar del padre
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._proceso = _id_proceso()
+            self._cupo, self._delta = 0.0, {}
+
+    def _elegir_con_cupo(self, candidatas: List[Dict], language_code: str, caracteres: int):
+        # La voz pedida sale del cupo en memoria sin tocar el archivo. Si no
+        # entra, se renueva el cupo contra el total compartido y se elige de
+        # nuevo entre todas las candidatas (ahí puede degradarse)
+        with self._lock:
+            self._despues_de_fork()
+            reserva, gastado = self._elegir(candidatas[:1], language_code, caracteres, con_cupo=True)
+            if reserva is not None:
+                return reserva, gastado + self._ajeno
+        with self._lock_guardado, self._abrir() as fh:
+            bloquear_archivo(fh)
+            try:
+                with self._lock:
+                    self._sincronizar(fh, necesario=self._costo(candidatas[0], caracteres))
+                    reserva, gastado = self._elegir(candidatas, language_code, caracteres, con_cupo=True)
+            finally:
+                desbloquear_archivo(fh)
+        self._ultimo_guardado = time.monotonic()
+        return reserva, gastado + self._ajeno
+
+    def reservar(self, voice_name: str, language_code: str, caracteres: int) -> Reserva:
+        """
+        Carga `caracteres` al libro con la primera voz (la pedida o una degradada)
+        que entra en el tope. Lanza PresupuestoExcedido si ninguna entra.
+        """
+        candidatas = self._candidatas(voice_name, language_code)
+        compartido = self.limite_usd is not None and self.path is not None
+        if compartido:
+            try:
+                reserva, gastado = self._elegir_con_cupo(candidatas, language_code, caracteres)
+            except OSError as e:
+                # Sin archivo se sigue con el total en memoria (puede quedar desfasado)
+                log.warning("No se pudo usar el presupuesto compartido %s: %s", self.path, e)
+                compartido = False
+        if not compartido:
+            with self._lock:
+                reserva, gastado = self._elegir(candidatas, language_code, caracteres)
+
+        if reserva is None:
+            incrementar("rechazos_presupuesto")
+            raise PresupuestoExcedido(
+                f"El trabajo ({caracteres:,} caracteres, voz {voice_name}) supera el presupuesto de "
+                f"{self.limite_usd:.2f} USD del mes {self.mes} (gastado: {gastado:.4f} USD)."
+            )
+        if reserva.voz != candidatas[0]["name"]:
+            incrementar("degradaciones", labels={"de": candidatas[0].get("type"), "a": reserva.tipo})
+            log.warning("Presupuesto: %s degradada a %s", candidatas[0]["name"], reserva.voz)
+        self._quizas_guardar()
+        return reserva
+
+    def devolver(self, reserva: Reserva):
+        """Anula una reserva (la llamada falló o el audio salió de la caché)."""
+        with self._lock:
+            self._sumar(reserva.tipo, -reserva.caracteres, -reserva.usd)
+            if self.limite_usd is not None and self.path is not None:
+                self._cupo += reserva.usd
+
+    def resumen(self) -> Dict:
+        with self._lock:
+            tipos = {}
+            for origen in (self._base, self._delta):
+                for tipo, d in origen.items():
+                    t = tipos.setdefault(tipo, {"caracteres": 0, "usd": 0.0})
+                    t["caracteres"] += d["caracteres"]
+                    t["usd"] += d["usd"]
+            return {"mes": self.mes, "limite_usd": self.limite_usd, "usd": round(self._usd(), 6), "tipos": tipos}
+
+
+_instancias = itertools.count()
+
+
+def _id_proceso() -> str:
+    # host:pid:n (n distingue varios libros del mismo proceso)
+    return f"{socket.gethostname()}:{os.getpid()}:{next(_instancias)}"
+
+
+def _caido(proceso: str) -> bool:
+    """True si el dueño ("host:pid:n") de un cupo es de esta máquina y ya no existe."""
+    from cola import proceso_vivo
+    host, pid = (proceso.rsplit(":", 2) + ["", ""])[:2]
+    return host == socket.gethostname() and pid.isdigit() and not proceso_vivo(int(pid))
+
+
+# Libro activo del proceso (None = sin control de presupuesto)
+_actual: Optional[Presupuesto] = None
+_al_salir_registrado = False
+
+
+def _cerrar_actual():
+    if _actual is not None:
+        try:
+            _actual.cerrar()
+        except OSError as e:
+            log.warning("No se pudo guardar el presupuesto en %s: %s", _actual.path, e)
+
+
+def activar(limite_usd: Optional[float], path: Optional[str] = PRESUPUESTO_FILE,
+            degradar: Optional[Dict[str, str]] = DEGRADAR) -> Presupuesto:
+    """Activa el libro de gastos para todas las síntesis de este proceso."""
+    global _actual, _al_salir_registrado
+    # El libro anterior guarda lo gastado y devuelve su cupo antes de reemplazarlo
+    _cerrar_actual()
+    _actual = Presupuesto(limite_usd, path, degradar)
+    if not _al_salir_registrado:
+        atexit.register(_cerrar_actual)
+        _al_salir_registrado = True
+    return _actual
+
+
+def actual() -> Optional[Presupuesto]:
+    return _actual
+
+
+if os.environ.get("TTS_PRESUPUESTO_USD"):
+    activar(float(os.environ["TTS_PRESUPUESTO_USD"]),
+            degradar=None if os.environ.get("TTS_PRESUPUESTO_SIN_DEGRADAR") else DEGRADAR)
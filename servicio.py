@@ -0,0 +1,624 @@
+#!/usr/bin/env python3
+# servicio.py
+# Microservicio HTTP de síntesis (asyncio, solo biblioteca estándar).
+#
+#   POST /v1/sintetizar   {"ssml", "voice", "perfil"?} -> audio (también GET con query string)
+#   GET  /v1/audio/CLAVE  audio ya sintetizado, desde la caché
+#   GET  /v1/voces        ?idioma=es-US&familia=chirp3&genero=FEMALE
+#   POST /v1/costos       {"ssml", "voces"?} -> estimación por voz (costs_models)
+#   GET  /salud
+#
+# Las síntesis que llegan dentro de una ventana corta (--ventana) se juntan en
+# un micro-lote: las idénticas se sintetizan una sola vez, la caché se consulta
+# una vez por lote y el resto sale en paralelo por un pool de clientes
+# (clientes.get_pool). La ETag de cada audio es su clave de caché, así que un
+# If-None-Match que coincide se responde con 304 sin tocar la API. El audio se
+# envía por bloques; los guiones de más de 5000 bytes se envían con chunked a
+# medida que se sintetiza cada fragmento (streaming.py).
+#
+# Uso:
+#   python servicio.py --puerto 8080
+#   python servicio.py --fake --fake-latencia 0.05      # contra el backend falso (fake_tts.py)
+#   curl -s localhost:8080/v1/sintetizar -d '{"ssml": "<speak>Hola</speak>", "voice": "es-US-Wavenet-A"}' > hola.mp3
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from cache_audio import AudioCache, cache_key
+from clientes import get_pool
+from cuota import es_reintentable
+from metricas import METRICAS, incrementar
+from perfiles import audio_config
+import presupuesto
+from sintetizador import AUDIO_CONFIG, MAX_INPUT_BYTES, preparar_sintesis, sintetizar_con_clave
+from validacion import exigir_ssml_valido
+from voces import VOICE_INFO, resolve_voice
+
+log = logging.getLogger(__name__)
+
+PUERTO = 8080
+# Tiempo que se espera a que lleguen más peticiones antes de despachar un lote (segundos)
+VENTANA = 0.005
+# Peticiones por lote: al llegar a este número se despacha sin esperar la ventana
+LOTE_MAX = 64
+# Hilos que hacen E/S de caché y llamadas a la API
+HILOS = 32
+# Clientes (canales gRPC) del pool
+POOL = 4
+# Bytes por escritura al enviar audio
+BLOQUE = 64 * 1024
+# Tamaño máximo del cuerpo de una petición
+MAX_CUERPO = 1024 * 1024
+# Los audios no cambian para una misma clave
+CACHE_CONTROL = "public, max-age=86400"
+# Clave de caché aceptada en /v1/audio: sha256 y extensión ('<hex>.ogg'), sin rutas
+CLAVE_AUDIO = re.compile(r"[0-9A-Za-z]+(\.[0-9a-z]+)?")
+
+RAZONES = {200: "OK", 304: "Not Modified", 400: "Bad Request", 402: "Payment Required", 404: "Not Found",
+           405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error",
+           502: "Bad Gateway", 503: "Service Unavailable"}
+
+# Síntesis ya preparada (voz resuelta, SSML sanitizado) y su clave de caché
+Peticion = namedtuple("Peticion", "ssml voz idioma audio_config clave")
+
+
+class ErrorHTTP(Exception):
+    def __init__(self, status: int, mensaje: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(mensaje)
+        self.status = status
+        self.headers = headers or {}
+
+
+def error_http(e: BaseException) -> ErrorHTTP:
+    """Traduce un error de síntesis a la respuesta HTTP que corresponde."""
+    if isinstance(e, ErrorHTTP):
+        return e
+    if isinstance(e, presupuesto.PresupuestoExcedido):
+        return ErrorHTTP(402, str(e))
+    if isinstance(e, KeyError):
+        return ErrorHTTP(400, str(e.args[0]) if e.args else "voz desconocida")
+    if isinstance(e, ValueError):
+        return ErrorHTTP(400, str(e))
+    if es_reintentable(e):
+        return ErrorHTTP(503, f"API no disponible: {e!r}", {"Retry-After": "1"})
+    return ErrorHTTP(502, f"Error de la API: {e!r}")
+
+
+def tipo_de_audio(inicio: bytes) -> str:
+    """Content-Type según los primeros bytes del audio."""
+    if inicio.startswith(b"RIFF"):
+        return "audio/wav"
+    if inicio.startswith(b"OggS"):
+        return "audio/ogg"
+    return "audio/mpeg"
+
+
+def coincide_etag(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    etiquetas = [e.strip() for e in if_none_match.split(",")]
+    return "*" in etiquetas or etag in etiquetas or f"W/{etag}" in etiquetas
+
+
+def _cabeceras_audio(clave: str) -> Dict[str, str]:
+    """ETag y ubicación de un audio según su clave de caché."""
+    return {"ETag": f'"{clave}"', "Cache-Control": CACHE_CONTROL, "Content-Location": f"/v1/audio/{clave}"}
+
+
+def _trasladar(origen: asyncio.Future, destino: asyncio.Future):
+    if destino.done():
+        return
+    if origen.cancelled():
+        destino.cancel()
+    elif origen.exception() is not None:
+        destino.set_exception(origen.exception())
+    else:
+        destino.set_result(origen.result())
+
+
+class MicroLotes:
+    """
+    Junta las peticiones que llegan dentro de `ventana` segundos (o hasta
+    `maximo`) y las entrega juntas a `despachar(lote)`, con lote = {clave:
+    (Peticion, future)}. Las peticiones con la misma clave comparten future.
+    """
+
+    def __init__(self, despachar, ventana: float = VENTANA, maximo: int = LOTE_MAX):
+        self._despachar = despachar
+        self.ventana = ventana
+        self.maximo = maximo
+        self._pendientes: Dict[str, Tuple[Peticion, asyncio.Future]] = {}
+        self._temporizador = None
+
+    def pedir(self, peticion: Peticion) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        entrada = self._pendientes.get(peticion.clave)
+        if entrada is not None:
+            incrementar("http_peticiones_unidas")
+            return entrada[1]
+        futuro = loop.create_future()
+        self._pendientes[peticion.clave] = (peticion, futuro)
+        if len(self._pendientes) >= self.maximo:
+            self._vaciar()
+        elif self._temporizador is None:
+            self._temporizador = loop.call_later(self.ventana, self._vaciar)
+        return futuro
+
+    def _vaciar(self):
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+        lote, self._pendientes = self._pendientes, {}
+        if lote:
+            asyncio.ensure_future(self._despachar(lote))
+
+
+class Servicio:
+    """
+    Servidor HTTP de síntesis. Con `client` se usa ese cliente para todo (por
+    ejemplo fake_tts.FakeTTSClient); si no, un pool de `pool` clientes.
+
+        servicio = Servicio(cache=AudioCache())
+        asyncio.run(servicio.servir("127.0.0.1", 8080))
+    """
+
+    def __init__(self, client=None, cache: Optional[AudioCache] = None, ventana: float = VENTANA,
+                 lote_max: int = LOTE_MAX, hilos: int = HILOS, pool: int = POOL):
+        self.client = client
+        self.cache = cache
+        self.pool_size = pool
+        self.lotes = MicroLotes(self._despachar, ventana, lote_max)
+        self._hilos = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="servicio")
+        self._pool = None
+        self._catalogo = None
+        # Síntesis despachadas que aún no terminaron, por clave
+        self._en_vuelo: Dict[str, asyncio.Future] = {}
+        self.estadisticas = {"peticiones": 0, "lotes": 0, "sintetizadas": 0, "desde_cache": 0, "no_modificado": 0}
+
+    # --- síntesis (hilos) ---
+
+    def _con_cliente(self, fn):
+        if self.client is not None:
+            return fn(self.client)
+        if self._pool is None:
+            self._pool = get_pool(self.pool_size)
+        with self._pool.cliente() as client:
+            return fn(client)
+
+    def _sintetizar(self, p: Peticion) -> Tuple[bytes, str]:
+        # (audio, clave efectiva): otra clave si el presupuesto degradó la voz
+        return self._con_cliente(lambda client: sintetizar_con_clave(
+            p.ssml, p.voz, p.idioma, client=client, cache=self.cache, audio_config=p.audio_config))
+
+    def _buscar_en_cache(self, claves) -> Dict[str, str]:
+        encontradas = {}
+        for clave in claves:
+            ruta = self.cache.ruta(clave, contar_hit=True)
+            if ruta is not None:
+                encontradas[clave] = str(ruta)
+        return encontradas
+
+    async def _despachar(self, lote: Dict[str, Tuple[Peticion, asyncio.Future]]):
+        """
+        Una consulta a la caché por lote; lo que falta se sintetiza en paralelo.
+        Cada future recibe (audio o ruta en la caché, clave efectiva del audio).
+        """
+        loop = asyncio.get_running_loop()
+        self.estadisticas["lotes"] += 1
+        incrementar("http_lotes")
+        incrementar("http_lote_peticiones", len(lote))
+        en_cache = {}
+        if self.cache is not None:
+            try:
+                en_cache = await loop.run_in_executor(self._hilos, self._buscar_en_cache, list(lote))
+            except Exception as e:
+                log.warning("Error consultando la caché: %r", e)
+        for clave, (peticion, futuro) in lote.items():
+            if clave in en_cache:
+                self.estadisticas["desde_cache"] += 1
+                if not futuro.done():
+                    futuro.set_result((en_cache[clave], clave))
+                continue
+            self.estadisticas["sintetizadas"] += 1
+            self._en_vuelo[clave] = futuro
+            futuro.add_done_callback(lambda f, k=clave: self._en_vuelo.pop(k, None))
+            tarea = loop.run_in_executor(self._hilos, self._sintetizar, peticion)
+            tarea.add_done_callback(lambda t, f=futuro: _trasladar(t, f))
+
+    # --- HTTP ---
+
+    async def _escribir_cabecera(self, writer, status: int, headers: Dict[str, str], mantener: bool):
+        lineas = [f"HTTP/1.1 {status} {RAZONES.get(status, '')}"]
+        headers = dict(headers)
+        headers["Connection"] = "keep-alive" if mantener else "close"
+        lineas += [f"{k}: {v}" for k, v in headers.items()]
+        writer.write(("\r\n".join(lineas) + "\r\n\r\n").encode("latin-1"))
+
+    async def _json(self, writer, status: int, datos, mantener: bool, headers: Optional[Dict[str, str]] = None):
+        cuerpo = json.dumps(datos, ensure_ascii=False).encode("utf-8")
+        await self._escribir_cabecera(writer, status, {"Content-Type": "application/json; charset=utf-8",
+                                                       "Content-Length": str(len(cuerpo)), **(headers or {})},
+                                      mantener)
+        writer.write(cuerpo)
+        await writer.drain()
+
+    async def _vacio(self, writer, status: int, headers: Dict[str, str], mantener: bool):
+        await self._escribir_cabecera(writer, status, {"Content-Length": "0", **headers}, mantener)
+        await writer.drain()
+
+    async def _enviar_audio(self, writer, audio, headers: Dict[str, str], mantener: bool, cabeza: bool = False):
+        """Envía `audio` (bytes o ruta de la caché) por bloques, respetando el ritmo del cliente."""
+        loop = asyncio.get_running_loop()
+        if isinstance(audio, (bytes, bytearray)):
+            primero = bytes(audio[:16])
+            total = len(audio)
+        else:
+            fh = await loop.run_in_executor(self._hilos, open, audio, "rb")
+            primero = await loop.run_in_executor(self._hilos, fh.read, BLOQUE)
+            total = os.fstat(fh.fileno()).st_size
+        try:
+            await self._escribir_cabecera(writer, 200, {"Content-Type": tipo_de_audio(primero),
+                                                        "Content-Length": str(total), **headers}, mantener)
+            if cabeza:
+                await writer.drain()
+                return
+            if isinstance(audio, (bytes, bytearray)):
+                vista = memoryview(audio)
+                for i in range(0, total, BLOQUE):
+                    writer.write(vista[i:i + BLOQUE])
+                    await writer.drain()
+                return
+            bloque = primero
+            while bloque:
+                writer.write(bloque)
+                await writer.drain()
+                bloque = await loop.run_in_executor(self._hilos, fh.read, BLOQUE)
+        finally:
+            if not isinstance(audio, (bytes, bytearray)):
+                fh.close()
+
+    async def _enviar_stream(self, writer, ssml_input: str, voz: str, mantener: bool):
+        """Guion largo: chunked, un fragmento MP3 por vez a medida que se sintetiza."""
+        from streaming import sintetizar_stream
+        loop = asyncio.get_running_loop()
+        cola: asyncio.Queue = asyncio.Queue(maxsize=2)
+        fin = object()
+        cancelado = threading.Event()
+
+        def poner(x):
+            asyncio.run_coroutine_threadsafe(cola.put(x), loop).result()
+
+        def generar(client):
+            for parte in sintetizar_stream(ssml_input, voz, client=client, cache=self.cache):
+                if cancelado.is_set():
+                    return
+                poner(parte)
+
+        def producir():
+            try:
+                self._con_cliente(generar)
+                poner(fin)
+            except BaseException as e:
+                poner(e)
+
+        productor = loop.run_in_executor(self._hilos, producir)
+        try:
+            primero = await cola.get()
+            if isinstance(primero, BaseException):
+                raise error_http(primero)
+            await self._escribir_cabecera(writer, 200, {"Content-Type": "audio/mpeg",
+                                                        "Transfer-Encoding": "chunked"}, mantener)
+            parte = primero
+            while parte is not fin:
+                if isinstance(parte, BaseException):
+                    # Ya se enviaron cabeceras: se corta la conexión sin el chunk final
+                    log.warning("Error a mitad del stream: %r", parte)
+                    writer.close()
+                    return
+                if parte:
+                    writer.write(f"{len(parte):x}\r\n".encode("ascii") + parte + b"\r\n")
+                    await writer.drain()
+                parte = await cola.get()
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        finally:
+            cancelado.set()
+            # Desbloquear al productor si quedó esperando lugar en la cola
+            while not productor.done():
+                try:
+                    cola.get_nowait()
+                except asyncio.QueueEmpty:
+                    await asyncio.sleep(0.01)
+
+    async def _sintetizar_http(self, datos: Dict, headers: Dict[str, str], writer, mantener: bool,
+                               cabeza: bool = False):
+        ssml, voz = datos.get("ssml"), datos.get("voice") or datos.get("voz")
+        if not ssml or not voz:
+            raise ErrorHTTP(400, "faltan campos: ssml, voice")
+        perfil = datos.get("perfil")
+        try:
+            config = audio_config(perfil)
+            ssml_a_usar, nombre, idioma, meta = preparar_sintesis(ssml, voz)
+            # SSML que la API rechazaría: 400 sin pasar por el lote ni gastar cuota
+            exigir_ssml_valido(ssml, meta, ssml_a_enviar=ssml_a_usar, permitir_largo=True)
+        except Exception as e:
+            raise error_http(e) from e
+
+        if len(ssml_a_usar.encode("utf-8")) > MAX_INPUT_BYTES:
+            if config != AUDIO_CONFIG:
+                raise ErrorHTTP(400, f"Los guiones de más de {MAX_INPUT_BYTES} bytes solo admiten el perfil mp3")
+            return await self._enviar_stream(writer, ssml, voz, mantener)
+
+        clave = cache_key(ssml_a_usar, nombre, idioma, config)
+        if coincide_etag(headers.get("if-none-match"), f'"{clave}"'):
+            self.estadisticas["no_modificado"] += 1
+            return await self._vacio(writer, 304, _cabeceras_audio(clave), mantener)
+        peticion = Peticion(ssml_a_usar, nombre, idioma, config, clave)
+        try:
+            # Si la misma síntesis ya salió en un lote anterior, se espera esa. El
+            # future es compartido: shield evita que cancelar esta conexión lo
+            # cancele para las demás que esperan la misma clave
+            futuro = self._en_vuelo.get(clave) or self.lotes.pedir(peticion)
+            audio, efectiva = await asyncio.shield(futuro)
+        except Exception as e:
+            raise error_http(e) from e
+        # Las cabeceras van con la clave con la que quedó el audio: si el
+        # presupuesto degradó la voz, es la de la voz usada, no la pedida
+        cabeceras = _cabeceras_audio(efectiva)
+        if efectiva != clave and coincide_etag(headers.get("if-none-match"), f'"{efectiva}"'):
+            self.estadisticas["no_modificado"] += 1
+            return await self._vacio(writer, 304, cabeceras, mantener)
+        try:
+            await self._enviar_audio(writer, audio, cabeceras, mantener, cabeza)
+        except FileNotFoundError:
+            # La entrada se desalojó de la caché entre la consulta y la lectura
+            audio, efectiva = await asyncio.get_running_loop().run_in_executor(self._hilos, self._sintetizar, peticion)
+            await self._enviar_audio(writer, audio, _cabeceras_audio(efectiva), mantener, cabeza)
+
+    async def _audio_http(self, clave: str, headers: Dict[str, str], writer, mantener: bool, cabeza: bool):
+        etag = f'"{clave}"'
+        ruta = None
+        if self.cache is not None and CLAVE_AUDIO.fullmatch(clave):
+            ruta = await asyncio.get_running_loop().run_in_executor(self._hilos, self.cache.ruta, clave, True)
+        if ruta is None:
+            raise ErrorHTTP(404, "audio no encontrado en la caché")
+        cabeceras = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+        if coincide_etag(headers.get("if-none-match"), etag):
+            self.estadisticas["no_modificado"] += 1
+            return await self._vacio(writer, 304, cabeceras, mantener)
+        await self._enviar_audio(writer, str(ruta), cabeceras, mantener, cabeza)
+
+    async def _voces_http(self, query: Dict[str, str]) -> Dict:
+        idioma, familia, genero = query.get("idioma"), query.get("familia"), query.get("genero")
+
+        def buscar():
+            try:
+                if self._catalogo is None:
+                    from catalogo import cargar_catalogo
+                    self._catalogo = self._con_cliente(lambda client: cargar_catalogo(client=client))
+                catalogo = self._catalogo
+            except Exception as e:
+                # Sin catálogo (ni red): las voces configuradas en VOICE_INFO
+                log.warning("Catálogo no disponible (%r); se listan las voces de VOICE_INFO", e)
+                voces = [{"name": m["name"], "languages": [m.get("languageCode", "es-US")], "type": m.get("type")}
+                         for m in VOICE_INFO.values()
+                         if not idioma or m.get("languageCode", "").lower() == idioma.lower()]
+                return {"origen": "VOICE_INFO", "voces": voces}
+            return {"origen": "catalogo", "voces": catalogo.buscar(idioma, genero, familia)}
+
+        return await asyncio.get_running_loop().run_in_executor(self._hilos, buscar)
+
+    def _costos(self, datos: Dict) -> Dict:
+        # Corre en self._hilos: cargar_config puede leer disco la primera vez
+        from configuracion import cargar_config
+        from costs_models import FREE_TIER_CHARS, count_chars, estimate_cost, free_tier_for
+        ssml = datos.get("ssml")
+        if not ssml:
+            raise ErrorHTTP(400, "falta el campo ssml")
+        voces = datos.get("voces") or ([datos["voice"]] if datos.get("voice") else list(VOICE_INFO))
+        free_tiers = cargar_config().get("FREE_TIER_CHARS", FREE_TIER_CHARS)
+        caracteres, texto = count_chars(ssml)
+        resultado = {"caracteres": caracteres, "caracteres_texto": texto, "voces": {}}
+        for clave in voces:
+            try:
+                nombre, _, meta = resolve_voice(clave)
+            except KeyError as e:
+                raise error_http(e) from e
+            tipo = meta.get("type", "Unknown")
+            resultado["voces"][nombre] = estimate_cost(caracteres, tipo, float(meta.get("price_per_million", 0.0)),
+                                                       free_tier_for(tipo, free_tiers))
+        return resultado
+
+    async def _rutear(self, metodo: str, url: str, headers: Dict[str, str], cuerpo: bytes,
+                      writer, mantener: bool):
+        partes = urlsplit(url)
+        ruta = partes.path.rstrip("/") or "/"
+        query = {k: v[-1] for k, v in parse_qs(partes.query).items()}
+        cabeza = metodo == "HEAD"
+
+        def datos_json() -> Dict:
+            try:
+                datos = json.loads(cuerpo or b"{}")
+            except ValueError:
+                raise ErrorHTTP(400, "JSON inválido") from None
+            if not isinstance(datos, dict):
+                raise ErrorHTTP(400, "se esperaba un objeto JSON")
+            return datos
+
+        if ruta == "/v1/sintetizar":
+            if metodo == "POST":
+                return await self._sintetizar_http(datos_json(), headers, writer, mantener)
+            if metodo in ("GET", "HEAD"):
+                return await self._sintetizar_http(query, headers, writer, mantener, cabeza)
+        elif ruta.startswith("/v1/audio/"):
+            if metodo in ("GET", "HEAD"):
+                return await self._audio_http(unquote(ruta[len("/v1/audio/"):]), headers, writer, mantener, cabeza)
+        elif ruta == "/v1/voces":
+            if metodo == "GET":
+                return await self._json(writer, 200, await self._voces_http(query), mantener)
+        elif ruta == "/v1/costos":
+            if metodo == "POST":
+                costos = await asyncio.get_running_loop().run_in_executor(self._hilos, self._costos, datos_json())
+                return await self._json(writer, 200, costos, mantener)
+        elif ruta == "/salud":
+            if metodo == "GET":
+                return await self._json(writer, 200, {"estado": "ok", **self.estadisticas}, mantener)
+        else:
+            raise ErrorHTTP(404, "ruta desconocida")
+        raise ErrorHTTP(405, f"método {metodo} no admitido en {ruta}")
+
+    async def atender(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Atiende una conexión (HTTP/1.1 con keep-alive) hasta que el cliente la cierra."""
+        try:
+            while True:
+                try:
+                    cabecera = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                lineas = cabecera.decode("latin-1").split("\r\n")
+                try:
+                    metodo, url, version = lineas[0].split(" ", 2)
+                except ValueError:
+                    await self._json(writer, 400, {"error": "línea de petición inválida"}, False)
+                    break
+                headers = {}
+                for linea in lineas[1:]:
+                    if ":" in linea:
+                        k, v = linea.split(":", 1)
+                        headers[k.strip().lower()] = v.strip()
+                mantener = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                largo = int(headers.get("content-length") or 0)
+                if largo > MAX_CUERPO:
+                    await self._json(writer, 413, {"error": f"cuerpo de más de {MAX_CUERPO} bytes"}, False)
+                    break
+                try:
+                    cuerpo = await reader.readexactly(largo) if largo else b""
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+
+                self.estadisticas["peticiones"] += 1
+                incrementar("http_peticiones")
+                inicio = time.perf_counter()
+                try:
+                    await self._rutear(metodo.upper(), url, headers, cuerpo, writer, mantener)
+                except ErrorHTTP as e:
+                    await self._json(writer, e.status, {"error": str(e)}, mantener, e.headers)
+                except (ConnectionError, asyncio.CancelledError):
+                    raise
+                except Exception as e:
+                    log.exception("Error atendiendo %s %s", metodo, url)
+                    await self._json(writer, 500, {"error": repr(e)}, False)
+                    break
+                finally:
+                    METRICAS.observar("http", time.perf_counter() - inicio, {"metodo": metodo.upper()})
+                    log.debug("%s %s %.1f ms", metodo, url, (time.perf_counter() - inicio) * 1000)
+                if not mantener or writer.is_closing():
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            # Cliente desconectado o servicio cerrándose: la conexión termina sin error
+            pass
+        finally:
+            writer.close()
+
+    async def iniciar(self, host: str = "127.0.0.1", puerto: int = PUERTO) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self.atender, host, puerto, limit=MAX_CUERPO)
+
+    async def servir(self, host: str = "127.0.0.1", puerto: int = PUERTO):
+        servidor = await self.iniciar(host, puerto)
+        host, puerto = servidor.sockets[0].getsockname()[:2]
+        log.info("Servicio TTS escuchando en http://%s:%s", host, puerto)
+        async with servidor:
+            await servidor.serve_forever()
+
+    def cerrar(self):
+        self._hilos.shutdown(wait=False)
+
+
+class _ServicioEnHilo:
+    def __init__(self, loop: asyncio.AbstractEventLoop, servidor: asyncio.AbstractServer, servicio: Servicio):
+        self.loop = loop
+        self.servidor = servidor
+        self.servicio = servicio
+
+    def shutdown(self):
+        async def cerrar():
+            self.servidor.close()
+            # Conexiones keep-alive que siguen abiertas
+            tareas = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for t in tareas:
+                t.cancel()
+            await asyncio.gather(*tareas, return_exceptions=True)
+            await self.servidor.wait_closed()
+        asyncio.run_coroutine_threadsafe(cerrar(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.servicio.cerrar()
+
+
+def iniciar_en_hilo(servicio: Servicio, host: str = "127.0.0.1", puerto: int = 0) -> Tuple[_ServicioEnHilo, str]:
+    """
+    Levanta el servicio en un event loop propio en un hilo daemon (para tests y
+    benchmarks). Con puerto=0 se elige uno libre. Devuelve (servidor, endpoint);
+    detenerlo con servidor.shutdown().
+    """
+    loop = asyncio.new_event_loop()
+    listo = threading.Event()
+    estado = {}
+
+    def correr():
+        asyncio.set_event_loop(loop)
+        estado["servidor"] = loop.run_until_complete(servicio.iniciar(host, puerto))
+        listo.set()
+        loop.run_forever()
+
+    threading.Thread(target=correr, name="servicio-tts", daemon=True).start()
+    listo.wait()
+    servidor = estado["servidor"]
+    host, puerto = servidor.sockets[0].getsockname()[:2]
+    return _ServicioEnHilo(loop, servidor, servicio), f"http://{host}:{puerto}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microservicio HTTP de síntesis con micro-lotes, ETags y streaming.")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--puerto', '-p', type=int, default=PUERTO)
+    parser.add_argument('--ventana', type=float, default=VENTANA * 1000, help='Ventana de micro-lote en milisegundos.')
+    parser.add_argument('--lote-max', type=int, default=LOTE_MAX, help='Peticiones por lote como máximo.')
+    parser.add_argument('--hilos', type=int, default=HILOS, help='Hilos para caché y llamadas a la API.')
+    parser.add_argument('--pool', type=int, default=POOL, help='Clientes (canales gRPC) del pool.')
+    parser.add_argument('--sin-cache', action='store_true', help='No usar la caché de audio (sin /v1/audio).')
+    parser.add_argument('--fake', action='store_true', help='Usar el backend falso de fake_tts.py (sin credenciales).')
+    parser.add_argument('--fake-latencia', type=float, default=0.05, help='Con --fake, latencia por llamada (segundos).')
+    parser.add_argument('--metricas-puerto', type=int, help='Exponer /metrics (formato Prometheus) en este puerto.')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Registrar cada petición.')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format="%(message)s")
+    if args.metricas_puerto:
+        import metricas
+        metricas.servir(args.metricas_puerto)
+    client = None
+    if args.fake:
+        from fake_tts import FakeConfig, FakeTTSClient
+        client = FakeTTSClient(FakeConfig(latencia=args.fake_latencia))
+    servicio = Servicio(client=client, cache=None if args.sin_cache else AudioCache(),
+                        ventana=args.ventana / 1000, lote_max=args.lote_max, hilos=args.hilos, pool=args.pool)
+    try:
+        asyncio.run(servicio.servir(args.host, args.puerto))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servicio.cerrar()
+
+
+if __name__ == "__main__":
+    main()
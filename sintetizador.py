@@ -1,59 +1,227 @@
 #!/usr/bin/env python3
 # sintetizador.py
 
-from google.cloud import texttospeech
-from voces import sanitize_ssml_for_chirp, resolve_voice
-
-# Importar variables de configuración
-try:
-    from voice_input import SSML, VOICE
-except ImportError:
-    print("No se pudo importar voice_input.py. Usando valores por defecto.")
-    SSML = "<speak>Hola mundo</speak>"
-    VOICE = "es-US-Wavenet-A"
-
-def sintetizar_audio(ssml_input: str, voice_name: str, output_file: str = "output.mp3"):
+import logging
+from typing import Optional
+
+from configuracion import cargar_config
+from voces import es_chirp, sanitize_ssml_for_chirp, resolve_voice
+from cache_audio import AudioCache, cache_key
+from clientes import get_client
+from coalescer import Coalescer
+from cuota import LIMITADOR, RateLimiter, con_reintentos
+from metricas import incrementar, span
+from perfiles import audio_config as config_de_perfil
+import presupuesto
+from validacion import exigir_ssml_valido
+
+log = logging.getLogger(__name__)
+
+# Variables de configuración (voice_input.json o voice_input.py)
+_config = cargar_config()
+SSML = _config.get("SSML") or "<speak>Hola mundo</speak>"
+VOICE = _config.get("VOICE") or "es-US-Wavenet-A"
+
+# Configuración de audio por defecto (también forma parte de la clave de caché).
+# Otros formatos: perfiles.py
+AUDIO_CONFIG = {"audio_encoding": "MP3"}
+
+# Límite de la API para el campo input de cada petición (bytes UTF-8)
+MAX_INPUT_BYTES = 5000
+
+# Peticiones idénticas concurrentes comparten una sola llamada a la API
+COALESCER = Coalescer()
+
+def preparar_sintesis(ssml_input: str, voice_name: str):
+    """
+    Resuelve la voz y aplica la sanitización que corresponda.
+    Devuelve (ssml_a_usar, voice_name_resolved, language_code, voice_meta).
+    """
     # Resolver la voz pasando VOICE_INFO
-    voice_name_resolved, language_code, voice_meta = resolve_voice(voice_name)
+    with span("resolver_voz"):
+        voice_name_resolved, language_code, voice_meta = resolve_voice(voice_name)
 
     # Detectar si es voz Chirp para sanitizar SSML
-    if voice_meta.get("type") == "chirp":
-        ssml_a_usar = sanitize_ssml_for_chirp(ssml_input)
+    if es_chirp(voice_meta):
+        with span("sanitizar"):
+            ssml_a_usar = sanitize_ssml_for_chirp(ssml_input)
     else:
         ssml_a_usar = ssml_input
 
-    # Crear cliente de Text-to-Speech
-    client = texttospeech.TextToSpeechClient()
+    return ssml_a_usar, voice_name_resolved, language_code or "es-US", voice_meta
+
+def construir_peticion(ssml_a_usar: str, voice_name_resolved: str, language_code: str,
+                       audio_config: dict = AUDIO_CONFIG) -> dict:
+    """
+    Argumentos de synthesize_speech (input, voice, audio_config) para el cliente
+    sync o async. Sin google-cloud-texttospeech instalado se arman como dicts,
+    que es lo que acepta el backend falso (fake_tts.py); el cliente real no
+    existe sin esa librería, así que solo los ve el fake.
+    """
+    # Import diferido: grpc/protobuf solo se cargan si de verdad se llama a la API
+    try:
+        from google.cloud import texttospeech
+    except ImportError:
+        return {"input": {"ssml": ssml_a_usar},
+                "voice": {"language_code": language_code, "name": voice_name_resolved},
+                "audio_config": dict(audio_config)}
 
     # Preparar la entrada de síntesis
     synthesis_input = texttospeech.SynthesisInput(ssml=ssml_a_usar)
 
     # Configurar la voz
     voice = texttospeech.VoiceSelectionParams(
-        language_code=language_code or "es-US",
+        language_code=language_code,
         name=voice_name_resolved
     )
 
-    # Configurar el formato de audio
-    audio_config = texttospeech.AudioConfig(
-        audio_encoding=texttospeech.AudioEncoding.MP3
-    )
+    # Configurar el formato de audio (sample_rate_hertz solo si el perfil lo fija)
+    opciones = dict(audio_config)
+    opciones["audio_encoding"] = getattr(texttospeech.AudioEncoding, opciones.get("audio_encoding", "MP3"))
+    audio_config = texttospeech.AudioConfig(**opciones)
 
-    print(f"SSML a enviar: {ssml_a_usar}")    
+    return {"input": synthesis_input, "voice": voice, "audio_config": audio_config}
 
-    # Llamar a la API para sintetizar
-    response = client.synthesize_speech(
-        input=synthesis_input,
-        voice=voice,
-        audio_config=audio_config
-    )
+def reservar_llamada(ssml_a_usar: str, voz: str, idioma: str, clave: str,
+                     cache: Optional[AudioCache] = None, audio_config: dict = AUDIO_CONFIG):
+    """
+    Carga una llamada al presupuesto del mes, si hay uno activo (puede lanzar
+    PresupuestoExcedido). Devuelve (libro, reserva, voz, idioma, clave, audio)
+    con la voz, el idioma y la clave de caché efectivos: si el presupuesto
+    degradó la voz y ese audio ya estaba en caché, `audio` lo trae y la
+    reserva ya se devolvió.
+    """
+    libro = presupuesto.actual()
+    if libro is None:
+        return None, None, voz, idioma, clave, None
+    reserva = libro.reservar(voz, idioma, len(ssml_a_usar))
+    if reserva.voz != voz:
+        voz, idioma = reserva.voz, reserva.idioma
+        clave = cache_key(ssml_a_usar, voz, idioma, audio_config)
+        audio = cache.get(clave) if cache is not None else None
+        if audio is not None:
+            libro.devolver(reserva)
+            return libro, None, voz, idioma, clave, audio
+    return libro, reserva, voz, idioma, clave, None
+
+
+def registrar_llamada(ssml_a_usar: str, audio: bytes):
+    """Métricas de una llamada a la API que salió bien."""
+    incrementar("llamadas_api")
+    incrementar("caracteres_facturados", len(ssml_a_usar))
+    incrementar("bytes_audio", len(audio))
+
+
+def sintetizar_con_clave(ssml_a_usar: str, voice_name_resolved: str, language_code: str,
+                         client=None, cache: Optional[AudioCache] = None,
+                         coalescer: Optional[Coalescer] = COALESCER,
+                         limiter: Optional[RateLimiter] = LIMITADOR,
+                         audio_config: dict = AUDIO_CONFIG):
+    """
+    sintetizar_bytes que devuelve (audio, clave): la clave de caché con la que
+    quedó el audio, que no es la pedida si el presupuesto degradó la voz.
+    """
+    key = cache_key(ssml_a_usar, voice_name_resolved, language_code, audio_config)
+    if cache is not None:
+        audio = cache.get(key)
+        if audio is not None:
+            incrementar("cache_hits")
+            return audio, key
+        incrementar("cache_misses")
+
+    def llamar_api():
+        # Cargar la llamada al presupuesto del mes (puede cambiar la voz o lanzar PresupuestoExcedido)
+        libro, reserva, voz, idioma, clave, audio = reservar_llamada(
+            ssml_a_usar, voice_name_resolved, language_code, key, cache, audio_config)
+        if audio is not None:
+            return audio, clave
+
+        # Reutilizar el cliente compartido de Text-to-Speech
+        api = client if client is not None else get_client()
+
+        # Llamar a la API para sintetizar (el span incluye reintentos y esperas del limitador)
+        try:
+            with span("llamada_api"):
+                response = con_reintentos(api.synthesize_speech, limiter=limiter,
+                                          **construir_peticion(ssml_a_usar, voz, idioma, audio_config))
+        except BaseException:
+            if reserva is not None:
+                libro.devolver(reserva)
+            raise
+        registrar_llamada(ssml_a_usar, response.audio_content)
+
+        if cache is not None:
+            cache.put(clave, response.audio_content)
+        return response.audio_content, clave
+
+    if coalescer is None:
+        return llamar_api()
+    return coalescer.hacer(key, llamar_api)
+
+def sintetizar_bytes(ssml_a_usar: str, voice_name_resolved: str, language_code: str,
+                     client=None, cache: Optional[AudioCache] = None,
+                     coalescer: Optional[Coalescer] = COALESCER,
+                     limiter: Optional[RateLimiter] = LIMITADOR,
+                     audio_config: dict = AUDIO_CONFIG) -> bytes:
+    """
+    Sintetiza SSML ya preparado y devuelve el audio en bytes.
+    Si se pasa `cache` y hay hit, no se crea cliente ni se llama a la API.
+    Si otra llamada idéntica está en curso, espera su resultado en lugar de
+    repetirla (coalescer=None lo desactiva). La llamada pasa por el limitador
+    de tasa y los 429/5xx se reintentan con backoff (ver cuota.py).
+    Si hay un presupuesto activo (presupuesto.activar), la llamada se carga al
+    libro del mes y puede degradarse a una voz más barata o rechazarse.
+    `audio_config` elige codificación y sample rate (ver perfiles.audio_config).
+    """
+    return sintetizar_con_clave(ssml_a_usar, voice_name_resolved, language_code, client=client,
+                                cache=cache, coalescer=coalescer, limiter=limiter,
+                                audio_config=audio_config)[0]
+
+def sintetizar_audio(ssml_input: str, voice_name: str, output_file: str = "output.mp3",
+                     client=None, cache: Optional[AudioCache] = None, incremental: bool = False,
+                     perfil: Optional[str] = None):
+    # Perfil de audio (mp3, web, telefonia...); los modos por fragmentos unen MP3
+    config = config_de_perfil(perfil)
+    if config != AUDIO_CONFIG and incremental:
+        raise ValueError(f"El modo incremental solo admite el perfil mp3 (pedido: {perfil})")
+
+    ssml_a_usar, voice_name_resolved, language_code, voice_meta = preparar_sintesis(ssml_input, voice_name)
+
+    # Rechazar aquí lo que la API rechazaría, antes de gastar cuota (SSMLInvalido).
+    # El largo se resuelve más abajo (fragmentos o error según el perfil)
+    with span("validar"):
+        exigir_ssml_valido(ssml_input, voice_meta, ssml_a_enviar=ssml_a_usar, permitir_largo=True)
+
+    # Modo incremental: caché por oración, solo se sintetiza lo que cambió
+    if incremental:
+        from fragmentos import sintetizar_incremental
+        sintetizar_incremental(ssml_input, voice_name, output_file, client=client, cache=cache)
+        return
+
+    # Guiones que superan el límite de la API se sintetizan por fragmentos
+    if len(ssml_a_usar.encode("utf-8")) > MAX_INPUT_BYTES:
+        if config != AUDIO_CONFIG:
+            raise ValueError(f"Los guiones de más de {MAX_INPUT_BYTES} bytes solo admiten el perfil mp3 (pedido: {perfil})")
+        from fragmentos import sintetizar_largo
+        sintetizar_largo(ssml_input, voice_name, output_file, client=client, cache=cache)
+        return
+
+    log.debug("SSML a enviar: %s", ssml_a_usar)
+
+    audio = sintetizar_bytes(ssml_a_usar, voice_name_resolved, language_code,
+                             client=client, cache=cache, audio_config=config)
 
     # Guardar el audio en archivo
-    with open(output_file, "wb") as out:
-        out.write(response.audio_content)
+    with span("escribir_archivo"), open(output_file, "wb") as out:
+        out.write(audio)
 
-    print(f"Audio generado y guardado en: {output_file}")
+    log.info("Audio generado y guardado en: %s", output_file)
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if not _config:
+        print("No se encontró voice_input.json ni voice_input.py. Usando valores por defecto.")
     print(f"Usando voz: {VOICE}")
-    sintetizar_audio(SSML, VOICE, "audio_generado.mp3")
\ No newline at end of file
+    cache = AudioCache()
+    sintetizar_audio(SSML, VOICE, "audio_generado.mp3", cache=cache)
+    print(f"Caché: {cache.stats()}")
\ No newline at end of file
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# sintetizador_async.py
+# Versión asyncio de sintetizar_audio para servicios (aiohttp, etc.): no bloquea
+# el event loop y permite tener cientos de síntesis en vuelo en un solo proceso.
+#
+# Es otra entrada al mismo pipeline que sintetizador.sintetizar_bytes: la misma
+# caché, el mismo limitador de cuota.py con sus reintentos, el mismo coalescer
+# (compartido con los hilos), el presupuesto, la validación y las métricas.
+# Solo cambia el transporte: TextToSpeechAsyncClient en lugar del cliente sync.
+
+import asyncio
+import os
+import tempfile
+from typing import Optional
+
+from cache_audio import AudioCache, cache_key
+from clientes import get_async_client
+from coalescer import Coalescer
+from cuota import LIMITADOR, RateLimiter, con_reintentos_async
+from metricas import incrementar, span
+from perfiles import audio_config as config_de_perfil
+from sintetizador import (AUDIO_CONFIG, COALESCER, MAX_INPUT_BYTES, construir_peticion, preparar_sintesis,
+                          registrar_llamada, reservar_llamada)
+from validacion import exigir_ssml_valido
+
+# Máximo de llamadas simultáneas a la API por defecto
+LIMITE_CONCURRENCIA = 100
+# Tiempo máximo por síntesis (segundos), reintentos y esperas incluidos
+TIMEOUT = 30.0
+
+
+class SintetizadorAsync:
+    """
+    Sintetizador asíncrono con límite de concurrencia (semáforo) y un timeout
+    por síntesis que abarca todos los reintentos. La cancelación de la
+    corrutina cancela también la llamada gRPC.
+
+        sint = SintetizadorAsync(limite=200)
+        audio = await sint.sintetizar(ssml, "es-US-Wavenet-A")
+        await sint.sintetizar(guion_largo, "es-US-Wavenet-A", "libro.mp3")
+    """
+
+    def __init__(self, limite: int = LIMITE_CONCURRENCIA, timeout: float = TIMEOUT,
+                 client=None, cache: Optional[AudioCache] = None,
+                 coalescer: Optional[Coalescer] = COALESCER,
+                 limiter: Optional[RateLimiter] = LIMITADOR):
+        self.timeout = timeout
+        self.client = client
+        self.cache = cache
+        self.coalescer = coalescer
+        self.limiter = limiter
+        self.limite = limite
+        self._semaforo = None  # se crea dentro del event loop
+
+    async def _en_hilo(self, fn, *args):
+        # E/S de disco (caché, presupuesto, archivo de salida) fuera del event loop
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def _llamar(self, client, peticion: dict):
+        # Un intento: el semáforo limita las llamadas en vuelo, no las esperas del limitador
+        if self._semaforo is None:
+            self._semaforo = asyncio.Semaphore(self.limite)
+        async with self._semaforo:
+            return await client.synthesize_speech(**peticion, timeout=self.timeout)
+
+    async def sintetizar_con_clave(self, ssml_a_usar: str, voice_name_resolved: str, language_code: str,
+                                   audio_config: dict = AUDIO_CONFIG):
+        """Equivalente async de sintetizador.sintetizar_con_clave: devuelve (audio, clave)."""
+        key = cache_key(ssml_a_usar, voice_name_resolved, language_code, audio_config)
+        if self.cache is not None:
+            audio = await self._en_hilo(self.cache.get, key)
+            if audio is not None:
+                incrementar("cache_hits")
+                return audio, key
+            incrementar("cache_misses")
+
+        async def llamar_api():
+            libro, reserva, voz, idioma, clave, audio = await self._en_hilo(
+                reservar_llamada, ssml_a_usar, voice_name_resolved, language_code, key, self.cache, audio_config)
+            if audio is not None:
+                return audio, clave
+
+            client = self.client or get_async_client()
+            try:
+                with span("llamada_api"):
+                    response = await con_reintentos_async(
+                        self._llamar, client, construir_peticion(ssml_a_usar, voz, idioma, audio_config),
+                        limiter=self.limiter, plazo=self.timeout)
+            except BaseException:
+                if reserva is not None:
+                    libro.devolver(reserva)
+                raise
+            registrar_llamada(ssml_a_usar, response.audio_content)
+
+            if self.cache is not None:
+                await self._en_hilo(self.cache.put, clave, response.audio_content)
+            return response.audio_content, clave
+
+        if self.coalescer is None:
+            return await llamar_api()
+        return await self.coalescer.hacer_async(key, llamar_api)
+
+    async def sintetizar_bytes(self, ssml_a_usar: str, voice_name_resolved: str, language_code: str,
+                               audio_config: dict = AUDIO_CONFIG) -> bytes:
+        """Equivalente async de sintetizador.sintetizar_bytes."""
+        audio, _ = await self.sintetizar_con_clave(ssml_a_usar, voice_name_resolved, language_code, audio_config)
+        return audio
+
+    async def _sintetizar_a_archivo(self, preparados, output_file: str) -> int:
+        # Como fragmentos.sintetizar_a_archivo: cada fragmento a un archivo del
+        # spool (enlazado desde la caché si se puede) y ensamblado.py los une
+        from fragmentos import directorio_spool, fragmento_desde_cache, guardar_fragmento, unir_en_archivo
+
+        spool_dir = await self._en_hilo(directorio_spool, output_file, self.cache)
+        with tempfile.TemporaryDirectory(dir=spool_dir, prefix=".fragmentos-") as spool:
+
+            async def fragmento(i, ssml_a_usar, voz, idioma):
+                destino = os.path.join(spool, f"{i:06d}.parte")
+                key = cache_key(ssml_a_usar, voz, idioma, AUDIO_CONFIG)
+                if await self._en_hilo(fragmento_desde_cache, self.cache, key, destino):
+                    return destino
+                audio, clave = await self.sintetizar_con_clave(ssml_a_usar, voz, idioma)
+                await self._en_hilo(guardar_fragmento, audio, clave, destino, self.cache)
+                return destino
+
+            rutas = await asyncio.gather(*(fragmento(i, s, v, l) for i, (s, v, l, _) in enumerate(preparados)))
+            return await self._en_hilo(unir_en_archivo, list(rutas), output_file)
+
+    async def sintetizar(self, ssml_input: str, voice_name: str, output_file: Optional[str] = None,
+                         perfil: Optional[str] = None) -> Optional[bytes]:
+        """
+        Equivalente async de sintetizador.sintetizar_audio. Devuelve el audio y,
+        si se indica `output_file`, además lo guarda en disco. Los guiones largos
+        con `output_file` se ensamblan directamente en el archivo (sin pasar
+        por memoria) y devuelven None. `perfil` elige el formato (perfiles.py).
+        """
+        config = config_de_perfil(perfil)
+        ssml_a_usar, voice_name_resolved, language_code, voice_meta = preparar_sintesis(ssml_input, voice_name)
+
+        # Rechazar aquí lo que la API rechazaría, antes de gastar cuota (SSMLInvalido)
+        with span("validar"):
+            exigir_ssml_valido(ssml_input, voice_meta, ssml_a_enviar=ssml_a_usar, permitir_largo=True)
+
+        if len(ssml_a_usar.encode("utf-8")) > MAX_INPUT_BYTES:
+            if config != AUDIO_CONFIG:
+                raise ValueError(f"Los guiones de más de {MAX_INPUT_BYTES} bytes solo admiten el perfil mp3 (pedido: {perfil})")
+            from fragmentos import dividir_ssml, tags_permitidos, unir_mp3
+            partes = dividir_ssml(ssml_input, tags_permitidos(voice_meta))
+            preparados = [preparar_sintesis(p, voice_name) for p in partes]
+            if output_file:
+                await self._sintetizar_a_archivo(preparados, output_file)
+                return None
+            # Sin archivo de salida el audio se devuelve entero: unido en memoria
+            audios = await asyncio.gather(*(self.sintetizar_bytes(s, v, l) for s, v, l, _ in preparados))
+            return unir_mp3(list(audios))
+
+        audio = await self.sintetizar_bytes(ssml_a_usar, voice_name_resolved, language_code, config)
+
+        if output_file:
+            def guardar():
+                with span("escribir_archivo"), open(output_file, "wb") as out:
+                    out.write(audio)
+            await self._en_hilo(guardar)
+        return audio
+
+
+async def sintetizar_audio_async(ssml_input: str, voice_name: str, output_file: Optional[str] = None,
+                                 client=None, cache: Optional[AudioCache] = None,
+                                 timeout: float = TIMEOUT, perfil: Optional[str] = None) -> Optional[bytes]:
+    """Atajo para una síntesis suelta (sin semáforo compartido con otras llamadas)."""
+    sint = SintetizadorAsync(timeout=timeout, client=client, cache=cache)
+    return await sint.sintetizar(ssml_input, voice_name, output_file, perfil=perfil)
+
+
+if __name__ == "__main__":
+    from sintetizador import SSML, VOICE
+
+    asyncio.run(sintetizar_audio_async(SSML, VOICE, "audio_generado.mp3", cache=AudioCache()))
+    print("Audio generado y guardado en: audio_generado.mp3")
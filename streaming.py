@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# streaming.py
+# Síntesis en streaming: entrega el audio por fragmentos a medida que está listo,
+# en lugar de esperar el clip completo. Pensado para prompts de IVR en vivo.
+#
+# Uso:
+#   python streaming.py salida.mp3
+#   python streaming.py - | mpv -          # a un pipe (stdout)
+
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, Optional
+
+import presupuesto
+from cache_audio import AudioCache
+from clientes import get_client
+from cuota import LIMITADOR, RateLimiter, con_reintentos
+from fragmentos import agrupar_oraciones, oraciones_ssml, quitar_id3, tags_permitidos
+from metricas import incrementar, span
+from sintetizador import preparar_sintesis, sintetizar_bytes
+from validacion import exigir_ssml_valido
+from voces import resolve_voice, split_ssml_sentences
+
+# Tamaño de los fragmentos tras el primero (el primero es siempre una sola oración)
+FRAGMENTO_BYTES = 1500
+# Fragmentos que se sintetizan por adelantado mientras se entrega el actual
+PREFETCH = 2
+
+
+def dividir_para_stream(ssml_input: str, voice_meta: dict, fragmento_bytes: int = FRAGMENTO_BYTES):
+    """Primer fragmento = primera oración (menor tiempo al primer byte); el resto agrupado."""
+    oraciones = oraciones_ssml(ssml_input, tags_permitidos(voice_meta), fragmento_bytes)
+    if not oraciones:
+        return []
+    return agrupar_oraciones(oraciones[:1], fragmento_bytes) + agrupar_oraciones(oraciones[1:], fragmento_bytes)
+
+
+def sintetizar_stream(ssml_input: str, voice_name: str, client=None,
+                      cache: Optional[AudioCache] = None, prefetch: int = PREFETCH,
+                      fragmento_bytes: int = FRAGMENTO_BYTES) -> Iterator[bytes]:
+    """
+    Genera el audio MP3 fragmento a fragmento y en orden. Como mucho hay
+    `prefetch` fragmentos en memoria, así que el consumo no depende del largo
+    del guion.
+    """
+    _, _, voice_meta = resolve_voice(voice_name)
+    # Rechazar aquí lo que la API rechazaría, antes de gastar cuota (SSMLInvalido)
+    exigir_ssml_valido(ssml_input, voice_meta, permitir_largo=True)
+    fragmentos = dividir_para_stream(ssml_input, voice_meta, fragmento_bytes)
+
+    if client is None:
+        client = get_client()
+
+    def sintetizar(fragmento):
+        ssml_a_usar, voice_name_resolved, language_code, _ = preparar_sintesis(fragmento, voice_name)
+        return sintetizar_bytes(ssml_a_usar, voice_name_resolved, language_code,
+                                client=client, cache=cache)
+
+    with ThreadPoolExecutor(max_workers=max(1, prefetch)) as pool:
+        pendientes = deque()
+        restantes = iter(fragmentos)
+        for f in restantes:
+            pendientes.append(pool.submit(sintetizar, f))
+            if len(pendientes) >= prefetch:
+                break
+        primero = True
+        while pendientes:
+            audio = pendientes.popleft().result()
+            siguiente = next(restantes, None)
+            if siguiente is not None:
+                pendientes.append(pool.submit(sintetizar, siguiente))
+            yield quitar_id3(audio, primero, ultimo=not pendientes)
+            primero = False
+
+
+def es_chirp3_hd(voice_meta: Optional[dict]) -> bool:
+    """True si la voz es Chirp 3 HD, las únicas que acepta streaming_synthesize."""
+    if not voice_meta:
+        return False
+    return (str(voice_meta.get("type") or "").lower() == "chirp3"
+            or "Chirp3-HD" in str(voice_meta.get("name") or ""))
+
+
+def peticiones_stream(oraciones: Iterable[str], voice_name_resolved: str, language_code: str) -> Iterator:
+    """
+    Peticiones de streaming_synthesize: primero la configuración y después
+    una por oración. Sin google-cloud-texttospeech se arman como dicts (para
+    el backend falso), como en sintetizador.construir_peticion.
+    """
+    try:
+        from google.cloud import texttospeech
+    except ImportError:
+        yield {"streaming_config": {"voice": {"language_code": language_code, "name": voice_name_resolved}}}
+        for oracion in oraciones:
+            yield {"input": {"text": oracion}}
+        return
+
+    yield texttospeech.StreamingSynthesizeRequest(
+        streaming_config=texttospeech.StreamingSynthesizeConfig(
+            voice=texttospeech.VoiceSelectionParams(
+                language_code=language_code,
+                name=voice_name_resolved,
+            )
+        )
+    )
+    for oracion in oraciones:
+        yield texttospeech.StreamingSynthesizeRequest(
+            input=texttospeech.StreamingSynthesisInput(text=oracion)
+        )
+
+
+def sintetizar_stream_api(texto: str, voice_name: str, client=None,
+                          limiter: Optional[RateLimiter] = LIMITADOR) -> Iterator[bytes]:
+    """
+    Usa el endpoint streaming_synthesize (solo voces Chirp 3 HD, solo texto
+    plano: los tags SSML se quitan). Devuelve PCM LINEAR16 crudo a 24 kHz tal
+    como lo entrega la API. Lanza ValueError de entrada si la voz no es
+    Chirp 3 HD y SSMLInvalido si el SSML no se puede enviar.
+
+    Como sintetizar_bytes, la llamada pasa por el limitador de cuota.py (con
+    reintentos mientras no haya llegado audio) y se carga al presupuesto del
+    mes, sin degradar: ninguna voz más barata admite streaming.
+    """
+    voice_name_resolved, language_code, voice_meta = resolve_voice(voice_name)
+    if not es_chirp3_hd(voice_meta):
+        raise ValueError(f"streaming_synthesize solo admite voces Chirp 3 HD (pedida: {voice_name_resolved})")
+    if texto.lstrip().startswith("<"):
+        exigir_ssml_valido(texto, voice_meta, permitir_largo=True)
+    oraciones = split_ssml_sentences(texto, allowed_tags=set())
+    return _stream_api(oraciones, voice_name_resolved, language_code or "es-US", client, limiter)
+
+
+def _stream_api(oraciones, voice_name_resolved: str, language_code: str, client,
+                limiter: Optional[RateLimiter]) -> Iterator[bytes]:
+    caracteres = sum(len(o) for o in oraciones)
+    libro, reserva = presupuesto.actual(), None
+    if libro is not None:
+        reserva = libro.reservar(voice_name_resolved, language_code, caracteres)
+        if reserva.voz != voice_name_resolved:
+            libro.devolver(reserva)
+            raise presupuesto.PresupuestoExcedido(
+                f"{voice_name_resolved} no entra en el presupuesto y streaming_synthesize no admite "
+                f"la voz degradada ({reserva.voz})")
+    if client is None:
+        client = get_client()
+
+    def abrir():
+        # Se reintenta hasta recibir el primer audio: después ya se entregó algo
+        respuestas = iter(client.streaming_synthesize(peticiones_stream(oraciones, voice_name_resolved,
+                                                                        language_code)))
+        return respuestas, next(respuestas, None)
+
+    try:
+        with span("llamada_api", via="stream"):
+            respuestas, primera = con_reintentos(abrir, limiter=limiter)
+    except BaseException:
+        if reserva is not None:
+            libro.devolver(reserva)
+        raise
+
+    incrementar("llamadas_api")
+    incrementar("caracteres_facturados", caracteres)
+    if primera is None:
+        return
+    incrementar("bytes_audio", len(primera.audio_content))
+    yield primera.audio_content
+    for response in respuestas:
+        incrementar("bytes_audio", len(response.audio_content))
+        yield response.audio_content
+
+
+def escribir_stream(chunks: Iterator[bytes], sink) -> int:
+    """
+    Escribe los fragmentos en `sink` a medida que llegan: ruta de archivo, "-"
+    (stdout), objeto con write() o socket (sendall()). Devuelve los bytes escritos.
+    """
+    if isinstance(sink, str):
+        if sink == "-":
+            return escribir_stream(chunks, sys.stdout.buffer)
+        with open(sink, "wb") as fh:
+            return escribir_stream(chunks, fh)
+
+    enviar = getattr(sink, "sendall", None) or sink.write
+    total = 0
+    for chunk in chunks:
+        enviar(chunk)
+        if hasattr(sink, "flush"):
+            sink.flush()
+        total += len(chunk)
+    return total
+
+
+if __name__ == "__main__":
+    from sintetizador import SSML, VOICE
+
+    destino = sys.argv[1] if len(sys.argv) > 1 else "audio_generado.mp3"
+    total = escribir_stream(sintetizar_stream(SSML, VOICE, cache=AudioCache()), destino)
+    if destino != "-":
+        print(f"Audio generado ({total:,} bytes) y guardado en: {destino}")
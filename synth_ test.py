@@ -40,9 +40,10 @@ print("Audio content written to file 'output.mp3'")
 """
 # Prueba mínima de salida de audio
 from google.cloud import texttospeech
+from clientes import get_client
 
 def prueba_minima():
-    client = texttospeech.TextToSpeechClient()
+    client = get_client()
 
     synthesis_input = texttospeech.SynthesisInput(text="Hola, este es un texto de prueba.")
 
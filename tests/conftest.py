@@ -0,0 +1,43 @@
+# conftest.py
+# Fixtures comunes: los tests usan el backend falso de fake_tts.py (sin red ni
+# credenciales) y corren dentro de un directorio temporal para no dejar audio,
+# cachés ni bases de la cola en el repo.
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# El backend falso no tiene cuota: que el limitador de cuota.py no frene los tests
+os.environ.setdefault("TTS_RATE", "1000000")
+
+from cache_audio import AudioCache  # noqa: E402
+from fake_tts import FakeConfig, FakeTTSClient  # noqa: E402
+
+VOZ = "es-US-Wavenet-A"
+VOZ_CHIRP = "es-US-Chirp-HD-O"
+
+
+@pytest.fixture(autouse=True)
+def directorio_temporal(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def cliente():
+    return FakeTTSClient(FakeConfig(latencia=0.0, semilla=1))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return AudioCache(str(tmp_path / "cache"))
+
+
+def guion_largo(oraciones: int = 250) -> str:
+    """Guion de más de 5000 bytes (fuerza la ruta por fragmentos)."""
+    return "<speak>" + " ".join(f"Oración número {i} del guion largo." for i in range(oraciones)) + "</speak>"
@@ -0,0 +1,44 @@
+from cache_audio import AudioCache, cache_key
+from conftest import VOZ
+from sintetizador import AUDIO_CONFIG, sintetizar_audio
+
+
+def test_clave_depende_de_todos_los_parametros():
+    base = cache_key("<speak>Hola</speak>", VOZ, "es-US", AUDIO_CONFIG)
+    assert base == cache_key("<speak>Hola</speak>", VOZ, "es-US", dict(AUDIO_CONFIG))
+    assert base != cache_key("<speak>Chau</speak>", VOZ, "es-US", AUDIO_CONFIG)
+    assert base != cache_key("<speak>Hola</speak>", "es-US-Neural2-A", "es-US", AUDIO_CONFIG)
+    assert base != cache_key("<speak>Hola</speak>", VOZ, "es-US", {"audio_encoding": "OGG_OPUS"})
+
+
+def test_put_get_y_estadisticas(tmp_path):
+    cache = AudioCache(str(tmp_path / "c"))
+    assert cache.get("ab" * 32) is None
+    cache.put("ab" * 32, b"audio")
+    assert cache.get("ab" * 32) == b"audio"
+    assert cache.contiene("ab" * 32)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_la_segunda_sintesis_sale_de_la_cache(cliente, cache):
+    sintetizar_audio("<speak>Hola mundo</speak>", VOZ, "a.mp3", client=cliente, cache=cache)
+    sintetizar_audio("<speak>Hola mundo</speak>", VOZ, "b.mp3", client=cliente, cache=cache)
+    assert cliente.llamadas == 1
+    with open("a.mp3", "rb") as a, open("b.mp3", "rb") as b:
+        assert a.read() == b.read()
+
+
+def test_la_extension_sale_del_formato(cliente, cache):
+    mp3 = cache_key("<speak>Hola</speak>", VOZ, "es-US", AUDIO_CONFIG)
+    assert mp3.endswith(".mp3") and len(mp3) == 64 + len(".mp3")
+    for perfil, ext in (("web", ".ogg"), ("wav", ".wav"), ("telefonia", ".wav")):
+        sintetizar_audio("<speak>Hola mundo</speak>", VOZ, "salida" + ext, client=cliente, cache=cache, perfil=perfil)
+    nombres = sorted(p.suffix for p in cache.directory.glob("*/*"))
+    assert nombres == [".ogg", ".wav", ".wav"]
+
+
+def test_evict_cuenta_todos_los_formatos(tmp_path):
+    cache = AudioCache(str(tmp_path / "c"), max_bytes=10)
+    cache.put("aa" * 32 + ".ogg", b"x" * 8)
+    cache.put("bb" * 32 + ".wav", b"y" * 8)
+    assert len(list(cache.directory.glob("*/*"))) == 1
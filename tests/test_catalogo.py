@@ -0,0 +1,48 @@
+import threading
+
+import voces
+from catalogo import Catalogo, Indice, usar_catalogo
+
+
+def voz(nombre, idioma, genero="FEMALE", rate=24000):
+    return {"name": nombre, "languages": [idioma], "gender": genero, "rate": rate}
+
+
+VOCES_A = [voz(f"es-US-Chirp3-HD-Voz{i}", "es-US") for i in range(50)]
+VOCES_B = [voz(f"es-ES-Wavenet-{i}", "es-ES", "MALE") for i in range(50)]
+
+
+def test_buscar_intersecta_indices():
+    catalogo = Catalogo(VOCES_A + [voz("es-US-Wavenet-A", "es-US", "MALE")])
+    assert len(catalogo.buscar(idioma="es-us", familia="chirp3")) == 50
+    assert [v["name"] for v in catalogo.buscar(idioma="es-US", genero="male")] == ["es-US-Wavenet-A"]
+    assert catalogo.get("ES-US-WAVENET-A")["family"] == "wavenet"
+    assert isinstance(catalogo._indice, Indice)
+
+
+def test_buscar_durante_un_refresco_ve_un_solo_indice():
+    catalogo = Catalogo(VOCES_A)
+    fin = threading.Event()
+
+    def refrescar():
+        while not fin.is_set():
+            catalogo._indexar(VOCES_B)
+            catalogo._indexar(VOCES_A)
+    hilo = threading.Thread(target=refrescar)
+    hilo.start()
+    try:
+        for _ in range(2000):
+            # Sin filtros o con uno: todas las voces salen del mismo índice
+            nombres = {v["name"][:5] for v in catalogo.buscar()}
+            assert len(nombres) == 1
+            assert len(catalogo.buscar(idioma="es-US", familia="chirp3")) in (0, 50)
+    finally:
+        fin.set()
+        hilo.join()
+
+
+def test_usar_catalogo_registra_las_voces_en_resolve_voice(monkeypatch):
+    monkeypatch.setattr(voces, "_catalogo", None)
+    usar_catalogo(Catalogo(VOCES_B))
+    nombre, idioma, meta = voces.resolve_voice("es-es-wavenet-7")
+    assert nombre == "es-ES-Wavenet-7" and idioma == "es-ES" and meta["type"] == "wavenet"
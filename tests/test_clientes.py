@@ -0,0 +1,62 @@
+import datetime
+import sys
+import threading
+import time
+import types
+
+import clientes
+
+
+class CredencialesLentas:
+    """Credenciales cuyo refresh tarda (como el intercambio de token real)."""
+
+    def __init__(self):
+        self.token = None
+        self.expiry = None
+        self.refrescos = 0
+
+    def refresh(self, request):
+        time.sleep(0.3)
+        self.refrescos += 1
+        self.token = "token"
+        ahora = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        self.expiry = ahora + datetime.timedelta(hours=1)
+
+
+def preparar(monkeypatch, creds):
+    google_auth = types.ModuleType("google.auth")
+    google_auth.default = lambda scopes=None: (creds, "proyecto")
+    transporte = types.ModuleType("google.auth.transport.requests")
+    transporte.Request = object
+    google = types.ModuleType("google")
+    google.auth = google_auth
+    for nombre, modulo in {"google": google, "google.auth": google_auth,
+                           "google.auth.transport": types.ModuleType("google.auth.transport"),
+                           "google.auth.transport.requests": transporte}.items():
+        monkeypatch.setitem(sys.modules, nombre, modulo)
+    monkeypatch.setattr(clientes, "_credenciales", {})
+    monkeypatch.setattr(clientes, "_pools", {})
+
+
+def test_el_token_se_refresca_una_vez_y_se_reutiliza(monkeypatch):
+    creds = CredencialesLentas()
+    preparar(monkeypatch, creds)
+    resultados = []
+    hilos = [threading.Thread(target=lambda: resultados.append(clientes.get_access_token())) for _ in range(5)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    assert resultados == [("token", "proyecto")] * 5
+    assert creds.refrescos == 1
+
+
+def test_el_refresco_no_frena_la_creacion_de_clientes(monkeypatch):
+    preparar(monkeypatch, CredencialesLentas())
+    hilo = threading.Thread(target=clientes.get_access_token)
+    hilo.start()
+    time.sleep(0.05)
+    inicio = time.monotonic()
+    clientes.get_pool(2)
+    assert time.monotonic() - inicio < 0.1
+    hilo.join()
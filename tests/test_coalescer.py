@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from coalescer import Coalescer
+from conftest import VOZ
+from fake_tts import FakeConfig, FakeTTSClient
+from sintetizador import sintetizar_bytes
+
+
+def test_llamadas_concurrentes_se_ejecutan_una_vez():
+    coalescer = Coalescer()
+    llamadas = []
+    barrera = threading.Barrier(8)
+
+    def lenta():
+        llamadas.append(1)
+        time.sleep(0.1)
+        return b"audio"
+
+    def pedir(_):
+        barrera.wait()
+        return coalescer.hacer("clave", lenta)
+
+    with ThreadPoolExecutor(8) as pool:
+        resultados = list(pool.map(pedir, range(8)))
+    assert resultados == [b"audio"] * 8
+    assert len(llamadas) == 1
+    assert coalescer.stats() == {"ejecutadas": 1, "compartidas": 7}
+    assert coalescer.en_vuelo() == 0
+
+
+def test_el_error_llega_a_todos_y_no_queda_en_vuelo():
+    coalescer = Coalescer()
+
+    def falla():
+        time.sleep(0.05)
+        raise RuntimeError("falló")
+
+    with ThreadPoolExecutor(4) as pool:
+        futuros = [pool.submit(coalescer.hacer, "clave", falla) for _ in range(4)]
+    for f in futuros:
+        with pytest.raises(RuntimeError):
+            f.result()
+    assert coalescer.en_vuelo() == 0
+
+
+def test_corrutinas_comparten_la_llamada():
+    coalescer = Coalescer()
+    llamadas = []
+
+    async def lenta():
+        llamadas.append(1)
+        await asyncio.sleep(0.05)
+        return b"audio"
+
+    async def correr():
+        return await asyncio.gather(*(coalescer.hacer_async("clave", lenta) for _ in range(10)))
+
+    assert asyncio.run(correr()) == [b"audio"] * 10
+    assert len(llamadas) == 1
+
+
+def test_sintesis_identicas_van_una_vez_a_la_api():
+    cliente = FakeTTSClient(FakeConfig(latencia=0.1))
+    with ThreadPoolExecutor(10) as pool:
+        audios = list(pool.map(lambda _: sintetizar_bytes("<speak>Coalescer</speak>", VOZ, "es-US", client=cliente),
+                               range(10)))
+    assert len(set(audios)) == 1
+    assert cliente.llamadas == 1
+
+
+def test_la_cancelacion_de_quien_llama_no_llega_a_los_demas():
+    coalescer = Coalescer()
+    llamadas = []
+
+    async def lenta():
+        llamadas.append(1)
+        await asyncio.sleep(0.1)
+        return b"audio"
+
+    def desde_hilo():
+        time.sleep(0.02)
+        return coalescer.hacer("clave", lambda: b"desde hilo")
+
+    async def correr():
+        primera = asyncio.ensure_future(coalescer.hacer_async("clave", lenta))
+        await asyncio.sleep(0.01)
+        seguidora = asyncio.ensure_future(coalescer.hacer_async("clave", lenta))
+        hilo = asyncio.get_running_loop().run_in_executor(None, desde_hilo)
+        await asyncio.sleep(0.05)
+        primera.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await primera
+        return await seguidora, await hilo
+
+    audio, del_hilo = asyncio.run(correr())
+    # La seguidora o el hilo pasa a hacer la llamada; el otro la comparte o la hace después
+    assert audio == b"audio" or audio == b"desde hilo"
+    assert del_hilo in (b"audio", b"desde hilo")
+    assert coalescer.en_vuelo() == 0
+
+
+def test_el_timeout_de_quien_llama_no_llega_a_los_demas():
+    coalescer = Coalescer()
+
+    async def lenta():
+        await asyncio.sleep(0.1)
+        return b"audio"
+
+    async def correr():
+        apurada = asyncio.ensure_future(asyncio.wait_for(coalescer.hacer_async("clave", lenta), 0.03))
+        await asyncio.sleep(0.01)
+        paciente = asyncio.ensure_future(coalescer.hacer_async("clave", lenta))
+        with pytest.raises(asyncio.TimeoutError):
+            await apurada
+        return await paciente
+
+    assert asyncio.run(correr()) == b"audio"
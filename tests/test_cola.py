@@ -0,0 +1,37 @@
+import json
+
+from cola import ColaTrabajos
+from conftest import VOZ
+from fake_tts import FakeConfig, FakeTTSClient
+
+
+def escribir_trabajos(path, n):
+    with open(path, "w", encoding="utf-8") as fh:
+        for i in range(n):
+            fh.write(json.dumps({"ssml": f"<speak>Trabajo {i}</speak>", "voice": VOZ, "output": f"salida_{i}.mp3"}) + "\n")
+        fh.write("esto no es json\n")
+
+
+def test_procesa_y_no_repite_lo_terminado(cliente, cache):
+    escribir_trabajos("trabajos.jsonl", 5)
+    cola = ColaTrabajos("cola.db")
+    assert cola.encolar("trabajos.jsonl") == {"nuevos": 5, "existentes": 0, "invalidos": 1}
+
+    resumen = cola.procesar(workers=3, client=cliente, cache=cache)
+    assert resumen == {"ok": 5, "error": 0, "reintento": 0}
+    assert cola.estado()["ok"] == 5 and cola.estado()["error"] == 1
+    assert cliente.llamadas == 5
+
+    # Volver a encolar el mismo archivo reanuda: nada que hacer
+    assert cola.encolar("trabajos.jsonl")["nuevos"] == 0
+    assert cola.procesar(workers=3, client=cliente, cache=cache)["ok"] == 0
+    assert cliente.llamadas == 5
+
+
+def test_errores_transitorios_se_reintentan(cache):
+    escribir_trabajos("trabajos.jsonl", 4)
+    cliente = FakeTTSClient(FakeConfig(latencia=0.0, tasa_error=0.3, codigos=(503,), semilla=3))
+    cola = ColaTrabajos("cola.db", max_intentos=10)
+    cola.encolar("trabajos.jsonl")
+    cola.procesar(workers=2, client=cliente, cache=cache)
+    assert cola.estado()["ok"] == 4
@@ -0,0 +1,86 @@
+import sys
+import time
+import types
+from types import SimpleNamespace
+
+import pytest
+
+from cuota import RateLimiter, con_reintentos, es_reintentable, parse_retry_after
+from fake_tts import FakeTTSError
+
+
+class ErrorGrpc(Exception):
+    def __init__(self, estado):
+        super().__init__(estado)
+        self._estado = SimpleNamespace(name=estado)
+
+    def code(self):
+        return self._estado
+
+
+@pytest.mark.parametrize("error, reintentable", [
+    (FakeTTSError(503), True),
+    (FakeTTSError(429), True),
+    (FakeTTSError(400), False),
+    (ErrorGrpc("UNAVAILABLE"), True),
+    (ErrorGrpc("ABORTED"), True),
+    (ErrorGrpc("INVALID_ARGUMENT"), False),
+    (ConnectionResetError(), True),
+    (TimeoutError(), True),
+    (ValueError(), False),
+])
+def test_es_reintentable(error, reintentable):
+    assert es_reintentable(error) is reintentable
+
+
+def test_errores_de_red_de_requests(monkeypatch):
+    # Misma jerarquía que requests: RequestException deriva de IOError, no de ConnectionError
+    class RequestException(IOError):
+        pass
+
+    excepciones = types.SimpleNamespace(RequestException=RequestException,
+                                        ConnectionError=type("ConnectionError", (RequestException,), {}),
+                                        Timeout=type("Timeout", (RequestException,), {}))
+    monkeypatch.setitem(sys.modules, "requests", types.SimpleNamespace(exceptions=excepciones))
+    assert es_reintentable(excepciones.ConnectionError())
+    assert es_reintentable(excepciones.Timeout())
+    assert not es_reintentable(RequestException())
+
+
+def test_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+
+def test_con_reintentos_y_penalizacion():
+    limiter = RateLimiter(rate=1000)
+    errores = [FakeTTSError(429, retry_after=0.0), FakeTTSError(503)]
+
+    def llamar():
+        if errores:
+            raise errores.pop(0)
+        return "ok"
+
+    assert con_reintentos(llamar, limiter=limiter, base=0.001) == "ok"
+    assert limiter.rate() < 1000
+
+
+def test_los_errores_definitivos_no_se_reintentan():
+    llamadas = []
+
+    def llamar():
+        llamadas.append(1)
+        raise FakeTTSError(400)
+
+    with pytest.raises(FakeTTSError):
+        con_reintentos(llamar, limiter=None, base=0.001)
+    assert len(llamadas) == 1
+
+
+def test_limitador_respeta_la_tasa():
+    limiter = RateLimiter(rate=50, capacidad=1)
+    inicio = time.monotonic()
+    for _ in range(6):
+        limiter.adquirir()
+    assert time.monotonic() - inicio >= 0.08
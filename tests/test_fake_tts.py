@@ -0,0 +1,56 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from conftest import VOZ
+from fake_tts import FakeConfig, FakeTTSClient, FakeTTSError, iniciar_servidor
+from sintetizador import construir_peticion, sintetizar_bytes
+
+
+def test_el_cliente_falso_acepta_la_peticion_de_construir_peticion():
+    cliente = FakeTTSClient(FakeConfig(latencia=0.0))
+    respuesta = cliente.synthesize_speech(**construir_peticion("<speak>Hola</speak>", VOZ, "es-US"))
+    assert respuesta.audio_content.startswith(b"ID3")
+    assert cliente.llamadas == 1
+
+
+def test_rechaza_entradas_de_mas_de_5000_bytes():
+    cliente = FakeTTSClient(FakeConfig(latencia=0.0))
+    with pytest.raises(FakeTTSError) as e:
+        cliente.synthesize_speech(**construir_peticion("<speak>" + "a" * 6000 + "</speak>", VOZ, "es-US"))
+    assert e.value.code == 400
+
+
+def test_los_errores_transitorios_se_reintentan():
+    cliente = FakeTTSClient(FakeConfig(latencia=0.0, tasa_error=0.5, codigos=(503,), semilla=2))
+    for i in range(10):
+        sintetizar_bytes(f"<speak>Reintento {i}</speak>", VOZ, "es-US", client=cliente, coalescer=None)
+    assert cliente.errores > 0 and cliente.llamadas == 10 + cliente.errores
+
+
+def test_servidor_rest():
+    servidor, endpoint = iniciar_servidor(FakeConfig(latencia=0.0))
+    try:
+        cuerpo = json.dumps({"input": {"ssml": "<speak>Hola</speak>"},
+                             "voice": {"languageCode": "es-US", "name": VOZ},
+                             "audioConfig": {"audioEncoding": "MP3"}}).encode("utf-8")
+        peticion = urllib.request.Request(endpoint + "/v1/text:synthesize", cuerpo,
+                                          {"Content-Type": "application/json"})
+        with urllib.request.urlopen(peticion, timeout=10) as resp:
+            assert resp.status == 200 and json.loads(resp.read())["audioContent"]
+    finally:
+        servidor.shutdown()
+
+
+def test_servidor_rest_con_errores():
+    servidor, endpoint = iniciar_servidor(FakeConfig(latencia=0.0, tasa_error=1.0, codigos=(429,), retry_after=2))
+    try:
+        peticion = urllib.request.Request(endpoint + "/v1/text:synthesize", b'{"input": {"text": "x"}}',
+                                          {"Content-Type": "application/json"})
+        with pytest.raises(urllib.error.HTTPError) as e:
+            urllib.request.urlopen(peticion, timeout=10)
+        assert e.value.code == 429 and e.value.headers["Retry-After"] == "2"
+    finally:
+        servidor.shutdown()
@@ -0,0 +1,80 @@
+import pytest
+
+from conftest import VOZ, VOZ_CHIRP, guion_largo
+from ensamblado import METODOS, Parte, ensamblar
+from fragmentos import (LONG_FORM_ALLOWED_TAGS, dividir_ssml, sintetizar_incremental, sintetizar_largo,
+                        unir_mp3)
+from sintetizador import MAX_INPUT_BYTES, sintetizar_audio
+from validacion import SSMLInvalido, validar_ssml
+
+
+def test_cada_fragmento_entra_en_el_limite_y_conserva_el_texto():
+    ssml = guion_largo()
+    partes = dividir_ssml(ssml)
+    assert len(partes) > 1
+    assert all(len(p.encode("utf-8")) <= MAX_INPUT_BYTES for p in partes)
+    assert "Oración número 0 " in partes[0] and "Oración número 249 " in partes[-1]
+
+
+def test_sin_chirp_los_fragmentos_conservan_los_tags():
+    cuerpo = " ".join(f'<prosody rate="slow">Oración <emphasis>{i}</emphasis> del guion.</prosody>'
+                      for i in range(200))
+    partes = dividir_ssml(f"<speak><p>{cuerpo}</p></speak>", LONG_FORM_ALLOWED_TAGS)
+    assert len(partes) > 1
+    for parte in partes:
+        assert len(parte.encode("utf-8")) <= MAX_INPUT_BYTES
+        assert '<prosody rate="slow">' in parte and "<emphasis>" in parte
+        assert validar_ssml(parte).valido
+
+
+def test_ssml_mal_formado_sin_chirp():
+    with pytest.raises(SSMLInvalido):
+        dividir_ssml("<speak><p>sin cerrar</speak>", LONG_FORM_ALLOWED_TAGS)
+
+
+def test_unir_mp3_deja_una_sola_cabecera_id3():
+    from fake_tts import audio_falso
+    unido = unir_mp3([audio_falso(2000), audio_falso(2000), audio_falso(2000)])
+    assert unido.startswith(b"ID3") and unido.count(b"ID3") == 1
+
+
+def test_guion_largo_se_ensambla_en_el_archivo(cliente, cache):
+    n = sintetizar_largo(guion_largo(), VOZ_CHIRP, "largo.mp3", client=cliente, cache=cache)
+    assert n > 1 and cliente.llamadas == n
+    with open("largo.mp3", "rb") as fh:
+        audio = fh.read()
+    assert audio.startswith(b"ID3") and audio.count(b"ID3") == 1
+
+    # Todos los fragmentos quedaron en la caché: repetir no llama a la API
+    sintetizar_audio(guion_largo(), VOZ_CHIRP, "otra_vez.mp3", client=cliente, cache=cache)
+    assert cliente.llamadas == n
+    with open("otra_vez.mp3", "rb") as fh:
+        assert fh.read() == audio
+
+
+def test_incremental_solo_sintetiza_lo_editado(cliente, cache):
+    guion = "<speak><p>Primera oración. Segunda oración. Tercera oración.</p></speak>"
+    primero = sintetizar_incremental(guion, VOZ, "a.mp3", client=cliente, cache=cache)
+    assert primero["sintetizadas"] == 3
+    editado = sintetizar_incremental(guion.replace("Segunda", "Otra"), VOZ, "b.mp3", client=cliente, cache=cache)
+    assert (editado["reutilizadas"], editado["sintetizadas"]) == (2, 1)
+    assert cliente.llamadas == 4
+
+
+@pytest.mark.parametrize("metodo", METODOS)
+def test_ensamblar_copia_las_partes_en_orden(tmp_path, metodo):
+    (tmp_path / "a").write_bytes(b"xxHOLA")
+    (tmp_path / "b").write_bytes(b" MUNDOyy")
+    total = ensamblar([Parte(str(tmp_path / "a"), 2, 6), Parte(str(tmp_path / "b"), 0, 6)],
+                      str(tmp_path / "salida.mp3"), metodo=metodo)
+    assert total == 10 and (tmp_path / "salida.mp3").read_bytes() == b"HOLA MUNDO"
+
+
+def test_ensamblar_con_error_no_toca_el_destino(tmp_path):
+    (tmp_path / "a").write_bytes(b"HOLA")
+    (tmp_path / "salida.mp3").write_bytes(b"anterior")
+    with pytest.raises(OSError):
+        ensamblar([Parte(str(tmp_path / "a"), 0, 4), Parte(str(tmp_path / "falta"), 0, 4)],
+                  str(tmp_path / "salida.mp3"))
+    assert (tmp_path / "salida.mp3").read_bytes() == b"anterior"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a", "salida.mp3"]
@@ -0,0 +1,52 @@
+import sys
+
+import pytest
+
+import lote
+from conftest import VOZ
+from cuota import ErrorReintentable
+from lote import procesar_trabajo
+
+
+def trabajo(salida="salida.mp3"):
+    return {"linea": 1, "ssml": "<speak>Hola.</speak>", "voice": VOZ, "output": salida}
+
+
+def test_trabajo_ok(cliente, cache):
+    resultado = procesar_trabajo(trabajo(), client=cliente, cache=cache)
+    assert resultado["estado"] == "ok" and resultado["intentos"] == 1
+
+
+def test_error_de_api_no_se_reintenta_otra_vez(monkeypatch, cliente, cache):
+    # con_reintentos ya agotó sus intentos: el trabajo no vuelve a empezar
+    llamadas = []
+
+    def fallar(*args, **kwargs):
+        llamadas.append(1)
+        raise ErrorReintentable(503)
+    monkeypatch.setattr(lote, "sintetizar_trabajo", fallar)
+    resultado = procesar_trabajo(trabajo(), client=cliente, cache=cache, reintentos=3)
+    assert resultado["estado"] == "error" and len(llamadas) == 1
+
+
+def test_error_de_e_s_se_reintenta(monkeypatch, cliente, cache):
+    llamadas = []
+    original = lote.sintetizar_trabajo
+
+    def fallar_una_vez(*args, **kwargs):
+        llamadas.append(1)
+        if len(llamadas) == 1:
+            raise OSError("disco ocupado")
+        return original(*args, **kwargs)
+    monkeypatch.setattr(lote, "sintetizar_trabajo", fallar_una_vez)
+    monkeypatch.setattr(lote, "backoff", lambda intento: 0.0)
+    resultado = procesar_trabajo(trabajo(), client=cliente, cache=cache, reintentos=3)
+    assert resultado["estado"] == "ok" and resultado["intentos"] == 2
+
+
+@pytest.mark.parametrize("opcion", [["--concurrencia", "0"], ["--procesos", "-1"]])
+def test_main_valida_opciones(monkeypatch, capsys, opcion):
+    monkeypatch.setattr(sys, "argv", ["lote.py", "trabajos.jsonl", *opcion])
+    with pytest.raises(SystemExit) as salida:
+        lote.main()
+    assert salida.value.code == 2 and opcion[0] in capsys.readouterr().err
@@ -0,0 +1,109 @@
+import json
+import socket
+import subprocess
+import sys
+
+import pytest
+
+import presupuesto
+from conftest import ROOT, VOZ, VOZ_CHIRP
+from presupuesto import DEGRADAR, Presupuesto, PresupuestoExcedido
+from sintetizador import sintetizar_audio
+
+
+@pytest.fixture
+def libro(monkeypatch):
+    """Activa un libro en memoria (sin franquicia gratuita) para las síntesis del test."""
+    def activar(limite_usd, degradar=DEGRADAR, path=None):
+        nuevo = Presupuesto(limite_usd, path=path, degradar=degradar, free_tiers={})
+        monkeypatch.setattr(presupuesto, "_actual", nuevo)
+        return nuevo
+    return activar
+
+
+def test_reserva_y_devolucion(libro):
+    gastos = libro(1.0)
+    reserva = gastos.reservar(VOZ, "es-US", 1000)
+    assert reserva.voz == VOZ and reserva.usd > 0
+    gastos.devolver(reserva)
+    assert gastos.reservar(VOZ, "es-US", 1000).usd == reserva.usd
+
+
+def test_degrada_chirp_cuando_no_entra(libro):
+    # 100 caracteres de Chirp (30 USD/M) no entran en 0.002 USD; en WaveNet sí
+    gastos = libro(0.002)
+    reserva = gastos.reservar(VOZ_CHIRP, "es-US", 100)
+    assert reserva.voz != VOZ_CHIRP and reserva.tipo == "wavenet"
+
+
+def test_sin_degradar_se_rechaza(libro, cliente):
+    libro(0.0001, degradar=None)
+    with pytest.raises(PresupuestoExcedido):
+        sintetizar_audio("<speak>" + "Texto caro. " * 100 + "</speak>", VOZ_CHIRP, "x.mp3", client=cliente)
+    assert cliente.llamadas == 0
+
+
+def test_el_tope_se_comparte_por_archivo(libro, tmp_path):
+    path = str(tmp_path / "presupuesto.json")
+    uno = libro(0.006, path=path)
+    otro = Presupuesto(0.006, path=path, degradar=None, free_tiers={})
+    # 1000 caracteres de WaveNet = 0.004 USD: el segundo proceso ya no entra
+    uno.reservar(VOZ, "es-US", 1000)
+    with pytest.raises(PresupuestoExcedido):
+        otro.reservar(VOZ, "es-US", 1000)
+
+
+def test_las_reservas_salen_del_cupo_sin_tocar_el_archivo(libro, tmp_path):
+    path = tmp_path / "presupuesto.json"
+    gastos = libro(10.0, path=str(path))
+    gastos.reservar(VOZ, "es-US", 1000)
+    contenido = path.read_text()
+    for _ in range(10):
+        gastos.reservar(VOZ, "es-US", 1000)
+    assert path.read_text() == contenido
+    gastos.cerrar()
+    datos = json.loads(path.read_text())
+    assert datos["tipos"]["wavenet"]["caracteres"] == 11000 and datos["cupos"] == {}
+
+
+def test_el_cupo_de_un_proceso_caido_se_da_por_gastado(libro, tmp_path):
+    muerto = subprocess.Popen([sys.executable, "-c", "pass"])
+    muerto.wait()
+    path = tmp_path / "presupuesto.json"
+    path.write_text(json.dumps({"mes": presupuesto.mes_actual(), "tipos": {},
+                                "cupos": {f"{socket.gethostname()}:{muerto.pid}:0": 0.005}}))
+    gastos = libro(0.006, degradar=None, path=str(path))
+    with pytest.raises(PresupuestoExcedido):
+        gastos.reservar(VOZ, "es-US", 1000)
+    assert json.loads(path.read_text())["perdido_usd"] == pytest.approx(0.005)
+
+
+def test_activar_registra_el_guardado_al_salir_una_vez(monkeypatch, tmp_path):
+    registrados = []
+    monkeypatch.setattr(presupuesto.atexit, "register", registrados.append)
+    monkeypatch.setattr(presupuesto, "_al_salir_registrado", False)
+    monkeypatch.setattr(presupuesto, "_actual", None)
+    for _ in range(3):
+        presupuesto.activar(1.0, str(tmp_path / "presupuesto.json"))
+    assert len(registrados) == 1
+
+
+def test_varios_procesos_no_pasan_el_tope(tmp_path):
+    path = tmp_path / "presupuesto.json"
+    codigo = (
+        "import sys\n"
+        f"sys.path.insert(0, {str(ROOT)!r})\n"
+        "from presupuesto import Presupuesto, PresupuestoExcedido\n"
+        f"libro = Presupuesto(0.2, path={str(path)!r}, degradar=None, free_tiers={{}})\n"
+        "try:\n"
+        "    while True:\n"
+        f"        libro.reservar({VOZ!r}, 'es-US', 1000)\n"
+        "except PresupuestoExcedido:\n"
+        "    libro.cerrar()\n"
+    )
+    procesos = [subprocess.Popen([sys.executable, "-c", codigo]) for _ in range(4)]
+    assert all(p.wait(timeout=60) == 0 for p in procesos)
+    datos = json.loads(path.read_text())
+    # 0.2 USD a 0.004 por reserva: exactamente 50 entre todos
+    assert datos["tipos"]["wavenet"]["caracteres"] == 50 * 1000
+    assert datos["cupos"] == {}
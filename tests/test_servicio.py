@@ -0,0 +1,112 @@
+import asyncio
+import json
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import presupuesto
+from conftest import VOZ, VOZ_CHIRP
+from fake_tts import FakeConfig, FakeTTSClient
+from presupuesto import DEGRADAR, Presupuesto
+from servicio import Servicio, iniciar_en_hilo
+
+
+@pytest.fixture
+def servicio(cache):
+    cliente = FakeTTSClient(FakeConfig(latencia=0.05, semilla=1))
+    servicio = Servicio(client=cliente, cache=cache)
+    servidor, url = iniciar_en_hilo(servicio)
+    servicio.url = url
+    yield servicio
+    servidor.shutdown()
+
+
+def pedir(url, ruta, datos=None, cabeceras=None):
+    cuerpo = json.dumps(datos).encode("utf-8") if datos is not None else None
+    peticion = urllib.request.Request(url + ruta, cuerpo, {"Content-Type": "application/json", **(cabeceras or {})})
+    try:
+        with urllib.request.urlopen(peticion, timeout=10) as resp:
+            return resp.status, resp.headers, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def test_sintetizar_etag_y_304(servicio):
+    datos = {"ssml": "<speak>Hola servicio</speak>", "voice": VOZ}
+    status, cabeceras, audio = pedir(servicio.url, "/v1/sintetizar", datos)
+    assert status == 200 and audio.startswith(b"ID3")
+    etag = cabeceras["ETag"]
+
+    status, _, _ = pedir(servicio.url, "/v1/sintetizar", datos, {"If-None-Match": etag})
+    assert status == 304
+    status, _, desde_cache = pedir(servicio.url, cabeceras["Content-Location"])
+    assert status == 200 and desde_cache == audio
+    assert servicio.client.llamadas == 1
+
+
+def test_peticiones_identicas_se_unen(servicio):
+    datos = {"ssml": "<speak>Todas a la vez</speak>", "voice": VOZ}
+    with ThreadPoolExecutor(10) as pool:
+        respuestas = list(pool.map(lambda _: pedir(servicio.url, "/v1/sintetizar", datos), range(10)))
+    assert {r[0] for r in respuestas} == {200}
+    assert servicio.client.llamadas == 1
+
+
+def test_errores_http(servicio):
+    assert pedir(servicio.url, "/v1/sintetizar", {"ssml": "<speak>x</speak>"})[0] == 400
+    assert pedir(servicio.url, "/v1/sintetizar", {"ssml": "<speak>roto", "voice": VOZ})[0] == 400
+    assert pedir(servicio.url, "/v1/audio/" + "0" * 64)[0] == 404
+    assert pedir(servicio.url, "/v1/nada")[0] == 404
+    assert servicio.client.llamadas == 0
+
+
+def test_costos(servicio):
+    status, _, cuerpo = pedir(servicio.url, "/v1/costos", {"ssml": "<speak>Hola</speak>", "voces": [VOZ]})
+    assert status == 200 and json.loads(cuerpo)
+
+
+def test_voz_degradada_usa_la_clave_efectiva(servicio, monkeypatch):
+    monkeypatch.setattr(presupuesto, "_actual", Presupuesto(0.001, path=None, degradar=DEGRADAR, free_tiers={}))
+    status, cabeceras, audio = pedir(servicio.url, "/v1/sintetizar",
+                                     {"ssml": "<speak>Hola mundo, esto es una prueba</speak>", "voice": VOZ_CHIRP})
+    assert status == 200
+    status, _, desde_cache = pedir(servicio.url, cabeceras["Content-Location"])
+    assert status == 200 and desde_cache == audio
+
+
+def test_cancelar_una_conexion_no_falla_las_demas(cache):
+    cliente = FakeTTSClient(FakeConfig(latencia=0.3))
+    servicio = Servicio(client=cliente, cache=cache)
+    cuerpo = json.dumps({"ssml": "<speak>Compartida</speak>", "voice": VOZ}).encode("utf-8")
+    peticion = (b"POST /v1/sintetizar HTTP/1.1\r\nHost: x\r\nConnection: close\r\n"
+                b"Content-Type: application/json\r\nContent-Length: " + str(len(cuerpo)).encode() + b"\r\n\r\n" + cuerpo)
+
+    async def pedir_crudo(puerto):
+        reader, writer = await asyncio.open_connection("127.0.0.1", puerto)
+        writer.write(peticion)
+        await writer.drain()
+        respuesta = await reader.read()
+        writer.close()
+        return respuesta.split(b"\r\n", 1)[0]
+
+    async def correr():
+        servidor = await servicio.iniciar("127.0.0.1", 0)
+        puerto = servidor.sockets[0].getsockname()[1]
+        clientes_http = [asyncio.ensure_future(pedir_crudo(puerto)) for _ in range(3)]
+        await asyncio.sleep(0.1)
+        # Cancelar la tarea del servidor que atiende una de las conexiones
+        atendiendo = [t for t in asyncio.all_tasks() if "atender" in repr(t.get_coro())]
+        assert len(atendiendo) == 3
+        atendiendo[0].cancel()
+        estados = await asyncio.gather(*clientes_http, return_exceptions=True)
+        servidor.close()
+        return estados
+
+    try:
+        estados = asyncio.run(correr())
+    finally:
+        servicio.cerrar()
+    assert estados.count(b"HTTP/1.1 200 OK") == 2
+    assert cliente.llamadas == 1
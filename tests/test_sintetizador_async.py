@@ -0,0 +1,65 @@
+import asyncio
+import time
+
+import pytest
+
+from conftest import VOZ, VOZ_CHIRP, guion_largo
+from cuota import RateLimiter, con_reintentos_async
+from fake_tts import FakeConfig, FakeTTSAsyncClient
+from sintetizador_async import SintetizadorAsync
+from validacion import SSMLInvalido
+
+
+def test_sintesis_identicas_comparten_la_llamada(cache):
+    cliente = FakeTTSAsyncClient(FakeConfig(latencia=0.05))
+    sint = SintetizadorAsync(client=cliente, cache=cache)
+
+    async def correr():
+        return await asyncio.gather(*(sint.sintetizar("<speak>Async</speak>", VOZ) for _ in range(20)))
+
+    audios = asyncio.run(correr())
+    assert len(set(audios)) == 1 and cliente.llamadas == 1
+
+
+def test_ssml_invalido_no_llama_a_la_api():
+    cliente = FakeTTSAsyncClient(FakeConfig(latencia=0.0))
+    with pytest.raises(SSMLInvalido):
+        asyncio.run(SintetizadorAsync(client=cliente).sintetizar("<speak><p>roto</speak>", VOZ))
+    assert cliente.llamadas == 0
+
+
+def test_guion_largo_a_archivo(cache):
+    cliente = FakeTTSAsyncClient(FakeConfig(latencia=0.0))
+    sint = SintetizadorAsync(client=cliente, cache=cache)
+    assert asyncio.run(sint.sintetizar(guion_largo(), VOZ_CHIRP, "largo.mp3")) is None
+    with open("largo.mp3", "rb") as fh:
+        assert fh.read().count(b"ID3") == 1
+    llamadas = cliente.llamadas
+    asyncio.run(sint.sintetizar(guion_largo(), VOZ_CHIRP, "otra_vez.mp3"))
+    assert llamadas > 1 and cliente.llamadas == llamadas
+
+
+def test_el_timeout_abarca_todos_los_reintentos():
+    # Cada intento tarda 0.1 s y falla con 503: sin plazo total serían 5 intentos más el backoff
+    cliente = FakeTTSAsyncClient(FakeConfig(latencia=0.1, tasa_error=1.0, codigos=(503,)))
+    sint = SintetizadorAsync(client=cliente, timeout=0.25, coalescer=None)
+    inicio = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(sint.sintetizar("<speak>Lenta</speak>", VOZ))
+    assert time.monotonic() - inicio < 0.6
+    assert cliente.llamadas < 5
+
+
+def test_limitador_en_archivo_desde_corrutinas(tmp_path):
+    limiter = RateLimiter(rate=1000, path=str(tmp_path / "rate.json"))
+    llamadas = []
+
+    async def llamar(i):
+        llamadas.append(i)
+        return i
+
+    async def correr():
+        return await asyncio.gather(*(con_reintentos_async(llamar, i, limiter=limiter) for i in range(20)))
+
+    assert asyncio.run(correr()) == list(range(20))
+    assert (tmp_path / "rate.json").exists()
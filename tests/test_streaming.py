@@ -0,0 +1,69 @@
+import pytest
+
+import presupuesto
+from conftest import VOZ, VOZ_CHIRP, guion_largo
+from cuota import ErrorReintentable
+from fake_tts import FakeConfig, FakeTTSClient
+from presupuesto import Presupuesto, PresupuestoExcedido
+from streaming import sintetizar_stream, sintetizar_stream_api
+from validacion import SSMLInvalido
+
+
+class ClienteInestable(FakeTTSClient):
+    """Falla con 429 las primeras `fallos` aperturas del stream."""
+
+    def __init__(self, fallos):
+        super().__init__(FakeConfig(latencia=0.0, semilla=1))
+        self.fallos = fallos
+        self.aperturas = 0
+
+    def streaming_synthesize(self, requests=None, **kwargs):
+        self.aperturas += 1
+        if self.aperturas <= self.fallos:
+            raise ErrorReintentable(429, retry_after=0.0)
+        return super().streaming_synthesize(requests, **kwargs)
+
+
+def test_stream_api_rechaza_voz_que_no_es_chirp3(cliente):
+    with pytest.raises(ValueError, match="Chirp 3 HD"):
+        sintetizar_stream_api("Hola.", VOZ, client=cliente)
+    assert cliente.llamadas == 0
+
+
+def test_stream_api_entrega_una_respuesta_por_oracion(cliente):
+    partes = list(sintetizar_stream_api("Primera oración. Segunda oración.", VOZ_CHIRP, client=cliente))
+    assert len(partes) == 2 and all(partes)
+
+
+def test_stream_api_reintenta_antes_del_primer_audio():
+    cliente = ClienteInestable(fallos=2)
+    partes = list(sintetizar_stream_api("Hola.", VOZ_CHIRP, client=cliente))
+    assert cliente.aperturas == 3 and len(partes) == 1
+
+
+def test_stream_api_carga_y_devuelve_presupuesto(monkeypatch):
+    gastos = Presupuesto(1.0, path=None, free_tiers={})
+    monkeypatch.setattr(presupuesto, "_actual", gastos)
+    list(sintetizar_stream_api("Hola mundo.", VOZ_CHIRP, client=FakeTTSClient(FakeConfig(latencia=0.0))))
+    gastado = gastos._usd()
+    assert gastado > 0
+
+    # Si el stream no llega a abrirse, la reserva vuelve al libro
+    with pytest.raises(ErrorReintentable):
+        list(sintetizar_stream_api("Hola mundo.", VOZ_CHIRP, client=ClienteInestable(fallos=99)))
+    assert gastos._usd() == pytest.approx(gastado)
+
+
+def test_stream_api_no_degrada_la_voz(monkeypatch, cliente):
+    # Chirp no entra en el tope y la voz degradada (WaveNet) no admite streaming
+    monkeypatch.setattr(presupuesto, "_actual", Presupuesto(0.002, path=None, free_tiers={}))
+    with pytest.raises(PresupuestoExcedido, match="no admite"):
+        list(sintetizar_stream_api("Hola mundo. " * 20, VOZ_CHIRP, client=cliente))
+    assert cliente.llamadas == 0
+
+
+def test_stream_valida_el_ssml(cliente, cache):
+    with pytest.raises(SSMLInvalido):
+        list(sintetizar_stream("<speak>sin cerrar", VOZ, client=cliente, cache=cache))
+    assert cliente.llamadas == 0
+    assert b"".join(sintetizar_stream(guion_largo(), VOZ, client=cliente, cache=cache))
@@ -0,0 +1,51 @@
+import pytest
+
+from conftest import VOZ, VOZ_CHIRP
+from sintetizador import sintetizar_audio
+from validacion import SSMLInvalido, exigir_ssml_valido, validar_ssml, validar_trabajo
+from voces import resolve_voice
+
+
+def meta(voz):
+    return resolve_voice(voz)[2]
+
+
+def test_ssml_valido():
+    r = validar_ssml("<speak>Hola <break time='1s'/> mundo</speak>", meta(VOZ))
+    assert r.valido and not r.avisos
+
+
+@pytest.mark.parametrize("ssml", [
+    "",
+    "<speak>sin cerrar",
+    "<p>sin speak</p>",
+    "<speak><bailar>no existe</bailar></speak>",
+])
+def test_ssml_invalido(ssml):
+    assert not validar_ssml(ssml, meta(VOZ)).valido
+
+
+def test_chirp_avisa_de_los_tags_que_se_eliminan():
+    r = validar_ssml("<speak>Hola <break time='1s'/> mundo</speak>", meta(VOZ_CHIRP))
+    assert r.valido and r.avisos
+    assert not validar_ssml("<speak>Hola <break time='1s'/> mundo</speak>", meta(VOZ_CHIRP), estricto=True).valido
+
+
+def test_limite_de_bytes():
+    ssml = "<speak>" + "a" * 6000 + "</speak>"
+    assert not validar_ssml(ssml, meta(VOZ)).valido
+    r = validar_ssml(ssml, meta(VOZ), permitir_largo=True)
+    assert r.valido and r.bytes > 5000
+
+
+def test_trabajo_con_voz_desconocida():
+    r = validar_trabajo({"ssml": "<speak>Hola</speak>", "voice": "no-existe-X", "output": "x.mp3"})
+    assert not r.valido
+
+
+def test_no_se_gasta_cuota_en_ssml_invalido(cliente):
+    with pytest.raises(SSMLInvalido):
+        exigir_ssml_valido("<speak>roto", meta(VOZ))
+    with pytest.raises(SSMLInvalido):
+        sintetizar_audio("<speak><p>roto</speak>", VOZ, "x.mp3", client=cliente)
+    assert cliente.llamadas == 0
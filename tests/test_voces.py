@@ -0,0 +1,23 @@
+import pytest
+
+import voces
+from voces import VOICE_INFO, resolve_voice
+
+
+def test_resuelve_alias_y_prefijo():
+    assert resolve_voice("WAVENET-A")[0] == "es-US-Wavenet-A"
+    assert resolve_voice("es-us-chirp")[0] == "es-US-Chirp-HD-O"
+
+
+def test_el_indice_sigue_los_cambios_de_voice_info(monkeypatch):
+    monkeypatch.setitem(VOICE_INFO, "es-MX-Wavenet-Z",
+                        {"name": "es-MX-Wavenet-Z", "languageCode": "es-MX", "type": "wavenet"})
+    assert resolve_voice("es-mx-wavenet-z")[1] == "es-MX"
+    index, keys, _ = voces._voice_index
+    assert keys == sorted(index)
+
+
+def test_voz_desconocida(monkeypatch):
+    monkeypatch.setattr(voces, "_catalogo", ({}, {}, []))
+    with pytest.raises(KeyError):
+        resolve_voice("xx-XX-Inexistente-Q")
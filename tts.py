@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# tts.py
+# Punto de entrada único para las herramientas de síntesis.
+#
+# Cada subcomando importa sus módulos recién al ejecutarse, así estimar costos
+# o sanitizar SSML no carga google-cloud-texttospeech (grpc/protobuf), y una
+# síntesis que sale de la caché tampoco. La configuración se lee de
+# voice_input.json (ver configuracion.py).
+#
+# Uso:
+#   python tts.py sintetizar guion.ssml --voz es-US-Wavenet-A -o salida.mp3
+#   python tts.py sintetizar aviso.ssml -p telefonia -o aviso.wav --tambien web=aviso.ogg
+#   python tts.py costos --corpus trabajos.jsonl --json
+#   python tts.py lote trabajos.jsonl -p 4
+#   python tts.py cola procesar trabajos.jsonl --workers 8
+#   python tts.py voces --idioma es-US --familia chirp3
+#   python tts.py audicion guion.ssml --idioma es-US --familia chirp3
+#   python tts.py sanitizar guion.ssml
+#   python tts.py validar --jsonl trabajos.jsonl
+#   python tts.py servicio --puerto 8080
+#   python tts.py config --exportar
+#   python tts.py --import-time costos ...   # desglose de tiempos de import en stderr
+
+import argparse
+import builtins
+import sys
+import time
+
+# Subcomandos que delegan en el main() de otro módulo con el resto de argumentos
+DELEGADOS = {
+    "costos": ("costs_models", "Estimación de costos (ver costs_models.py --help)."),
+    "lote": ("lote", "Síntesis por lotes desde JSONL (ver lote.py --help)."),
+    "cola": ("cola", "Cola de trabajos persistente con reanudación (ver cola.py --help)."),
+    "audicion": ("audicion", "Compara voces sintetizando el mismo guion con cada una (ver audicion.py --help)."),
+    "servicio": ("servicio", "Microservicio HTTP de síntesis (ver servicio.py --help)."),
+    "validar": ("validacion", "Valida SSML o un JSONL de trabajos sin llamar a la API (ver validacion.py --help)."),
+    "voces": ("catalogo", "Consulta el catálogo local de voces (ver catalogo.py --help)."),
+}
+
+
+class MedidorImports:
+    """
+    Envuelve builtins.__import__ y anota el tiempo inclusivo de cada módulo que
+    se importa por primera vez, con su profundidad en el árbol de imports.
+    """
+
+    def __init__(self):
+        self.tiempos = {}
+        self._profundidad = 0
+        self._original = None
+
+    def instalar(self):
+        self._original = original = builtins.__import__
+
+        def importar(name, globals=None, locals=None, fromlist=(), level=0):
+            if level or name in sys.modules:
+                return original(name, globals, locals, fromlist, level)
+            inicio = time.perf_counter()
+            self._profundidad += 1
+            try:
+                return original(name, globals, locals, fromlist, level)
+            finally:
+                self._profundidad -= 1
+                self.tiempos.setdefault(name, (time.perf_counter() - inicio, self._profundidad))
+
+        builtins.__import__ = importar
+
+    def desinstalar(self):
+        if self._original is not None:
+            builtins.__import__ = self._original
+
+    def reporte(self, total: float, limite: int = 15) -> str:
+        directos = sorted(((t, n) for n, (t, d) in self.tiempos.items() if d == 0), reverse=True)
+        lineas = [f"Tiempo de import ({len(self.tiempos)} módulos nuevos; detalle: python -X importtime)"]
+        for t, nombre in directos[:limite]:
+            lineas.append(f"  {t * 1000:8.1f} ms  {nombre}")
+        lineas.append(f"  {sum(t for t, _ in directos) * 1000:8.1f} ms  imports directos")
+        lineas.append(f"  {total * 1000:8.1f} ms  total del comando")
+        return "\n".join(lineas)
+
+
+def _leer_ssml(path: str) -> str:
+    if path == "-":
+        return sys.stdin.read()
+    with open(path, "r", encoding="utf-8") as fh:
+        return fh.read()
+
+
+def cmd_sintetizar(args):
+    import logging
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format="%(message)s")
+    import sintetizador
+    from cache_audio import AudioCache
+
+    ssml = _leer_ssml(args.ssml) if args.ssml else sintetizador.SSML
+    voz = args.voz or sintetizador.VOICE
+    cache = None if args.sin_cache else AudioCache()
+    if args.tambien:
+        from perfiles import sintetizar_perfiles
+        salidas = {args.perfil or "mp3": args.salida}
+        for item in args.tambien:
+            perfil, _, ruta = item.partition("=")
+            if not ruta:
+                sys.exit(f"--tambien espera PERFIL=ARCHIVO (recibido: {item})")
+            salidas[perfil] = ruta
+        sintetizar_perfiles(ssml, voz, salidas, cache=cache, derivar=not args.sin_derivar)
+        return
+    sintetizador.sintetizar_audio(ssml, voz, args.salida, cache=cache, incremental=args.incremental,
+                                  perfil=args.perfil)
+
+
+def cmd_sanitizar(args):
+    from voces import sanitize_ssml_for_chirp
+    sys.stdout.write(sanitize_ssml_for_chirp(_leer_ssml(args.ssml)))
+
+
+def cmd_config(args):
+    from configuracion import CONFIG_JSON, cargar_config, exportar_config
+    import json
+    if args.exportar is not None:
+        destino = exportar_config(args.exportar or CONFIG_JSON)
+        print(f"Configuración exportada a {destino}")
+        return
+    print(json.dumps(cargar_config(), indent=2, ensure_ascii=False))
+
+
+def _delegar(nombre: str, argv):
+    """Ejecuta main() del módulo como si se hubiera llamado `python modulo.py argv...`."""
+    mod = __import__(DELEGADOS[nombre][0])
+    sys.argv = [f"tts.py {nombre}"] + list(argv)
+    return mod.main()
+
+
+def construir_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Herramientas de Text-to-Speech (síntesis, costos, lotes, voces).")
+    parser.add_argument('--import-time', action='store_true',
+                        help='Mostrar en stderr el tiempo de import de cada módulo cargado por el comando.')
+    sub = parser.add_subparsers(dest="comando", metavar="COMANDO")
+    sub.required = True
+
+    p = sub.add_parser("sintetizar", help="Sintetiza un SSML (MP3 u otro perfil de audio).")
+    p.add_argument('ssml', nargs='?', help='Archivo SSML ("-" = stdin). Por defecto SSML de la configuración.')
+    p.add_argument('--voz', '-V', type=str, help='Nombre o clave de voz. Por defecto VOICE de la configuración.')
+    p.add_argument('--salida', '-o', type=str, default="output.mp3", help='Archivo MP3 de salida.')
+    p.add_argument('--perfil', '-p', type=str, help='Perfil de audio: mp3 (defecto), web, telefonia, wav-16k... (ver perfiles.py).')
+    p.add_argument('--tambien', nargs='+', metavar='PERFIL=ARCHIVO',
+                   help='Generar además estos formatos (LINEAR16 una vez y transcodificación local).')
+    p.add_argument('--sin-derivar', action='store_true', help='Con --tambien, pedir cada formato a la API.')
+    p.add_argument('--incremental', action='store_true', help='Caché por oración (ver fragmentos.py).')
+    p.add_argument('--sin-cache', action='store_true', help='No usar la caché de audio.')
+    p.add_argument('--verbose', '-v', action='store_true', help='Mostrar el SSML enviado.')
+    p.set_defaults(func=cmd_sintetizar)
+
+    p = sub.add_parser("sanitizar", help="Imprime el SSML sanitizado para voces Chirp.")
+    p.add_argument('ssml', help='Archivo SSML ("-" = stdin).')
+    p.set_defaults(func=cmd_sanitizar)
+
+    p = sub.add_parser("config", help="Muestra o exporta la configuración (voice_input).")
+    p.add_argument('--exportar', nargs='?', const="", default=None, metavar="DESTINO",
+                   help='Escribir voice_input.py como JSON (por defecto voice_input.json).')
+    p.set_defaults(func=cmd_config)
+
+    # Solo para --help: main() pasa los argumentos de estos comandos sin parsearlos
+    for nombre, (_, ayuda) in DELEGADOS.items():
+        sub.add_parser(nombre, help=ayuda)
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # Los comandos delegados reciben el resto de argumentos tal cual (incluido --help)
+    i = 0
+    while i < len(argv) and argv[i].startswith("-"):
+        i += 1
+    delegado = argv[i] if i < len(argv) and argv[i] in DELEGADOS else None
+    args = construir_parser().parse_args(argv[:i + 1] if delegado else argv)
+
+    medidor = MedidorImports() if args.import_time else None
+    if medidor is not None:
+        medidor.instalar()
+    inicio = time.perf_counter()
+    try:
+        if delegado:
+            return _delegar(delegado, argv[i + 1:])
+        return args.func(args)
+    finally:
+        if medidor is not None:
+            medidor.desinstalar()
+            print(medidor.reporte(time.perf_counter() - inicio), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
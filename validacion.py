@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# validacion.py
+# Validación local de SSML antes de enviarlo a la API: que esté bien formado,
+# que la voz admita sus tags y que no supere el límite de bytes por petición.
+#
+# La sintaxis la revisa expat sin construir el árbol ni llamar a Python por
+# cada elemento, así que validar un guion cuesta microsegundos y un lote
+# entero se revisa antes de gastar cuota. Para voces Chirp se valida además
+# el SSML sanitizado (lo que de verdad se envía); los tags fuera de
+# voces.CHIRP_ALLOWED_TAGS se informan como avisos porque
+# sanitize_ssml_for_chirp los elimina.
+#
+# Uso:
+#   python validacion.py guion.ssml --voz es-US-Chirp-HD-O
+#   python validacion.py --jsonl trabajos.jsonl --invalidos rechazados.jsonl
+#   python validacion.py --jsonl trabajos.jsonl --estricto     # los avisos también rechazan
+
+import argparse
+import json
+import re
+import sys
+import time
+from collections import namedtuple
+from typing import Dict, Iterator, List, Optional, Tuple
+from xml.parsers import expat
+
+from voces import CHIRP_ALLOWED_TAGS, es_chirp, resolve_voice, sanitize_ssml_for_chirp
+
+# Límite de la API para el campo input (bytes UTF-8), igual que sintetizador.MAX_INPUT_BYTES
+MAX_INPUT_BYTES = 5000
+
+# Elementos SSML que acepta Text-to-Speech (voces que no son Chirp)
+SSML_TAGS = {"speak", "p", "s", "break", "say-as", "audio", "sub", "mark", "prosody", "emphasis",
+             "par", "seq", "media", "phoneme", "voice", "lang", "desc"}
+# Lo que queda tras sanitize_ssml_for_chirp
+CHIRP_TAGS = CHIRP_ALLOWED_TAGS | {"speak"}
+
+# valido: sin errores; bytes: tamaño UTF-8 de lo que se enviaría a la API
+Validacion = namedtuple("Validacion", "valido errores avisos bytes")
+
+
+class SSMLInvalido(ValueError):
+    """SSML que la API rechazaría; `errores` tiene el detalle."""
+
+    def __init__(self, errores: List[str]):
+        super().__init__("SSML inválido: " + "; ".join(errores))
+        self.errores = errores
+
+
+# Nombres de elemento (apertura); los de cierre los comprueba expat
+_ELEMENTO = re.compile(rb'<([A-Za-z_][\w.:-]*)')
+
+
+def error_de_sintaxis(datos: bytes) -> Optional[str]:
+    """Error de expat con línea y columna, o None si el documento está bien formado."""
+    parser = expat.ParserCreate("utf-8")
+    try:
+        parser.Parse(datos, True)
+    except expat.ExpatError as e:
+        return f"línea {e.lineno}, columna {e.offset + 1}: {expat.ErrorString(e.code)}"
+    return None
+
+
+def _elementos_exactos(datos: bytes):
+    # Con un handler por elemento (más lento): ignora comentarios y CDATA
+    nombres = []
+    parser = expat.ParserCreate("utf-8")
+    parser.StartElementHandler = lambda nombre, atributos: nombres.append(nombre)
+    parser.Parse(datos, True)
+    return nombres[0] if nombres else None, set(nombres)
+
+
+def analizar(datos: bytes, permitidos) -> Tuple[Optional[str], Optional[str], List[str]]:
+    """
+    Devuelve (error, raiz, desconocidos): el error de sintaxis (None si está
+    bien formado), el primer elemento y los elementos fuera de `permitidos`.
+    La sintaxis la revisa expat sin callbacks y los nombres una regex sobre
+    los bytes; solo si algo no cuadra y hay comentarios o CDATA se repite el
+    recorrido elemento por elemento.
+    """
+    error = error_de_sintaxis(datos)
+    nombres = _ELEMENTO.findall(datos)
+    raiz = nombres[0].decode("utf-8") if nombres else None
+    tags = {n.decode("utf-8") for n in set(nombres)}
+    desconocidos = [t for t in tags if t.lower() not in permitidos]
+    if (desconocidos or (raiz or "").lower() != "speak") and error is None \
+            and (b"<!--" in datos or b"<![CDATA[" in datos):
+        raiz, tags = _elementos_exactos(datos)
+        desconocidos = [t for t in tags if t.lower() not in permitidos]
+    return error, raiz, sorted(desconocidos)
+
+
+def validar_ssml(ssml: str, voice_meta: Optional[Dict] = None, ssml_a_enviar: Optional[str] = None,
+                 max_bytes: int = MAX_INPUT_BYTES, permitir_largo: bool = False,
+                 estricto: bool = False) -> Validacion:
+    """
+    Valida `ssml` para la voz de `voice_meta` (formato VOICE_INFO).
+    `ssml_a_enviar` es el SSML ya preparado (sanitizado para Chirp); si falta
+    se calcula. Con permitir_largo=True superar `max_bytes` solo es un aviso
+    (sintetizar_audio lo parte en fragmentos). Con estricto=True los avisos
+    también invalidan.
+    """
+    errores, avisos = [], []
+    if not ssml or not ssml.strip():
+        return Validacion(False, ["SSML vacío"], [], 0)
+
+    datos = ssml.encode("utf-8")
+    if es_chirp(voice_meta):
+        # Lo que se envía es el SSML sanitizado: el original solo genera avisos
+        error, _, desconocidos = analizar(datos, CHIRP_TAGS)
+        if error:
+            avisos.append(f"SSML mal formado ({error}); se envía la versión sanitizada")
+        if desconocidos:
+            avisos.append(f"tags no admitidos por voces Chirp (sanitize_ssml_for_chirp los elimina): "
+                          f"{', '.join(desconocidos)}")
+        if ssml_a_enviar is None:
+            ssml_a_enviar = sanitize_ssml_for_chirp(ssml)
+        if ssml_a_enviar != ssml:
+            datos = ssml_a_enviar.encode("utf-8")
+            error_enviado = error_de_sintaxis(datos)
+            if error_enviado:
+                errores.append(f"el SSML sanitizado no está bien formado ({error_enviado})")
+    else:
+        if ssml_a_enviar is not None and ssml_a_enviar != ssml:
+            datos = ssml_a_enviar.encode("utf-8")
+        error, raiz, desconocidos = analizar(datos, SSML_TAGS)
+        if error:
+            errores.append(f"SSML mal formado ({error})")
+        elif raiz is None or raiz.lower() != "speak":
+            errores.append(f"el elemento raíz debe ser <speak> (encontrado: {raiz and f'<{raiz}>'})")
+        if desconocidos:
+            errores.append(f"tags SSML no admitidos: {', '.join(desconocidos)}")
+
+    n_bytes = len(datos)
+    if n_bytes > max_bytes:
+        mensaje = f"{n_bytes} bytes supera el límite de {max_bytes} por petición"
+        if permitir_largo:
+            avisos.append(mensaje + "; se sintetiza por fragmentos")
+        else:
+            errores.append(mensaje)
+
+    if estricto and avisos:
+        errores, avisos = errores + avisos, []
+    return Validacion(not errores, errores, avisos, n_bytes)
+
+
+def exigir_ssml_valido(ssml: str, voice_meta: Optional[Dict] = None, **kwargs) -> Validacion:
+    """validar_ssml que lanza SSMLInvalido si hay errores (precheck antes de llamar a la API)."""
+    resultado = validar_ssml(ssml, voice_meta, **kwargs)
+    if not resultado.valido:
+        raise SSMLInvalido(resultado.errores)
+    return resultado
+
+
+def validar_trabajo(trabajo: Dict, estricto: bool = False) -> Validacion:
+    """Valida un trabajo de lote.py ({ssml, voice, output, perfil?, salidas?, incremental?})."""
+    try:
+        _, _, voice_meta = resolve_voice(trabajo["voice"])
+    except KeyError as e:
+        return Validacion(False, [str(e.args[0]) if e.args else "voz desconocida"], [], 0)
+    # Los guiones largos solo se parten en MP3 y con una sola salida
+    permitir_largo = (trabajo.get("perfil") or "mp3") == "mp3" and not trabajo.get("salidas")
+    return validar_ssml(trabajo["ssml"], voice_meta, permitir_largo=permitir_largo, estricto=estricto)
+
+
+def validar_jsonl(path: str, estricto: bool = False) -> Iterator[Dict]:
+    """Valida cada línea del JSONL de trabajos y devuelve su registro {linea, voice, valido, ...}."""
+    from lote import leer_trabajos
+    for trabajo in leer_trabajos(path):
+        if "error" in trabajo:
+            yield {"linea": trabajo["linea"], "valido": False, "errores": [trabajo["error"]], "avisos": []}
+            continue
+        r = validar_trabajo(trabajo, estricto)
+        yield {"linea": trabajo["linea"], "voice": trabajo["voice"], "output": trabajo["output"],
+               "valido": r.valido, "errores": r.errores, "avisos": r.avisos, "bytes": r.bytes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Valida SSML localmente (sintaxis, tags por voz y límite de bytes).")
+    parser.add_argument('ssml', nargs='?', help='Archivo SSML ("-" = stdin).')
+    parser.add_argument('--voz', '-V', type=str, help='Voz para la que se valida (por defecto VOICE de la configuración).')
+    parser.add_argument('--jsonl', '-j', type=str, help='Validar todos los trabajos de un JSONL de lote.py.')
+    parser.add_argument('--invalidos', type=str, help='(--jsonl) Escribir en este JSONL los trabajos rechazados.')
+    parser.add_argument('--permitir-largo', action='store_true', help='Superar el límite de bytes es solo un aviso.')
+    parser.add_argument('--estricto', action='store_true', help='Los avisos también invalidan.')
+    parser.add_argument('--quiet', '-q', action='store_true', help='(--jsonl) Solo el resumen.')
+    args = parser.parse_args()
+
+    if args.jsonl:
+        inicio = time.perf_counter()
+        total = invalidos = avisos = 0
+        salida = open(args.invalidos, "w", encoding="utf-8") if args.invalidos else None
+        try:
+            for r in validar_jsonl(args.jsonl, args.estricto):
+                total += 1
+                avisos += bool(r["avisos"])
+                if r["valido"]:
+                    continue
+                invalidos += 1
+                if salida is not None:
+                    salida.write(json.dumps(r, ensure_ascii=False) + "\n")
+                if not args.quiet:
+                    print(f"línea {r['linea']}: " + "; ".join(r["errores"]))
+        finally:
+            if salida is not None:
+                salida.close()
+        segundos = time.perf_counter() - inicio
+        print(f"{total} trabajos: {total - invalidos} válidos, {invalidos} inválidos, {avisos} con avisos "
+              f"({segundos:.2f} s, {segundos / max(total, 1) * 1e6:.0f} µs por trabajo)")
+        sys.exit(1 if invalidos else 0)
+
+    if args.ssml == "-":
+        ssml = sys.stdin.read()
+    elif args.ssml:
+        with open(args.ssml, "r", encoding="utf-8") as fh:
+            ssml = fh.read()
+    else:
+        parser.error("indicar un archivo SSML o --jsonl")
+    if args.voz:
+        voz = args.voz
+    else:
+        from configuracion import cargar_config
+        voz = cargar_config().get("VOICE") or "es-US-Wavenet-A"
+    try:
+        _, _, voice_meta = resolve_voice(voz)
+    except KeyError as e:
+        sys.exit(str(e.args[0]))
+
+    inicio = time.perf_counter()
+    r = validar_ssml(ssml, voice_meta, permitir_largo=args.permitir_largo, estricto=args.estricto)
+    micros = (time.perf_counter() - inicio) * 1e6
+    for e in r.errores:
+        print(f"ERROR: {e}")
+    for a in r.avisos:
+        print(f"AVISO: {a}")
+    print(f"{'Válido' if r.valido else 'Inválido'} para {voz}: {r.bytes} bytes ({micros:.0f} µs)")
+    sys.exit(0 if r.valido else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,59 +1,198 @@
+import bisect
 import re
-from typing import Optional, Tuple, Dict
+from typing import Optional, Tuple, Dict, List
+
+class VoiceTable(dict):
+    """
+    dict que lleva un contador de versión que cambia con cada modificación,
+    para saber cuándo hay que reconstruir el índice de resolve_voice.
+    """
+    version = 0
+
+    def _touch(self):
+        self.version += 1
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._touch()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._touch()
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._touch()
+
+    def setdefault(self, key, default=None):
+        value = super().setdefault(key, default)
+        self._touch()
+        return value
+
+    def pop(self, *args):
+        value = super().pop(*args)
+        self._touch()
+        return value
+
+    def popitem(self):
+        item = super().popitem()
+        self._touch()
+        return item
+
+    def clear(self):
+        super().clear()
+        self._touch()
 
 # Diccionario de voces con claves normalizadas
-VOICE_INFO: Dict[str, Dict] = {    
+VOICE_INFO: Dict[str, Dict] = VoiceTable({
     "es-US-Wavenet-A": { "name": "es-US-Wavenet-A", "languageCode": "es-US", "type": "wavenet", "price_per_million": 4.00 },
-    "es-US-Neural2-A": { "name": "es-US-Neural2-A", "languageCode": "es-US", "type": "neural", "price_per_million": 16.00 },    
+    "es-US-Neural2-A": { "name": "es-US-Neural2-A", "languageCode": "es-US", "type": "neural", "price_per_million": 16.00 },
     'es-US-Chirp-HD-O':  { "name": "es-US-Chirp-HD-O", "languageCode": "es-US", "type": "chirp3", "price_per_million": 30.00},
     # ... otras voces ...
-}
+})
+
+# Índice de resolve_voice: (clave normalizada -> voice_meta (None si es ambigua),
+# claves ordenadas, huella de VOICE_INFO), siempre reemplazados juntos
+_voice_index: Tuple[Dict[str, Optional[Dict]], List[str], object] = ({}, [], None)
+
+# Voces del catálogo persistido (catalogo.py) en formato VOICE_INFO. Se leen de
+# voces_catalogo.json, sin red, la primera vez que una voz no está en VOICE_INFO.
+# (info, índice, claves ordenadas), siempre reemplazados juntos
+_catalogo: Optional[Tuple[Dict[str, Dict], Dict[str, Optional[Dict]], List[str]]] = None
+
+def _alias(name: str) -> Optional[str]:
+    """'es-US-Wavenet-A' -> 'wavenet-a' (nombre sin el código de idioma)."""
+    parts = name.split("-", 2)
+    return parts[2] if len(parts) == 3 else None
+
+def _indexar(tabla: Dict[str, Dict]) -> Dict[str, Optional[Dict]]:
+    index: Dict[str, Optional[Dict]] = {}
+    # Claves exactas (clave del dict y 'name') tienen prioridad sobre los alias
+    for key, meta in tabla.items():
+        index[key.lower()] = meta
+        index.setdefault(meta.get("name", key).lower(), meta)
+    aliases: Dict[str, Optional[Dict]] = {}
+    for key, meta in tabla.items():
+        alias = _alias(meta.get("name", key))
+        if not alias:
+            continue
+        alias = alias.lower()
+        if alias in index:
+            continue
+        # Un alias compartido por voces de distintos idiomas es ambiguo
+        aliases[alias] = meta if aliases.get(alias, meta) is meta else None
+    index.update(aliases)
+    return index
+
+def _build_voice_index():
+    """(índice, claves, huella) de VOICE_INFO; lo reconstruye solo si cambió (o fue reemplazado)."""
+    global _voice_index
+    fingerprint = (id(VOICE_INFO), getattr(VOICE_INFO, "version", None), len(VOICE_INFO))
+    if fingerprint == _voice_index[2]:
+        return _voice_index
+
+    index = _indexar(VOICE_INFO)
+    # Una sola asignación: una búsqueda concurrente no mezcla índice y claves de versiones distintas
+    _voice_index = (index, sorted(index), fingerprint)
+    return _voice_index
+
+def usar_catalogo(catalogo) -> None:
+    """
+    Hace que resolve_voice encuentre también las voces de `catalogo`
+    (catalogo.Catalogo). cargar_catalogo y los refrescos lo llaman solos.
+    """
+    global _catalogo
+    info = catalogo.as_voice_info()
+    index = _indexar(info)
+    # Una sola asignación: resolve_voice nunca ve el índice nuevo con las claves viejas
+    _catalogo = (info, index, sorted(index))
+
+def _cargar_catalogo_persistido() -> Tuple[Dict[str, Dict], Dict[str, Optional[Dict]], List[str]]:
+    global _catalogo
+    if _catalogo is not None:
+        return _catalogo
+    _catalogo = ({}, {}, [])
+    try:
+        import catalogo as modulo
+        catalogo = modulo.leer_catalogo(modulo.CATALOGO_FILE)
+    except (OSError, ValueError):
+        catalogo = None
+    if catalogo is not None:
+        usar_catalogo(catalogo)
+    return _catalogo
+
+def _lookup_prefix(key_norm: str, index: Dict[str, Optional[Dict]], keys: List[str]) -> Optional[Dict]:
+    """Coincidencia por prefijo (búsqueda binaria); None si no hay o es ambigua."""
+    i = bisect.bisect_left(keys, key_norm)
+    found = None
+    while i < len(keys) and keys[i].startswith(key_norm):
+        meta = index[keys[i]]
+        if meta is None or (found is not None and meta is not found):
+            return None
+        found = meta
+        i += 1
+    return found
 
 def resolve_voice(voice_key: str) -> Optional[Tuple[str, str, Dict]]:
     """
     Resuelve el nombre de voz y devuelve (voice_name, language_code, voice_meta).
-    Busca la voz en VOICE_INFO ignorando mayúsculas/minúsculas.
+    Busca la voz ignorando mayúsculas/minúsculas, por nombre completo, por
+    alias sin idioma ("wavenet-a") o por prefijo único: primero en VOICE_INFO
+    (curada a mano) y si no está, en el catálogo persistido de catalogo.py.
     """
     if not voice_key:
         return None
 
+    index, keys, _ = _build_voice_index()
     key_norm = voice_key.strip().lower()
-    voice_meta = VOICE_INFO.get(key_norm)
-
-    if not voice_meta:
-        # Buscar por coincidencia parcial en 'name'
-        for meta in VOICE_INFO.values():
-            if meta.get("name", "").lower() == key_norm:
-                voice_meta = meta
-                break
+    voice_meta = index.get(key_norm)
+
+    if voice_meta is None:
+        _, catalogo_index, catalogo_keys = _cargar_catalogo_persistido()
+        # Nombre exacto del catálogo antes que alias o prefijos de VOICE_INFO
+        exacta = catalogo_index.get(key_norm)
+        if exacta is not None and exacta["name"].lower() == key_norm:
+            voice_meta = exacta
         else:
-            raise KeyError(f"Voz '{voice_key}' no encontrada en VOICE_INFO.")
+            voice_meta = (_lookup_prefix(key_norm, index, keys)
+                          or exacta
+                          or _lookup_prefix(key_norm, catalogo_index, catalogo_keys))
+        if voice_meta is None:
+            raise KeyError(f"Voz '{voice_key}' no encontrada en VOICE_INFO ni en el catálogo de voces.")
 
     voice_name = voice_meta.get("name", voice_key)
     language_code = voice_meta.get("languageCode", "es-US")
 
     return voice_name, language_code, voice_meta
 
-def sanitize_ssml_for_chirp(ssml: str) -> str:
+def es_chirp(voice_meta: Optional[Dict]) -> bool:
+    """True para voces Chirp de cualquier generación (VOICE_INFO usa 'chirp3')."""
+    return bool(voice_meta) and str(voice_meta.get("type") or "").lower().startswith("chirp")
+
+# Tags que las voces Chirp aceptan sin problemas
+CHIRP_ALLOWED_TAGS = {'s', 'p', 'emphasis', 'say-as', 'phoneme', 'sub'}
+
+def _split_ssml_sentences_regex(ssml: str, allowed_tags=CHIRP_ALLOWED_TAGS) -> List[str]:
     """
-    Sanitiza SSML para voces Chirp eliminando tags problemáticos como <break/>.
-    Envuelve el texto en oraciones <s> para compatibilidad.
+    Implementación de referencia de split_ssml_sentences (una pasada de re.sub por
+    regla). Se usa como respaldo para entradas patológicas y para verificar que
+    el recorrido de una sola pasada produce exactamente la misma salida.
     """
     if not ssml:
-        return "<speak><p></p></speak>"
+        return []
 
     # Extraer contenido dentro de <speak> si existe
     inner = re.sub(r'^\s*<\s*speak[^>]*>\s*', '', ssml, flags=re.I)
     inner = re.sub(r'\s*<\s*/\s*speak\s*>\s*$', '', inner, flags=re.I)
 
     # Eliminar tags problemáticos
-    inner = re.sub(r'<\s*break\b[^>]*?/?>', ' ', inner, flags=re.I)
+    if 'break' not in allowed_tags:
+        inner = re.sub(r'<\s*break\b[^>]*?/?>', ' ', inner, flags=re.I)
     inner = re.sub(r'<\s*audio\b[^>]*?>.*?<\s*/\s*audio\s*>', ' ', inner, flags=re.I | re.S)
     inner = re.sub(r'<\s*par\b[^>]*?>.*?<\s*/\s*par\s*>', ' ', inner, flags=re.I | re.S)
     inner = re.sub(r'<\s*par\b[^>]*?/?>', ' ', inner, flags=re.I)
 
     # Quitar tags no permitidos (mantener texto)
-    allowed_tags = {'s', 'p', 'emphasis', 'say-as', 'phoneme', 'sub'}
     def strip_disallowed_tags(match):
         tag = match.group(1).lower()
         return match.group(0) if tag in allowed_tags else ''
@@ -80,5 +219,199 @@ def sanitize_ssml_for_chirp(ssml: str) -> str:
         text_only = re.sub(r'<[^>]+>', '', inner).strip()
         s_chunks = [p.strip() for p in sentence_split.split(text_only) if p.strip()]
 
+    return s_chunks
+
+# Patrones del recorrido de una sola pasada (mismas reglas que la versión regex)
+_SPEAK_OPEN = re.compile(r'\s*<\s*speak[^>]*>\s*', re.I)
+_SPEAK_CLOSE = re.compile(r'<\s*/\s*speak\s*>\s*\Z', re.I)
+_TAG = re.compile(r'<\s*(/?)\s*([a-zA-Z0-9:-]+)[^>]*?>')
+_BREAK = re.compile(r'<\s*break\b', re.I)
+_AUDIO = re.compile(r'<\s*audio\b', re.I)
+_AUDIO_OPEN = re.compile(r'<\s*audio\b[^>]*?>', re.I)
+_AUDIO_CLOSE = re.compile(r'<\s*/\s*audio\s*>', re.I)
+_PAR = re.compile(r'<\s*par\b', re.I)
+_PAR_CLOSE = re.compile(r'<\s*/\s*par\s*>', re.I)
+_P_CLOSE = re.compile(r'<\s*/\s*p\s*>', re.I)
+_P_OPEN = re.compile(r'<\s*p\b', re.I)
+_S_CLOSE = re.compile(r'<\s*/\s*s\s*>', re.I)
+_S_OPEN = re.compile(r'<\s*s\b', re.I)
+# '<' seguido de otro '<' antes de cerrar: las pasadas regex interactúan entre sí
+_NESTED_LT = re.compile(r'<[^>]*<')
+# Límite de oración: blanco con 2+ saltos de línea (párrafo) o blanco tras puntuación final
+_BOUNDARY = re.compile(r'\s*\n\s*\n\s*|(?<=[\.\!\?\…])\s+')
+_SPACES = re.compile(r'[ \t]+')
+
+class _Closers:
+    """Posiciones de todos los </audio> o </par> del documento (calculadas una vez)."""
+
+    def __init__(self, pattern, ssml: str, start: int, end: int):
+        self.spans = [m.span() for m in pattern.finditer(ssml, start, end)]
+        self.starts = [a for a, _ in self.spans]
+
+    def after(self, pos: int):
+        """Primer cierre que empieza en `pos` o después, como (inicio, fin), o None."""
+        i = bisect.bisect_left(self.starts, pos)
+        return self.spans[i] if i < len(self.spans) else None
+
+    def exclude(self, spans: list):
+        """Descarta los cierres que caen dentro de alguno de los tramos (ordenados) dados."""
+        kept, i = [], 0
+        for c in self.spans:
+            while i < len(spans) and spans[i][1] <= c[0]:
+                i += 1
+            if i < len(spans) and spans[i][0] <= c[0]:
+                continue
+            kept.append(c)
+        self.spans = kept
+        self.starts = [a for a, _ in kept]
+
+def _audio_spans(ssml: str, start: int, end: int, audio_closers: _Closers) -> list:
+    """Tramos <audio>...</audio> que elimina la versión regex, en orden y sin solaparse."""
+    spans = []
+    pos = start
+    while True:
+        m = _AUDIO_OPEN.search(ssml, pos, end)
+        if m is None:
+            break
+        close = audio_closers.after(m.end())
+        if close is None:
+            # Sin cierre posterior ningún <audio> siguiente puede tenerlo
+            break
+        spans.append((m.start(), close[1]))
+        pos = close[1]
+    return spans
+
+def _walk_ssml(ssml: str, start: int, end: int, allowed_tags, nl='\n', nl2='\n\n') -> list:
+    """
+    Recorre ssml[start:end] una sola vez, tag por tag, y devuelve los trozos de
+    texto resultantes: texto tal cual, tags permitidos, saltos de línea para
+    <p>/<s> (`nl`, o `nl2` para </p>) y espacios para <break>,
+    <audio>...</audio> y <par>...</par>.
+    """
+    drop_breaks = 'break' not in allowed_tags
+    audio_closers = par_closers = None
+    out = []
+    emit = out.append
+    pos = start
+    search = _TAG.search
+    while True:
+        m = search(ssml, pos, end)
+        if m is None:
+            break
+        a, b = m.span()
+        if a > pos:
+            emit(ssml[pos:a])
+        pos = b
+        closing, name = m.groups()
+        name = name.lower()
+
+        # Los nombres se filtran por prefijo y el regex confirma el límite de palabra
+        if not closing and name[:1] in 'abp':
+            tag = m.group(0)
+            if drop_breaks and name.startswith('break') and _BREAK.match(tag):
+                emit(' ')
+                continue
+            if name.startswith('audio') and _AUDIO.match(tag):
+                if audio_closers is None:
+                    audio_closers = _Closers(_AUDIO_CLOSE, ssml, start, end)
+                close = audio_closers.after(b)
+                if close is not None:
+                    pos = close[1]
+                    emit(' ')
+                    continue
+            elif name.startswith('par') and _PAR.match(tag):
+                if par_closers is None:
+                    par_closers = _Closers(_PAR_CLOSE, ssml, start, end)
+                    # La versión regex quita los <audio>...</audio> antes de
+                    # buscar </par>: los cierres dentro de un audio no cuentan
+                    if audio_closers is None:
+                        audio_closers = _Closers(_AUDIO_CLOSE, ssml, start, end)
+                    par_closers.exclude(_audio_spans(ssml, start, end, audio_closers))
+                close = par_closers.after(b)
+                if close is not None:
+                    pos = close[1]
+                emit(' ')
+                continue
+
+        if name not in allowed_tags:
+            continue
+        if name == 'p':
+            tag = m.group(0)
+            if closing:
+                emit(nl2 if _P_CLOSE.match(tag) else tag)
+            else:
+                emit(nl if _P_OPEN.match(tag) else tag)
+        elif name == 's':
+            tag = m.group(0)
+            if closing:
+                emit(nl if _S_CLOSE.match(tag) else tag)
+            else:
+                emit(nl if _S_OPEN.match(tag) else tag)
+        else:
+            emit(m.group(0))
+
+    if pos < end:
+        emit(ssml[pos:end])
+    return out
+
+# Marcadores de <p>/<s>: los \r se normalizan después de quitar tags pero antes
+# de convertir <p>/<s> en saltos de línea (igual que la versión regex)
+_NL = object()
+_NL2 = object()
+
+def _join_normalizing_cr(pieces) -> str:
+    out, run = [], []
+    for piece in pieces:
+        if piece is _NL or piece is _NL2:
+            out.append(re.sub(r'\r\n?', '\n', "".join(run)))
+            out.append('\n' if piece is _NL else '\n\n')
+            run = []
+        else:
+            run.append(piece)
+    out.append(re.sub(r'\r\n?', '\n', "".join(run)))
+    return "".join(out)
+
+def split_ssml_sentences(ssml: str, allowed_tags=CHIRP_ALLOWED_TAGS) -> List[str]:
+    """
+    Divide el SSML en oraciones (texto con los tags permitidos dentro), usando los
+    límites de <p>/<s> y la puntuación final. Los tags fuera de `allowed_tags` se
+    eliminan conservando su texto; <break/> solo se conserva si está permitido.
+
+    Recorre el SSML una sola vez (tag por tag) y luego corta en los límites de
+    oración; produce la misma salida que _split_ssml_sentences_regex.
+    """
+    if not ssml:
+        return []
+    if _NESTED_LT.search(ssml):
+        return _split_ssml_sentences_regex(ssml, allowed_tags)
+
+    # Quitar <speak> ... </speak> exteriores
+    m = _SPEAK_OPEN.match(ssml)
+    start = m.end() if m else 0
+    end = len(ssml)
+    last_lt = ssml.rfind('<')
+    if last_lt >= start and _SPEAK_CLOSE.match(ssml, last_lt):
+        end = last_lt
+        while end > start and ssml[end - 1].isspace():
+            end -= 1
+
+    if '\r' not in ssml:
+        text = "".join(_walk_ssml(ssml, start, end, allowed_tags))
+    else:
+        text = _join_normalizing_cr(_walk_ssml(ssml, start, end, allowed_tags, _NL, _NL2))
+
+    if ' ' in text or '\t' in text:
+        text = _SPACES.sub(' ', text)
+    return [chunk for chunk in (piece.strip() for piece in _BOUNDARY.split(text)) if chunk]
+
+def sanitize_ssml_for_chirp(ssml: str) -> str:
+    """
+    Sanitiza SSML para voces Chirp eliminando tags problemáticos como <break/>.
+    Envuelve el texto en oraciones <s> para compatibilidad.
+    """
+    if not ssml:
+        return "<speak><p></p></speak>"
+
+    s_chunks = split_ssml_sentences(ssml)
     s_tags = "".join(f"<s>{chunk}</s>" for chunk in s_chunks)
-    return f"<speak><p>{s_tags}</p></speak>"
\ No newline at end of file
+    return f"<speak><p>{s_tags}</p></speak>"